@@ -0,0 +1,161 @@
+"""
+Usage Accounting: Token counts, cost and per-solve budgets for LLM calls
+Deterministic: Usage reported by the backend is recorded per call into the
+ledger of the solve that made it (tracked through a context variable)
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pydantic import BaseModel, Field
+from typing import Literal, Optional
+import functools
+import os
+
+
+# USD per 1M tokens (list prices; override the active model with
+# ATOM_LLM_PRICE="prompt,output,cached")
+MODEL_PRICES: dict[str, dict[str, float]] = {
+    "gemini-2.5-flash": {"prompt": 0.30, "output": 2.50, "cached": 0.075},
+    "gemini-2.5-flash-lite": {"prompt": 0.10, "output": 0.40, "cached": 0.025},
+    "gemini-2.5-pro": {"prompt": 1.25, "output": 10.00, "cached": 0.31},
+}
+
+
+def model_prices(model: str) -> dict[str, float]:
+    override = os.getenv("ATOM_LLM_PRICE")
+    if override:
+        prompt, output, cached = (float(v) for v in override.split(","))
+        return {"prompt": prompt, "output": output, "cached": cached}
+    return MODEL_PRICES.get(model, {"prompt": 0.0, "output": 0.0, "cached": 0.0})
+
+
+def estimate_usage(prompt: str, text: str) -> dict[str, int]:
+    """Rough token counts (~4 characters per token) for backends that report none"""
+    return {"prompt_tokens": len(prompt) // 4, "output_tokens": len(text) // 4, "cached_tokens": 0}
+
+
+class TokenUsage(BaseModel):
+    """Accumulated LLM usage"""
+    calls: int = 0
+    prompt_tokens: int = Field(default=0, description="Input tokens, including cached ones")
+    output_tokens: int = Field(default=0, description="Output tokens, including thinking")
+    cached_tokens: int = Field(default=0, description="Input tokens served from the provider's context cache")
+    cost_usd: float = 0.0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.output_tokens
+
+    def add(self, usage: dict[str, int], model: str):
+        prompt = usage.get("prompt_tokens", 0)
+        output = usage.get("output_tokens", 0)
+        cached = usage.get("cached_tokens", 0)
+        prices = model_prices(model)
+        self.calls += 1
+        self.prompt_tokens += prompt
+        self.output_tokens += output
+        self.cached_tokens += cached
+        self.cost_usd += (
+            (prompt - cached) * prices["prompt"]
+            + cached * prices["cached"]
+            + output * prices["output"]
+        ) / 1_000_000
+
+    def merge(self, other: "TokenUsage"):
+        self.calls += other.calls
+        self.prompt_tokens += other.prompt_tokens
+        self.output_tokens += other.output_tokens
+        self.cached_tokens += other.cached_tokens
+        self.cost_usd += other.cost_usd
+
+
+class UsageLedger:
+    """Usage of one solve: totals, per call site and per call"""
+
+    def __init__(self):
+        self.total = TokenUsage()
+        self.by_call_site: dict[str, TokenUsage] = {}
+        self.calls: list[dict] = []
+        self.iteration = 0
+        self.response_cache_hits = 0
+
+    def record(self, call_site: str, model: str, usage: dict[str, int], cached: bool):
+        if cached:
+            # Served by our response cache: no tokens were billed
+            self.response_cache_hits += 1
+            return
+        self.total.add(usage, model)
+        self.by_call_site.setdefault(call_site, TokenUsage()).add(usage, model)
+        self.calls.append({"call_site": call_site, "iteration": self.iteration, **usage})
+
+    def iteration_tokens(self, iteration: int) -> int:
+        """Prompt + output tokens billed during one loop iteration"""
+        return sum(
+            call.get("prompt_tokens", 0) + call.get("output_tokens", 0)
+            for call in self.calls if call["iteration"] == iteration
+        )
+
+
+_current_ledger: ContextVar[Optional[UsageLedger]] = ContextVar("atom_usage_ledger", default=None)
+
+
+@contextmanager
+def track(ledger: UsageLedger):
+    """Charge every LLM call made inside the block (and tasks it spawns) to ledger"""
+    token = _current_ledger.set(ledger)
+    try:
+        yield ledger
+    finally:
+        _current_ledger.reset(token)
+
+
+def current_ledger() -> Optional[UsageLedger]:
+    return _current_ledger.get()
+
+
+def metered(fn):
+    """Decorator running a coroutine function under a fresh ledger (one per solve)"""
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        with track(UsageLedger()):
+            return await fn(*args, **kwargs)
+    return wrapper
+
+
+def record(call_site: str, model: str, usage: dict[str, int], cached: bool = False):
+    ledger = _current_ledger.get()
+    if ledger is not None:
+        ledger.record(call_site, model, usage, cached)
+
+
+class SolveBudget(BaseModel):
+    """Per-solve token/cost limits and what to do when one is exceeded"""
+    max_tokens: Optional[int] = None
+    max_cost_usd: Optional[float] = None
+    on_exceed: Literal["fallback", "stop"] = Field(
+        default="fallback",
+        description="fallback: plan and draft deterministically; stop: end the solve"
+    )
+
+    @classmethod
+    def from_env(cls) -> "SolveBudget":
+        """
+        ATOM_SOLVE_TOKEN_BUDGET=20000     prompt + output tokens per solve
+        ATOM_SOLVE_COST_BUDGET=0.01       USD per solve
+        ATOM_BUDGET_ACTION=fallback|stop
+        """
+        tokens = os.getenv("ATOM_SOLVE_TOKEN_BUDGET")
+        cost = os.getenv("ATOM_SOLVE_COST_BUDGET")
+        return cls(
+            max_tokens=int(tokens) if tokens else None,
+            max_cost_usd=float(cost) if cost else None,
+            on_exceed=os.getenv("ATOM_BUDGET_ACTION", "fallback")
+        )
+
+    def exceeded(self, usage: TokenUsage) -> Optional[str]:
+        """Reason the budget is exhausted, or None"""
+        if self.max_tokens is not None and usage.total_tokens >= self.max_tokens:
+            return f"token budget exhausted ({usage.total_tokens}/{self.max_tokens} tokens)"
+        if self.max_cost_usd is not None and usage.cost_usd >= self.max_cost_usd:
+            return f"cost budget exhausted (${usage.cost_usd:.4f}/${self.max_cost_usd:.4f})"
+        return None
@@ -7,16 +7,20 @@ and returns structured ActionResult objects.
 """
 
 from pydantic import BaseModel, Field
-from typing import Any, Optional
-from mcp import ClientSession
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Any, AsyncIterator, Optional, TextIO
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
 from mcp.types import TextContent
 from mcp.server.fastmcp import FastMCP
-from rich.console import Console
-from rich.panel import Panel
+import functools
 import json
 import re
+import signal
 import sys
 import os
+import threading
+import time
 import base64
 from email.message import EmailMessage
 from googleapiclient.discovery import build
@@ -24,12 +28,32 @@ from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 
+import logs
+import looplag
+import tracing
+import deadlines
+import profiling
+from metrics import MetricsRegistry
+
 # ----------------------------------------------------------------------------
 # MCP Server Initialization
 # ----------------------------------------------------------------------------
 
-console = Console(stderr=True, force_terminal=False)
-mcp = FastMCP("MathIntegrationAgent")
+log = logs.get_logger("action")
+metrics = MetricsRegistry.from_env()
+
+
+@asynccontextmanager
+async def _server_lifespan(server: FastMCP):
+    """Watch the server's loop: tool bodies (e.g. SymPy) run on it synchronously"""
+    async with looplag.monitored("action_server", metrics):
+        yield {}
+
+
+mcp = FastMCP("MathIntegrationAgent", lifespan=_server_lifespan)
+
+# Of a solve's remaining time, what a tool call leaves for its response to arrive
+DEADLINE_RETURN_MS = 50
 
 
 # ----------------------------------------------------------------------------
@@ -53,6 +77,26 @@ class ActionLayer:
 
     def __init__(self, mcp_session: ClientSession):
         self.session = mcp_session
+        self.round_trips = 0
+        self.round_trip_seconds = 0.0
+
+    @property
+    def mean_round_trip(self) -> float:
+        """Average MCP round-trip time observed so far (seconds)"""
+        return self.round_trip_seconds / self.round_trips if self.round_trips else 0.0
+
+    @staticmethod
+    def request_meta(trace_context: Optional[dict]) -> Optional[dict]:
+        """
+        Request _meta for a tool call: the caller's trace context and, under a
+        solve deadline, the milliseconds the server may spend on the tool
+        """
+        meta = {"trace": trace_context} if trace_context else {}
+        deadline = deadlines.current()
+        if deadline is not None:
+            # Leave time for the response to travel back before the client gives up
+            meta["deadline_ms"] = max(0.0, deadline.remaining() * 1000 - DEADLINE_RETURN_MS)
+        return meta or None
 
     async def execute(self, tool_call) -> ActionResult:
         """
@@ -65,13 +109,31 @@ class ActionLayer:
             ActionResult with execution outcome
         """
         try:
-            tool_result = await self.session.call_tool(
-                tool_call.tool_name,
-                arguments=tool_call.arguments
-            )
+            started = time.perf_counter()
+            with tracing.span("action.execute", cat="action", tool=tool_call.tool_name) as span:
+                # The server joins its tool span to ours through the request _meta
+                trace_context = span.context()
+                tool_result = await deadlines.bounded(
+                    self.session.call_tool(
+                        tool_call.tool_name,
+                        arguments=tool_call.arguments,
+                        meta=self.request_meta(trace_context)
+                    ),
+                    layer=f"action.{tool_call.tool_name}"
+                )
+            self.round_trips += 1
+            self.round_trip_seconds += time.perf_counter() - started
 
             if tool_result.content:
                 result_text = tool_result.content[0].text
+                if tool_result.isError:
+                    # e.g. arguments that fail the tool's schema
+                    return ActionResult(
+                        success=False,
+                        result=None,
+                        error_message=result_text,
+                        tool_name=tool_call.tool_name
+                    )
                 try:
                     parsed_result = json.loads(result_text)
                     return ActionResult(
@@ -101,6 +163,11 @@ class ActionLayer:
                 tool_name=tool_call.tool_name
             )
 
+    async def fetch_metrics(self) -> dict:
+        """Scrape the server's per-tool metrics through the get_metrics tool"""
+        tool_result = await self.session.call_tool("get_metrics", arguments={})
+        return json.loads(tool_result.content[0].text)
+
     def format_result_for_decision(self, action_result: ActionResult) -> str:
         """Format action result for passing back to decision layer"""
         if action_result.success:
@@ -109,24 +176,165 @@ class ActionLayer:
             return f"Tool '{action_result.tool_name}' failed: {action_result.error_message}"
 
 
+@asynccontextmanager
+async def start_servers(servers: int = 1, errlog: TextIO = sys.stderr) -> AsyncIterator[list[ActionLayer]]:
+    """
+    Start action.py MCP servers and yield one connected ActionLayer per server
+
+    The servers read ATOM_* settings (e.g. ATOM_TRACE_FILE) from their
+    environment; all of them are shut down when the block exits.
+    """
+    params = StdioServerParameters(
+        command=sys.executable,
+        args=[os.path.abspath(__file__)],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env={key: value for key, value in os.environ.items() if key.startswith("ATOM_")}
+    )
+    async with AsyncExitStack() as stack:
+        actions = []
+        for _ in range(max(1, servers)):
+            read, write = await stack.enter_async_context(stdio_client(params, errlog=errlog))
+            session = await stack.enter_async_context(ClientSession(read, write))
+            await session.initialize()
+            actions.append(ActionLayer(mcp_session=session))
+        yield actions
+
+
+# ----------------------------------------------------------------------------
+# SERVER-SIDE INSTRUMENTATION
+# ----------------------------------------------------------------------------
+
+def _remote_meta() -> dict:
+    """Extra fields the client sent in the request _meta (trace, deadline_ms)"""
+    try:
+        meta = mcp.get_context().request_context.meta
+    except (LookupError, ValueError):
+        return {}  # called directly, outside an MCP request
+    return (meta.model_extra or {}) if meta is not None else {}
+
+
+def _remote_trace_context() -> Optional[dict]:
+    """Trace context the client sent in the request _meta, if any"""
+    return _remote_meta().get("trace")
+
+
+class _ToolDeadline(BaseException):
+    """
+    Raised from SIGALRM inside a tool body; a BaseException so the tools'
+    own `except Exception` handlers cannot turn it into a normal result
+    """
+
+
+def _run_within_deadline(fn, args, kwargs):
+    """
+    Run a tool body within the client's deadline_ms, if it sent one
+
+    Sync tool bodies (e.g. SymPy) run on the server's main thread, so an
+    ITIMER_REAL alarm can interrupt them; anywhere else the client's own
+    timeout still bounds the call.
+    """
+    deadline_ms = _remote_meta().get("deadline_ms")
+    if deadline_ms is None:
+        return _run_measured(fn, args, kwargs)
+    if deadline_ms <= 0:
+        return json.dumps({"status": "error", "message": "deadline exceeded before the tool started"})
+    if not hasattr(signal, "setitimer") or threading.current_thread() is not threading.main_thread():
+        return _run_measured(fn, args, kwargs)
+
+    running = True
+
+    def expire(signum, frame):
+        # An alarm delivered after the tool returned must not escape the cleanup below
+        if running:
+            raise _ToolDeadline()
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    try:
+        signal.setitimer(signal.ITIMER_REAL, deadline_ms / 1000)
+        result = _run_measured(fn, args, kwargs)
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        return result
+    except _ToolDeadline:
+        log.warning("%s stopped at its %.0fms deadline", fn.__name__, deadline_ms)
+        return json.dumps({"status": "error", "message": f"deadline exceeded after {deadline_ms:.0f}ms"})
+    finally:
+        running = False
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def _reports_error(result: Any) -> bool:
+    """Tools report handled failures as {"status": "error", ...}, as a dict or as JSON text"""
+    if isinstance(result, str):
+        try:
+            result = json.loads(result)
+        except json.JSONDecodeError:
+            return False
+    return isinstance(result, dict) and result.get("status") == "error"
+
+
+def _run_measured(fn, args, kwargs):
+    started = time.perf_counter()
+    ok = False
+    result = None
+    try:
+        result = fn(*args, **kwargs)
+        ok = not _reports_error(result)
+        return result
+    finally:
+        metrics.observe(
+            fn.__name__,
+            time.perf_counter() - started,
+            ok,
+            request_bytes=len(json.dumps(kwargs, default=str)) if kwargs else 0,
+            response_bytes=len(result) if isinstance(result, str) else 0
+        )
+
+
+# Tool bodies, so the profiler can attribute samples and allocations per tool
+INSTRUMENTED_TOOLS: list = []
+
+
+def instrument_tool(fn):
+    """
+    Record metrics for a tool body and run it in a span joining the caller's
+    trace, stopping it at the caller's deadline
+    """
+    span_name = f"tool.{fn.__name__}"
+    INSTRUMENTED_TOOLS.append(fn)
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not tracing.enabled():
+            return _run_within_deadline(fn, args, kwargs)
+        with tracing.span(span_name, cat="tool", parent=_remote_trace_context(), tool=fn.__name__):
+            return _run_within_deadline(fn, args, kwargs)
+    return wrapper
+
+
 # ----------------------------------------------------------------------------
 # REGISTERED MCP TOOLS
 # ----------------------------------------------------------------------------
 
 @mcp.tool()
+@instrument_tool
 def show_reasoning(steps: list) -> str:
-    """Show step-by-step reasoning process"""
-    console.print("[blue]FUNCTION CALL:[/blue] show_reasoning()")
+    """
+    Show step-by-step reasoning process
+
+    Kept for external MCP clients. The orchestrator renders reasoning_steps
+    locally through reasoning.ReasoningSink and never calls this tool.
+    """
     for i, step in enumerate(steps, 1):
-        console.print(Panel(f"{step}", title=f"Step {i}", border_style="cyan"))
+        log.info("show_reasoning step %d: %s", i, step)
     return "Reasoning shown"
 
 
 @mcp.tool()
+@instrument_tool
 def parse_polynomial(expression: str) -> str:
     """Parse a polynomial expression into structured terms"""
-    console.print("[blue]FUNCTION CALL:[/blue] parse_polynomial()")
-    console.print(f"[blue]Input:[/blue] {expression}")
+    log.info("parse_polynomial(%r)", expression)
 
     expr = expression.replace(" ", "").replace("dx", "").replace("∫", "")
     pattern = r'([+-]?)(\d+\.?\d*)(x?)(\^?)(\d*\.?\d*)'
@@ -154,14 +362,15 @@ def parse_polynomial(expression: str) -> str:
         terms.append({"coeff": coeff, "power": power})
 
     result = json.dumps(terms)
-    console.print(f"[green]Parsed:[/green] {result}")
+    log.info("parsed: %s", result)
     return result
 
 
 @mcp.tool()
+@instrument_tool
 def integrate_term(coeff: float, power: float) -> str:
     """Apply power rule to integrate a single term"""
-    console.print(f"[blue]FUNCTION CALL:[/blue] integrate_term({coeff}, {power})")
+    log.info("integrate_term(%s, %s)", coeff, power)
 
     if power == -1:
         result = {"status": "error", "message": "logarithmic_case"}
@@ -171,14 +380,15 @@ def integrate_term(coeff: float, power: float) -> str:
         result = {"status": "success", "coeff": new_coeff, "power": new_power}
 
     result_str = json.dumps(result)
-    console.print(f"[green]Result:[/green] {result_str}")
+    log.info("result: %s", result_str)
     return result_str
 
 
 @mcp.tool()
+@instrument_tool
 def differentiate_term(coeff: float, power: float) -> str:
     """Apply power rule to differentiate a term"""
-    console.print(f"[blue]FUNCTION CALL:[/blue] differentiate_term({coeff}, {power})")
+    log.info("differentiate_term(%s, %s)", coeff, power)
 
     if power == 0:
         result = {"status": "zero", "coeff": 0.0, "power": 0.0}
@@ -188,14 +398,15 @@ def differentiate_term(coeff: float, power: float) -> str:
         result = {"status": "success", "coeff": new_coeff, "power": new_power}
 
     result_str = json.dumps(result)
-    console.print(f"[green]Derivative:[/green] {result_str}")
+    log.info("derivative: %s", result_str)
     return result_str
 
 
 @mcp.tool()
+@instrument_tool
 def format_polynomial_latex(terms: list) -> str:
     """Convert polynomial terms to LaTeX string"""
-    console.print("[blue]FUNCTION CALL:[/blue] format_polynomial_latex()")
+    log.info("format_polynomial_latex(%d terms)", len(terms))
     from fractions import Fraction
 
     latex_parts = []
@@ -227,14 +438,20 @@ def format_polynomial_latex(terms: list) -> str:
                 latex_parts.append(f"{sign_str}{abs_coeff:.4g}x^{{{int(power)}}}")
 
     result = "".join(latex_parts) + " + C"
-    console.print(f"[green]LaTeX:[/green] {result}")
+    log.info("latex: %s", result)
     return result
 
 
 @mcp.tool()
-def compare_polynomials(original_terms: list, verified_terms: list) -> str:
-    """Compare two polynomial term lists for equality"""
-    console.print("[blue]FUNCTION CALL:[/blue] compare_polynomials()")
+@instrument_tool
+def compare_polynomials(original_terms: list, verified_terms: list, differentiate_verified: bool = False) -> str:
+    """Compare two polynomial term lists for equality (optionally differentiating verified_terms first)"""
+    log.info("compare_polynomials(%d, %d terms)", len(original_terms), len(verified_terms))
+    if differentiate_verified:
+        verified_terms = [
+            {"coeff": t['coeff'] * t['power'], "power": t['power'] - 1}
+            for t in verified_terms if t['power'] != 0
+        ]
 
     def normalize(terms):
         normalized = {}
@@ -249,7 +466,7 @@ def compare_polynomials(original_terms: list, verified_terms: list) -> str:
 
     if orig_norm == verif_norm:
         result = {"status": "pass", "message": "Verification successful"}
-        console.print("[green]✓ VERIFIED[/green]")
+        log.info("verified")
     else:
         discrepancies = []
         all_powers = set(orig_norm.keys()) | set(verif_norm.keys())
@@ -259,15 +476,16 @@ def compare_polynomials(original_terms: list, verified_terms: list) -> str:
             if abs(orig_c - verif_c) > 1e-9:
                 discrepancies.append({"power": p, "expected": orig_c, "got": verif_c})
         result = {"status": "fail", "message": "Verification failed", "discrepancies": discrepancies}
-        console.print("[red]✗ FAILED[/red]")
+        log.warning("verification failed: %s", discrepancies)
 
     return json.dumps(result)
 
 
 @mcp.tool()
+@instrument_tool
 def integrate_symbolic(expression: str, variable: str = "x") -> str:
     """Integrate any expression using SymPy"""
-    console.print(f"[blue]FUNCTION CALL:[/blue] integrate_symbolic({expression}, {variable})")
+    log.info("integrate_symbolic(%r, %r)", expression, variable)
     try:
         import sympy as sp
         var = sp.Symbol(variable)
@@ -281,16 +499,17 @@ def integrate_symbolic(expression: str, variable: str = "x") -> str:
             "latex": sp.latex(antiderivative) + " + C",
             "simplified": str(sp.simplify(antiderivative))
         }
-        console.print(f"[green]Result:[/green] {result['latex']}")
+        log.info("result: %s", result["latex"])
         return json.dumps(result)
     except Exception as e:
         return json.dumps({"status": "error", "message": str(e)})
 
 
 @mcp.tool()
+@instrument_tool
 def differentiate_symbolic(expression: str, variable: str = "x") -> str:
     """Differentiate expression using SymPy"""
-    console.print(f"[blue]FUNCTION CALL:[/blue] differentiate_symbolic({expression}, {variable})")
+    log.info("differentiate_symbolic(%r, %r)", expression, variable)
     try:
         import sympy as sp
         var = sp.Symbol(variable)
@@ -303,16 +522,17 @@ def differentiate_symbolic(expression: str, variable: str = "x") -> str:
             "latex": sp.latex(derivative),
             "simplified": str(sp.simplify(derivative))
         }
-        console.print(f"[green]Derivative:[/green] {result['latex']}")
+        log.info("derivative: %s", result["latex"])
         return json.dumps(result)
     except Exception as e:
         return json.dumps({"status": "error", "message": str(e)})
 
 
 @mcp.tool()
+@instrument_tool
 def verify_symbolic_integration(original: str, antiderivative: str, variable: str = "x") -> str:
     """Verify integration by differentiating"""
-    console.print("[blue]FUNCTION CALL:[/blue] verify_symbolic_integration()")
+    log.info("verify_symbolic_integration(%r, %r)", original, antiderivative)
     try:
         import sympy as sp
         var = sp.Symbol(variable)
@@ -327,12 +547,23 @@ def verify_symbolic_integration(original: str, antiderivative: str, variable: st
             "match": is_equal,
             "message": "Verification successful" if is_equal else "Mismatch detected"
         }
-        console.print("[green]✓ VERIFIED[/green]" if is_equal else "[red]✗ FAILED[/red]")
+        if is_equal:
+            log.info("verified")
+        else:
+            log.warning("verification failed: d/d%s %s - %s = %s", variable, antiderivative, original, difference)
         return json.dumps(result)
     except Exception as e:
         return json.dumps({"status": "error", "message": str(e)})
 
 
+@mcp.tool()
+def get_metrics(format: str = "json") -> str:
+    """Per-tool call counts, errors, latency histograms and payload sizes ("json" or "prometheus")"""
+    if format == "prometheus":
+        return metrics.to_prometheus()
+    return json.dumps(metrics.snapshot())
+
+
 # ----------------------------------------------------------------------------
 # PERSONALIZED GMAIL TOOL
 # ----------------------------------------------------------------------------
@@ -423,6 +654,7 @@ def _encode_email_message(msg: EmailMessage) -> dict:
 #         }
 
 @mcp.tool()
+@instrument_tool
 def send_gmail_text_personalized(
     to: str,
     subject: str,
@@ -494,7 +726,7 @@ def send_gmail_text_personalized(
 
         message_id = resp.get("id")
         success_msg = f"Email sent successfully to {to}. Message ID: {message_id}"
-        console.print(f"[green]{success_msg}[/green]")
+        log.info("email sent", extra={"to": to, "message_id": message_id})
         
         return {
             "status": "success",
@@ -505,7 +737,7 @@ def send_gmail_text_personalized(
 
     except Exception as e:
         error_msg = f"Error sending email: {e}"
-        console.print(f"[red]{error_msg}[/red]")
+        log.error("email failed: %s", e, extra={"to": to})
         return {
             "status": "error",
             "message": error_msg,
@@ -519,6 +751,12 @@ def send_gmail_text_personalized(
 # ----------------------------------------------------------------------------
 
 if __name__ == "__main__":
+    logs.configure()
+    profiling.start_from_env(
+        "action_server",
+        classify=profiling.classify_by_function(INSTRUMENTED_TOOLS, default="server"),
+        preload=("sympy",)
+    )
     try:
         if len(sys.argv) > 1 and sys.argv[1] == "dev":
             mcp.run()
@@ -0,0 +1,186 @@
+"""
+Batch: Non-interactive solving of many problems from JSONL
+Deterministic: Workers share one AgentRuntime (layers, LLM gateway, MCP servers);
+at most --concurrency problems are in flight and one JSONL result line is
+written per problem as soon as it finishes
+
+Usage:
+    python batch.py problems.jsonl [--concurrency 8] [--servers 1] [--output results.jsonl]
+    cat problems.jsonl | python batch.py - > results.jsonl
+
+Each input line is {"id": ..., "problem": "...", "user_id": "..."} (id and
+user_id optional) or a bare JSON string. Results arrive in completion order;
+"index" is the 0-based input line so they can be re-sorted.
+"""
+
+from typing import Optional, TextIO
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+from rich.console import Console
+
+from metrics import MetricsRegistry
+from main import AgentRuntime, SolveStats
+from deadlines import Deadline
+import logs
+import looplag
+
+log = logs.get_logger("batch")
+metrics = MetricsRegistry.from_env(process="batch")
+
+
+def parse_line(line: str, index: int) -> dict:
+    """One input record as {"id", "problem", "user_id"}; raises ValueError if unusable"""
+    record = json.loads(line)
+    if isinstance(record, str):
+        record = {"problem": record}
+    if not isinstance(record, dict) or not str(record.get("problem") or "").strip():
+        raise ValueError("expected a JSON string or an object with a non-empty \"problem\"")
+    return {
+        "id": record.get("id", index),
+        "problem": str(record["problem"]).strip(),
+        "user_id": record.get("user_id")
+    }
+
+
+def result_record(index: int, record: dict, stats: Optional[SolveStats], queued: float, error: Optional[str] = None) -> dict:
+    """The JSONL line written for one problem"""
+    head = {"index": index, "id": record.get("id", index), "problem": record.get("problem")}
+    if stats is None:
+        return {**head, "status": "error", "error": error, "queued_ms": round(queued * 1000, 1)}
+    return {**head, **stats.to_record(), "queued_ms": round(queued * 1000, 1)}
+
+
+class BatchRunner:
+    """Solves queued problems on one AgentRuntime with a fixed pool of workers"""
+
+    def __init__(
+        self,
+        runtime: AgentRuntime,
+        output: TextIO,
+        concurrency: int = 8,
+        send_emails: bool = False,
+        deadline_seconds: Optional[float] = None
+    ):
+        self.runtime = runtime
+        self.output = output
+        self.concurrency = max(1, concurrency)
+        self.send_emails = send_emails
+        self.deadline_seconds = deadline_seconds
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=2 * self.concurrency)
+        self.status_counts: dict[str, int] = {}
+
+    async def produce(self, source: TextIO):
+        """Feed input lines to the workers (the bounded queue keeps reading ahead of solving)"""
+        index = 0
+        while True:
+            line = await asyncio.to_thread(source.readline)
+            if not line:
+                break
+            if line.strip():
+                await self.queue.put((index, line, time.perf_counter()))
+            index += 1
+        for _ in range(self.concurrency):
+            await self.queue.put(None)
+
+    async def work(self):
+        while (item := await self.queue.get()) is not None:
+            index, line, enqueued = item
+            queued = time.perf_counter() - enqueued
+            try:
+                record = parse_line(line, index)
+            except ValueError as e:
+                self.emit(result_record(index, {}, None, queued, f"invalid input line: {e}"))
+                continue
+            try:
+                stats = await self.runtime.solve(
+                    record["problem"],
+                    user=record["user_id"],
+                    send_emails=self.send_emails,
+                    deadline=Deadline(self.deadline_seconds) if self.deadline_seconds else None
+                )
+            except Exception as e:
+                log.exception("problem %s failed", record["id"])
+                self.emit(result_record(index, record, None, queued, f"{type(e).__name__}: {e}"))
+                continue
+            self.emit(result_record(index, record, stats, queued))
+
+    def emit(self, result: dict):
+        self.status_counts[result["status"]] = self.status_counts.get(result["status"], 0) + 1
+        self.output.write(json.dumps(result, ensure_ascii=False) + "\n")
+        self.output.flush()
+
+    async def run(self, source: TextIO) -> dict[str, int]:
+        """Solve every problem in source; returns the count of results per status"""
+        workers = [asyncio.create_task(self.work()) for _ in range(self.concurrency)]
+        try:
+            await asyncio.gather(self.produce(source), *workers)
+        finally:
+            for worker in workers:
+                worker.cancel()
+        return self.status_counts
+
+
+async def run_batch(args: argparse.Namespace, source: TextIO, output: TextIO) -> dict[str, int]:
+    """Start a runtime, then solve everything in source"""
+    # Per-request server logging would swamp the summary; keep it in a file if asked for
+    with open(args.server_log or os.devnull, "a", encoding="utf-8") as errlog:
+        async with AgentRuntime.start(
+            servers=args.servers,
+            memory_file=args.memory_file,
+            errlog=errlog,
+            max_iterations=args.max_iterations
+        ) as runtime:
+            runner = BatchRunner(
+                runtime, output,
+                concurrency=args.concurrency,
+                send_emails=args.send_emails,
+                deadline_seconds=args.deadline_ms / 1000 if args.deadline_ms else None
+            )
+            async with looplag.monitored("batch", metrics):
+                return await runner.run(source)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Solve problems from JSONL without prompts")
+    parser.add_argument("input", help="JSONL file of problems, or - for stdin")
+    parser.add_argument("--output", help="Write result lines here (default: stdout)")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("ATOM_BATCH_CONCURRENCY", "8")),
+                        help="Problems solved at once (ATOM_BATCH_CONCURRENCY, default 8)")
+    parser.add_argument("--servers", type=int, default=int(os.getenv("ATOM_BATCH_SERVERS", "1")),
+                        help="Action MCP servers to spread tool calls over (ATOM_BATCH_SERVERS, default 1)")
+    parser.add_argument("--max-iterations", type=int, default=25)
+    parser.add_argument("--deadline-ms", type=int,
+                        help="Wall-clock limit per problem, from when it starts solving (default: ATOM_SOLVE_DEADLINE_MS, else none)")
+    parser.add_argument("--send-emails", action="store_true", help="Honor email instructions (off by default)")
+    parser.add_argument("--memory-file", default="user_memory.json")
+    parser.add_argument("--server-log", help="Append the action servers' stderr here (default: discarded)")
+    args = parser.parse_args()
+
+    logs.configure(level=os.getenv("ATOM_LOG_LEVEL", "WARNING"))
+    summary = Console(stderr=True)
+    source = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8")
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    started = time.perf_counter()
+    try:
+        counts = asyncio.run(run_batch(args, source, output))
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if output is not sys.stdout:
+            output.close()
+
+    elapsed = time.perf_counter() - started
+    total = sum(counts.values())
+    summary.print(
+        f"[green]{total} problems in {elapsed:.1f}s ({total / elapsed if elapsed else 0:.1f}/s): "
+        + ", ".join(f"{count} {status}" for status, count in sorted(counts.items())) + "[/green]"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+"""
+Benchmarks for the Atom agent
+- e2e: full agent loop over a recorded corpus (replayed LLM responses)
+- record: (re)record LLM responses for the corpus with any backend
+- tools_scaling: per-tool scaling curves, direct vs stdio MCP
+"""
@@ -0,0 +1,267 @@
+"""
+End-to-end benchmark: runs main.solve over the recorded corpus
+
+Usage:
+    python -m bench.e2e [--repeat 3] [--replay-latency] [--output results.json]
+                        [--compare baseline.json]
+
+LLM responses are replayed from bench/corpus/recorded.jsonl, so runs are
+deterministic and need no network. Tools run for real through the stdio MCP
+server. Results are written as JSON so runs can be compared between commits.
+"""
+
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Optional
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+from rich.console import Console
+
+ROOT = Path(__file__).resolve().parent.parent
+CORPUS_DIR = Path(__file__).resolve().parent / "corpus"
+sys.path.insert(0, str(ROOT))
+
+from action import ActionLayer  # noqa: E402
+from decision import DecisionLayer  # noqa: E402
+from llm import LLMBackend, LLMGateway  # noqa: E402
+from llm_cache import ResponseCache  # noqa: E402
+from main import SolveStats, solve  # noqa: E402
+from memory import MemoryLayer  # noqa: E402
+from perception import PerceptionLayer  # noqa: E402
+import logs  # noqa: E402
+from bench.replay import ReplayBackend  # noqa: E402
+
+
+# ----------------------------------------------------------------------------
+# Shared harness
+# ----------------------------------------------------------------------------
+
+def load_problems(path: Path) -> list[dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+@asynccontextmanager
+async def action_session(env: Optional[dict] = None):
+    """Start the action.py MCP server quietly and yield a connected ActionLayer"""
+    params = StdioServerParameters(
+        command=sys.executable,
+        args=[str(ROOT / "action.py")],
+        cwd=str(ROOT),
+        env={**os.environ, **(env or {})}
+    )
+    with open(os.devnull, "w") as errlog:
+        async with stdio_client(params, errlog=errlog) as (read, write):
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+                yield ActionLayer(mcp_session=session)
+
+
+def build_layers(backend: LLMBackend, workdir: str):
+    """Layers wired to a backend with the response cache disabled"""
+    llm = LLMGateway(backend=backend, cache=ResponseCache(enabled_sites=set()))
+    memory = MemoryLayer(memory_file=os.path.join(workdir, "bench_memory.json"))
+    return PerceptionLayer(llm=llm), memory, DecisionLayer(llm=llm)
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100 * len(ordered) + 0.5)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def _peak_rss_mb(who: int) -> float:
+    rss = resource.getrusage(who).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ----------------------------------------------------------------------------
+# Benchmark
+# ----------------------------------------------------------------------------
+
+async def run_benchmark(
+    problems: list[dict],
+    replay: ReplayBackend,
+    repeat: int = 1
+) -> dict:
+    quiet = Console(quiet=True)
+    runs: list[dict] = []
+
+    with tempfile.TemporaryDirectory() as workdir:
+        perception, memory, decision = build_layers(replay, workdir)
+
+        async with action_session() as action:
+            for _ in range(repeat):
+                for item in problems:
+                    replay.start(item["id"])
+                    memory.reset_session()
+                    stats: SolveStats = await solve(
+                        item["problem"], perception, memory, decision, action,
+                        send_emails=False, out=quiet
+                    )
+                    runs.append({
+                        "id": item["id"],
+                        "stats": stats,
+                        "llm_calls": replay.calls,
+                        "tokens": dict(replay.usage)
+                    })
+            server_metrics = await action.fetch_metrics()
+        await memory.flush()
+
+    # The server has exited, so its peak RSS is now visible as a child
+    server_rss = _peak_rss_mb(resource.RUSAGE_CHILDREN)
+    return summarize(runs, server_rss, server_metrics)
+
+
+def summarize(runs: list[dict], server_rss_mb: float, server_metrics: Optional[dict] = None) -> dict:
+    layer_samples: dict[str, list[float]] = {}
+    tool_calls: dict[str, int] = {}
+    statuses: dict[str, int] = {}
+    totals = {"prompt_tokens": 0, "output_tokens": 0, "cached_tokens": 0}
+
+    for run in runs:
+        stats: SolveStats = run["stats"]
+        for layer, samples in stats.layer_seconds.items():
+            layer_samples.setdefault(layer, []).extend(samples)
+        for tool, count in stats.tool_calls.items():
+            tool_calls[tool] = tool_calls.get(tool, 0) + count
+        statuses[stats.status] = statuses.get(stats.status, 0) + 1
+        for key, value in run["tokens"].items():
+            totals[key] = totals.get(key, 0) + value
+
+    solve_seconds = [run["stats"].total_seconds for run in runs]
+    iterations = [run["stats"].iterations for run in runs]
+    n = len(runs) or 1
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "solves": len(runs)
+        },
+        "summary": {
+            "layers": {
+                layer: {
+                    "count": len(samples),
+                    "p50_ms": percentile(samples, 50) * 1000,
+                    "p95_ms": percentile(samples, 95) * 1000,
+                    "total_ms": sum(samples) * 1000
+                }
+                for layer, samples in sorted(layer_samples.items())
+            },
+            "solve": {
+                "p50_ms": percentile(solve_seconds, 50) * 1000,
+                "p95_ms": percentile(solve_seconds, 95) * 1000
+            },
+            "iterations": {
+                "mean": sum(iterations) / n,
+                "p50": percentile(iterations, 50),
+                "p95": percentile(iterations, 95)
+            },
+            "tool_calls": dict(sorted(tool_calls.items())),
+            "tokens": {**totals, "per_solve": (totals["prompt_tokens"] + totals["output_tokens"]) / n},
+            "peak_rss_mb": {
+                "orchestrator": _peak_rss_mb(resource.RUSAGE_SELF),
+                "action_server": server_rss_mb
+            },
+            "status": statuses,
+            "server_tools": {
+                name: {"calls": tool["calls"], "errors": tool["errors"], **tool["latency_ms"]}
+                for name, tool in (server_metrics or {}).get("tools", {}).items()
+            }
+        },
+        "problems": [
+            {
+                "id": run["id"],
+                "status": run["stats"].status,
+                "iterations": run["stats"].iterations,
+                "llm_calls": run["llm_calls"],
+                "total_ms": run["stats"].total_seconds * 1000,
+                "tool_calls": run["stats"].tool_calls,
+                "tokens": run["tokens"],
+                "final_answer": run["stats"].final_answer,
+                "error": run["stats"].error_message
+            }
+            for run in runs
+        ]
+    }
+
+
+def compare(current: dict, baseline: dict) -> list[str]:
+    """Human-readable deltas between two result files"""
+    lines = [f"baseline {baseline['meta'].get('commit')} -> current {current['meta'].get('commit')}"]
+
+    def delta(label: str, new: float, old: float):
+        change = (new - old) / old * 100 if old else 0.0
+        lines.append(f"  {label:<28} {old:>10.2f} -> {new:>10.2f}  ({change:+.1f}%)")
+
+    cur, base = current["summary"], baseline["summary"]
+    for layer, values in cur["layers"].items():
+        old = base["layers"].get(layer)
+        if old:
+            delta(f"{layer} p50 ms", values["p50_ms"], old["p50_ms"])
+            delta(f"{layer} p95 ms", values["p95_ms"], old["p95_ms"])
+    delta("solve p95 ms", cur["solve"]["p95_ms"], base["solve"]["p95_ms"])
+    delta("iterations mean", cur["iterations"]["mean"], base["iterations"]["mean"])
+    delta("tokens per solve", cur["tokens"]["per_solve"], base["tokens"]["per_solve"])
+    delta("orchestrator RSS MB", cur["peak_rss_mb"]["orchestrator"], base["peak_rss_mb"]["orchestrator"])
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end agent benchmark (replayed LLM)")
+    parser.add_argument("--problems", default=str(CORPUS_DIR / "problems.jsonl"))
+    parser.add_argument("--recorded", default=str(CORPUS_DIR / "recorded.jsonl"))
+    parser.add_argument("--repeat", type=int, default=1, help="Passes over the corpus")
+    parser.add_argument("--replay-latency", action="store_true",
+                        help="Sleep for the recorded LLM latency instead of replaying instantly")
+    parser.add_argument("--output", help="Write results JSON here (default: stdout)")
+    parser.add_argument("--compare", help="Baseline results JSON to diff against")
+    args = parser.parse_args()
+
+    # Per-iteration progress would drown the summary; warnings still show
+    logs.configure(level=os.getenv("ATOM_LOG_LEVEL", "WARNING"))
+    problems = load_problems(Path(args.problems))
+    replay = ReplayBackend.from_file(args.recorded, replay_latency=args.replay_latency)
+    results = asyncio.run(run_benchmark(problems, replay, repeat=args.repeat))
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            print("\n".join(compare(results, json.load(f))), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
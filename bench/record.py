@@ -0,0 +1,68 @@
+"""
+Record LLM responses for the benchmark corpus
+
+Usage:
+    python -m bench.record [--backend stub|gemini] [--output bench/corpus/recorded.jsonl]
+
+The backend defaults to ATOM_LLM_BACKEND. Recording with the stub backend
+(optionally with ATOM_STUB_LATENCY set) needs no network; recording with
+Gemini captures real responses and latencies.
+"""
+
+from pathlib import Path
+import argparse
+import asyncio
+import json
+import tempfile
+
+from rich.console import Console
+
+from bench.e2e import CORPUS_DIR, action_session, build_layers, load_problems
+from bench.replay import RecordingBackend
+from llm import get_backend
+from main import solve
+
+
+async def record(problems: list[dict], recorder: RecordingBackend) -> dict[str, str]:
+    statuses = {}
+    quiet = Console(quiet=True)
+    with tempfile.TemporaryDirectory() as workdir:
+        perception, memory, decision = build_layers(recorder, workdir)
+        async with action_session() as action:
+            for item in problems:
+                recorder.start(item["id"])
+                memory.reset_session()
+                stats = await solve(
+                    item["problem"], perception, memory, decision, action,
+                    send_emails=False, out=quiet
+                )
+                statuses[item["id"]] = stats.status
+    return statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record LLM responses for bench.e2e")
+    parser.add_argument("--backend", help="LLM backend (default: ATOM_LLM_BACKEND)")
+    parser.add_argument("--problems", default=str(CORPUS_DIR / "problems.jsonl"))
+    parser.add_argument("--output", default=str(CORPUS_DIR / "recorded.jsonl"))
+    args = parser.parse_args()
+
+    problems = load_problems(Path(args.problems))
+    recorder = RecordingBackend(get_backend(args.backend))
+    statuses = asyncio.run(record(problems, recorder))
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        for item in problems:
+            f.write(json.dumps({
+                "id": item["id"],
+                "problem": item["problem"],
+                "status": statuses[item["id"]],
+                "responses": recorder.recordings[item["id"]]
+            }, ensure_ascii=False) + "\n")
+
+    for problem_id, status in statuses.items():
+        print(f"{problem_id}: {status}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Recording and replay of LLM responses for deterministic benchmarks
+"""
+
+from typing import Optional
+import asyncio
+import json
+import time
+
+from llm import LLMBackend, LLMResponse
+from accounting import estimate_usage
+
+
+class ReplayMismatch(RuntimeError):
+    """The agent asked for a response the recording does not contain"""
+
+
+class RecordingBackend(LLMBackend):
+    """Wraps a backend and records every response per problem"""
+
+    name = "recording"
+
+    def __init__(self, inner: LLMBackend):
+        self.inner = inner
+        self.recordings: dict[str, list[dict]] = {}
+        self._current: Optional[list[dict]] = None
+
+    def start(self, problem_id: str):
+        self._current = self.recordings.setdefault(problem_id, [])
+        self._current.clear()
+
+    async def agenerate(self, model, prompt, config=None, call_site=None, timeout=30) -> LLMResponse:
+        started = time.perf_counter()
+        response = await self.inner.agenerate(model, prompt, config, call_site=call_site, timeout=timeout)
+        usage = response.usage or estimate_usage(prompt, response.text)
+        self._current.append({
+            "call_site": call_site,
+            "text": response.text,
+            "usage": dict(usage),
+            "latency_ms": round((time.perf_counter() - started) * 1000, 3)
+        })
+        return response
+
+
+class ReplayBackend(LLMBackend):
+    """Serves recorded responses in order, per problem"""
+
+    name = "replay"
+
+    def __init__(self, recordings: dict[str, list[dict]], replay_latency: bool = False):
+        self.recordings = recordings
+        self.replay_latency = replay_latency
+        self._queue: list[dict] = []
+        self._problem_id: Optional[str] = None
+        self.usage: dict[str, int] = {}
+        self.calls = 0
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> "ReplayBackend":
+        recordings = {}
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    recordings[entry["id"]] = entry["responses"]
+        return cls(recordings, **kwargs)
+
+    def start(self, problem_id: str):
+        """Rewind to the first recorded response of a problem"""
+        if problem_id not in self.recordings:
+            raise ReplayMismatch(f"No recording for problem {problem_id}")
+        self._problem_id = problem_id
+        self._queue = list(self.recordings[problem_id])
+        self.usage = {"prompt_tokens": 0, "output_tokens": 0, "cached_tokens": 0}
+        self.calls = 0
+
+    async def agenerate(self, model, prompt, config=None, call_site=None, timeout=30) -> LLMResponse:
+        if not self._queue:
+            raise ReplayMismatch(f"Recording for {self._problem_id} exhausted at {call_site}")
+        entry = self._queue.pop(0)
+        if call_site and entry["call_site"] != call_site:
+            raise ReplayMismatch(
+                f"{self._problem_id}: expected {entry['call_site']} call, agent made {call_site}"
+            )
+        if self.replay_latency:
+            await asyncio.sleep(entry.get("latency_ms", 0) / 1000)
+        self.calls += 1
+        for key, value in entry.get("usage", {}).items():
+            self.usage[key] = self.usage.get(key, 0) + value
+        return LLMResponse(text=entry["text"], backend=self.name, usage=entry.get("usage", {}))
@@ -0,0 +1,167 @@
+"""
+Build and query benchmark for the similar-problem index (similar.py)
+
+Usage:
+    python -m bench.similar_index [--sizes 10000,100000,1000000] [--queries 1000]
+                                  [--output similar.json]
+
+The index is filled with synthetic solved problems (polynomials with random
+powers and coefficients, sums of elementary functions) up to each size in
+turn. At every size it reports the insert rate, the process's peak RSS and
+the latency of two query sets: near-variants of stored problems (same shape,
+new coefficients - these should find a match of that shape) and freshly
+generated problems.
+"""
+
+from pathlib import Path
+import argparse
+import json
+import random
+import resource
+import sys
+import time
+
+from rich.console import Console
+from rich.table import Table
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from similar import SimilarityIndex, structure  # noqa: E402
+from bench.e2e import _git_commit, _peak_rss_mb, percentile  # noqa: E402
+
+
+ATOMS = ["sin({k}*x)", "cos({k}*x)", "exp({k}*x)", "x*exp({k}*x)", "1/(x+{k})", "x^{k}*sin(x)"]
+
+
+def polynomial(rng: random.Random, powers: list[int]) -> tuple[str, list[str]]:
+    terms = []
+    for i, power in enumerate(powers):
+        coeff = rng.randint(1, 99)
+        sign = "-" if rng.random() < 0.3 else ("" if i == 0 else "+")
+        body = f"{coeff}" if power == 0 else (f"{coeff}x" if power == 1 else f"{coeff}x^{power}")
+        terms.append(f"{sign}{body}" if i == 0 else f"{sign} {body}")
+    plan = ["parse_polynomial"] + ["integrate_term"] * len(powers) + ["compare_polynomials", "format_polynomial_latex"]
+    return " ".join(terms), plan
+
+
+def symbolic(rng: random.Random, atoms: list[int]) -> tuple[str, list[str]]:
+    expression = " + ".join(
+        f"{rng.randint(2, 9)}*" + ATOMS[atom].format(k=rng.randint(1, 9)) for atom in atoms
+    )
+    return expression, ["integrate_symbolic", "verify_symbolic_integration"]
+
+
+def shape(rng: random.Random) -> tuple[str, list[int]]:
+    """A random problem shape: which powers or which function atoms appear"""
+    if rng.random() < 0.7:
+        return "polynomial", sorted(rng.sample(range(13), rng.randint(1, 8)), reverse=True)
+    return "symbolic", [rng.randrange(len(ATOMS)) for _ in range(rng.randint(1, 3))]
+
+
+def problem(rng: random.Random, kind: str, parts: list[int]) -> tuple[str, list[str]]:
+    return polynomial(rng, parts) if kind == "polynomial" else symbolic(rng, parts)
+
+
+def _query_timings(index: SimilarityIndex, expressions: list[str]) -> tuple[dict, list]:
+    samples, results = [], []
+    for expression in expressions:
+        started = time.perf_counter()
+        results.append(index.query(expression, k=2))
+        samples.append(time.perf_counter() - started)
+    return {
+        "p50_us": round(percentile(samples, 50) * 1e6, 1),
+        "p95_us": round(percentile(samples, 95) * 1e6, 1),
+        "max_us": round(max(samples) * 1e6, 1)
+    }, results
+
+
+def run(sizes: list[int], queries: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    index = SimilarityIndex()
+    shapes: list[tuple[str, list[int]]] = []
+    points = []
+    build_seconds = 0.0
+
+    for size in sizes:
+        batch = []
+        while len(shapes) + len(batch) < size:
+            batch.append(shape(rng))
+        problems = [problem(rng, kind, parts) for kind, parts in batch]
+
+        started = time.perf_counter()
+        for expression, plan in problems:
+            index.add(expression, "x", plan)
+        elapsed = time.perf_counter() - started
+        build_seconds += elapsed
+        shapes.extend(batch)
+
+        query_rng = random.Random(f"{seed}:{size}")
+        variants = [problem(query_rng, *query_rng.choice(shapes))[0] for _ in range(queries)]
+        fresh = [problem(query_rng, *shape(query_rng))[0] for _ in range(queries)]
+        variant_timings, variant_results = _query_timings(index, variants)
+        fresh_timings, fresh_results = _query_timings(index, fresh)
+        same_shape = sum(
+            1 for expression, found in zip(variants, variant_results)
+            if found and structure(found[0].expression) == structure(expression)
+        )
+
+        points.append({
+            "size": len(index),
+            "insert_per_s": round(len(problems) / elapsed) if elapsed else None,
+            "build_seconds": round(build_seconds, 2),
+            "peak_rss_mb": round(_peak_rss_mb(resource.RUSAGE_SELF), 1),
+            "variant_query": {**variant_timings, "same_shape_top1": round(same_shape / queries, 3)},
+            "fresh_query": {
+                **fresh_timings,
+                "matched": round(sum(1 for found in fresh_results if found) / queries, 3)
+            }
+        })
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "queries": queries,
+            "seed": seed
+        },
+        "points": points
+    }
+
+
+def render(results: dict, console: Console):
+    table = Table(title="Similar-problem index")
+    for column in ("size", "insert/s", "build s", "RSS MB", "variant p50 µs", "variant p95 µs",
+                   "same shape", "fresh p50 µs", "fresh p95 µs", "fresh matched"):
+        table.add_column(column, justify="right")
+    for point in results["points"]:
+        variant, fresh = point["variant_query"], point["fresh_query"]
+        table.add_row(
+            str(point["size"]), str(point["insert_per_s"]), f"{point['build_seconds']:.1f}",
+            f"{point['peak_rss_mb']:.0f}", f"{variant['p50_us']:.0f}", f"{variant['p95_us']:.0f}",
+            f"{variant['same_shape_top1']:.1%}", f"{fresh['p50_us']:.0f}", f"{fresh['p95_us']:.0f}",
+            f"{fresh['matched']:.1%}"
+        )
+    console.print(table)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build/query benchmark for the similar-problem index")
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="Comma-separated index sizes")
+    parser.add_argument("--queries", type=int, default=1000, help="Queries per set and size")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results JSON here (default: stdout)")
+    args = parser.parse_args()
+
+    results = run([int(size) for size in args.sizes.split(",")], args.queries, args.seed)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+    else:
+        print(output)
+    render(results, Console(stderr=True))
+
+
+if __name__ == "__main__":
+    main()
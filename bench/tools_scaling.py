@@ -0,0 +1,256 @@
+"""
+Microbenchmarks and scaling curves for the MCP tools in action.py
+
+Usage:
+    python -m bench.tools_scaling [--tools parse_polynomial,integrate_symbolic]
+                                  [--repeat 20] [--output scaling.json]
+
+Every tool is timed on synthetic inputs of increasing size, twice: as a direct
+Python call and through the stdio MCP transport (ActionLayer.execute, so the
+client-side JSON round trip is included). Allocations are measured with
+tracemalloc on the direct call and on the client side of the MCP call. The
+ratio mcp/direct shows where transport and serialization outweigh the math.
+"""
+
+from pathlib import Path
+from typing import Callable
+import argparse
+import asyncio
+import inspect
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+from rich.console import Console
+from rich.table import Table
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import action  # noqa: E402
+import logs  # noqa: E402
+from decision import ToolCall  # noqa: E402
+from bench.e2e import _git_commit, action_session, percentile  # noqa: E402
+
+
+# ----------------------------------------------------------------------------
+# Synthetic inputs
+# ----------------------------------------------------------------------------
+
+def poly_terms(n: int, rng: random.Random) -> list[dict]:
+    """n terms with distinct descending powers"""
+    return [
+        {"coeff": float(rng.choice([-1, 1]) * rng.randint(1, 99)), "power": float(p)}
+        for p in range(n - 1, -1, -1)
+    ]
+
+
+def poly_expression(terms: list[dict]) -> str:
+    parts = []
+    for i, t in enumerate(terms):
+        sign = "-" if t["coeff"] < 0 else ("" if i == 0 else "+")
+        coeff = f"{abs(t['coeff']):g}"
+        power = int(t["power"])
+        body = coeff if power == 0 else (f"{coeff}x" if power == 1 else f"{coeff}x^{power}")
+        parts.append(f"{sign} {body}" if i else f"{sign}{body}")
+    return "∫" + " ".join(parts) + " dx"
+
+
+def integrated(terms: list[dict]) -> list[dict]:
+    return [{"coeff": t["coeff"] / (t["power"] + 1), "power": t["power"] + 1} for t in terms]
+
+
+SYMBOLIC_ATOMS = ["x^{k}", "sin({k}*x)", "exp({k}*x)", "cos({k}*x)", "1/(x+{k})", "x*exp({k}*x)"]
+
+
+def symbolic_width(n: int, rng: random.Random) -> str:
+    """Sum of n elementary terms"""
+    return " + ".join(
+        f"{rng.randint(2, 9)}*" + SYMBOLIC_ATOMS[i % len(SYMBOLIC_ATOMS)].format(k=i // len(SYMBOLIC_ATOMS) + 1)
+        for i in range(n)
+    )
+
+
+def symbolic_depth(d: int, rng: random.Random) -> str:
+    """x^d * sin(x) - needs d rounds of integration by parts"""
+    return f"{rng.randint(2, 9)}*x^{d}*sin(x)"
+
+
+# Each case builds fresh arguments per repetition: SymPy caches results, so
+# repeating an identical expression would time the cache instead of the math.
+Case = tuple[str, str, list[int], Callable[[int, random.Random], dict]]
+
+
+def _antiderivative(expression: str) -> str:
+    return json.loads(action.integrate_symbolic(expression))["antiderivative"]
+
+
+CASES: list[Case] = [
+    ("parse_polynomial", "terms", [1, 4, 16, 64, 256],
+     lambda n, rng: {"expression": poly_expression(poly_terms(n, rng))}),
+    ("integrate_term", "power", [1, 10, 100, 1000, 10000],
+     lambda n, rng: {"coeff": float(rng.randint(1, 99)), "power": float(n)}),
+    ("format_polynomial_latex", "terms", [1, 4, 16, 64, 256],
+     lambda n, rng: {"terms": integrated(poly_terms(n, rng))}),
+    ("compare_polynomials", "terms", [1, 4, 16, 64, 256],
+     lambda n, rng: (lambda t: {"original_terms": t, "verified_terms": [dict(x) for x in t]})(poly_terms(n, rng))),
+    ("integrate_symbolic", "width", [1, 2, 4, 8],
+     lambda n, rng: {"expression": symbolic_width(n, rng), "variable": "x"}),
+    ("integrate_symbolic", "depth", [1, 2, 4, 8],
+     lambda n, rng: {"expression": symbolic_depth(n, rng), "variable": "x"}),
+    ("verify_symbolic_integration", "width", [1, 2, 4, 8],
+     lambda n, rng: (lambda e: {"original": e, "antiderivative": _antiderivative(e), "variable": "x"})(symbolic_width(n, rng))),
+    ("verify_symbolic_integration", "depth", [1, 2, 4, 8],
+     lambda n, rng: (lambda e: {"original": e, "antiderivative": _antiderivative(e), "variable": "x"})(symbolic_depth(n, rng))),
+]
+
+SLOW_TOOLS = {"integrate_symbolic", "verify_symbolic_integration"}
+
+
+# ----------------------------------------------------------------------------
+# Measurement
+# ----------------------------------------------------------------------------
+
+async def _allocations(call: Callable[[], object]) -> dict:
+    """Peak traced memory and net allocated blocks of a single (possibly async) call"""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        result = call()
+        if inspect.isawaitable(result):
+            result = await result
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    del result
+    diff = after.compare_to(before, "filename")
+    return {
+        "peak_kib": round(peak / 1024, 2),
+        "net_blocks": sum(stat.count_diff for stat in diff),
+        "net_kib": round(sum(stat.size_diff for stat in diff) / 1024, 2)
+    }
+
+
+def _timings(samples: list[float]) -> dict:
+    return {
+        "p50_us": round(percentile(samples, 50) * 1e6, 2),
+        "p95_us": round(percentile(samples, 95) * 1e6, 2),
+        "min_us": round(min(samples) * 1e6, 2)
+    }
+
+
+async def measure_case(case: Case, layer: action.ActionLayer, repeat: int, seed: int) -> dict:
+    tool_name, axis, sizes, make_args = case
+    fn = getattr(action, tool_name)
+    points = []
+
+    for size in sizes:
+        rng = random.Random(f"{seed}:{tool_name}:{axis}:{size}")
+        arg_sets = [make_args(size, rng) for _ in range(repeat + 2)]
+        warmup, traced, timed = arg_sets[0], arg_sets[1], arg_sets[2:]
+
+        # Direct calls
+        fn(**warmup)
+        direct_samples = []
+        for args in timed:
+            started = time.perf_counter()
+            fn(**args)
+            direct_samples.append(time.perf_counter() - started)
+        direct_alloc = await _allocations(lambda: fn(**traced))
+
+        # Through the stdio MCP server
+        def tool_call(args):
+            return ToolCall(tool_name=tool_name, arguments=args, reasoning="benchmark")
+
+        await layer.execute(tool_call(warmup))
+        mcp_samples = []
+        for args in timed:
+            started = time.perf_counter()
+            result = await layer.execute(tool_call(args))
+            mcp_samples.append(time.perf_counter() - started)
+            if not result.success:
+                raise RuntimeError(f"{tool_name}: {result.error_message}")
+        client_alloc = await _allocations(lambda: layer.execute(tool_call(traced)))
+
+        direct = {**_timings(direct_samples), **direct_alloc}
+        mcp = {**_timings(mcp_samples), "client": client_alloc}
+        points.append({
+            "size": size,
+            "request_bytes": len(json.dumps(traced)),
+            "response_bytes": len(fn(**traced)),
+            "direct": direct,
+            "mcp": mcp,
+            "transport_us": round(mcp["p50_us"] - direct["p50_us"], 2),
+            "mcp_over_direct": round(mcp["p50_us"] / direct["p50_us"], 2) if direct["p50_us"] else None
+        })
+
+    return {"tool": tool_name, "axis": axis, "points": points}
+
+
+async def run_scaling(cases: list[Case], repeat: int, seed: int) -> dict:
+    # Match the server, whose stderr goes to /dev/null: keep the logging cost
+    # in the direct path without flooding the terminal
+    logs.configure(path=os.devnull)
+
+    curves = []
+    async with action_session() as layer:
+        for case in cases:
+            case_repeat = max(3, repeat // 4) if case[0] in SLOW_TOOLS else repeat
+            curves.append(await measure_case(case, layer, case_repeat, seed))
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "repeat": repeat,
+            "seed": seed
+        },
+        "curves": curves
+    }
+
+
+def render(results: dict, console: Console):
+    table = Table(title="MCP tool scaling (p50)")
+    for column in ("tool", "axis", "size", "direct µs", "mcp µs", "mcp/direct", "direct peak KiB", "resp bytes"):
+        table.add_column(column, justify="left" if column in ("tool", "axis") else "right")
+    for curve in results["curves"]:
+        for point in curve["points"]:
+            table.add_row(
+                curve["tool"], curve["axis"], str(point["size"]),
+                f"{point['direct']['p50_us']:.1f}", f"{point['mcp']['p50_us']:.1f}",
+                f"{point['mcp_over_direct']}", f"{point['direct']['peak_kib']:.1f}",
+                str(point["response_bytes"])
+            )
+    console.print(table)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scaling curves for the action.py MCP tools")
+    parser.add_argument("--tools", help="Comma-separated tool names (default: all)")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed calls per size (symbolic tools use a quarter)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results JSON here (default: stdout)")
+    args = parser.parse_args()
+
+    cases = CASES
+    if args.tools:
+        wanted = set(args.tools.split(","))
+        cases = [case for case in CASES if case[0] in wanted]
+
+    results = asyncio.run(run_scaling(cases, args.repeat, args.seed))
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+    else:
+        print(output)
+    render(results, Console(stderr=True))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""
+Checkpoints: Crash-safe, append-only log of each in-progress solve
+Deterministic: One JSONL file per (user, problem) under ATOM_CHECKPOINT_DIR;
+a record is appended and fsynced after perception and after every loop
+iteration, folded back into a ResumePoint on restart, and removed once
+the solve returns
+
+Usage:
+    python checkpoints.py list       # solves that would resume
+    python checkpoints.py clear      # discard them
+"""
+
+from pydantic import BaseModel, Field
+from pathlib import Path
+from typing import Any, Optional
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+
+import logs
+
+log = logs.get_logger("checkpoints")
+
+
+class ResumePoint(BaseModel):
+    """Where a solve left off, as of its last complete checkpoint record"""
+    problem: str
+    user_id: Optional[str] = None
+    perceived: dict[str, Any] = Field(description="PerceivedQuery as perception returned it")
+    iteration: int = Field(default=0, description="Last completed loop iteration")
+    session: Optional[dict[str, Any]] = Field(default=None, description="SessionState after that iteration")
+    tool_result_text: Optional[str] = Field(default=None, description="What the next decision is shown")
+    candidate: Optional[str] = None
+    verified: bool = Field(default=False, description="A verification passed since the antiderivative last changed")
+    stats: dict[str, Any] = Field(default_factory=dict, description="tool_calls, plan, layer_seconds, budget_exhausted")
+    usage: dict[str, Any] = Field(default_factory=dict, description="TokenUsage billed before the crash")
+    decisions: list[dict[str, Any]] = Field(default_factory=list, description="Decision trace, one per iteration")
+    updated_at: float = 0.0
+
+
+class SolveCheckpoint:
+    """The append-only log of one solve"""
+
+    def __init__(self, path: Path, problem: str, user_id: Optional[str], release):
+        self.path = path
+        self.problem = problem
+        self.user_id = user_id
+        self._release = release
+        self._file = None
+
+    def resume_point(self) -> Optional[ResumePoint]:
+        """Fold the log into a ResumePoint (None if nothing past perception was lost)"""
+        records = read_records(self.path)
+        if not records or records[0].get("kind") != "perception":
+            return None
+        point = ResumePoint(
+            problem=self.problem,
+            user_id=self.user_id,
+            perceived=records[0]["perceived"],
+            updated_at=records[0]["at"]
+        )
+        for record in records[1:]:
+            if record.get("kind") != "iteration":
+                continue
+            point.iteration = record["iteration"]
+            point.session = record["session"]
+            point.tool_result_text = record.get("tool_result_text")
+            point.candidate = record.get("candidate") or point.candidate
+            point.verified = record.get("verified", False)
+            point.stats = record.get("stats", {})
+            point.usage = record.get("usage", {})
+            point.decisions.append(record.get("decision", {}))
+            point.updated_at = record["at"]
+        return point
+
+    def append(self, kind: str, **fields):
+        """Write one record and fsync it; a crash mid-write leaves at most a torn last line"""
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+            if self._file.tell() == 0:
+                header = {"kind": "solve", "at": time.time(), "problem": self.problem, "user_id": self.user_id}
+                self._file.write(json.dumps(header, ensure_ascii=False) + "\n")
+            elif not self._ends_with_newline():
+                self._file.write("\n")  # terminate the line torn by the crash
+        self._file.write(json.dumps({"kind": kind, "at": time.time(), **fields}, ensure_ascii=False, default=str) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _ends_with_newline(self) -> bool:
+        with open(self.path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def finish(self):
+        """The solve returned: its log is no longer needed"""
+        self.close()
+        self.path.unlink(missing_ok=True)
+
+    def close(self):
+        """Stop writing; the log stays on disk for a later resume unless finish() ran"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._release is not None:
+            self._release()
+            self._release = None
+
+
+def read_records(path: Path) -> list[dict]:
+    """A log's records, without the header and without a torn (unparsable) last line"""
+    try:
+        lines = path.read_text(encoding="utf-8").splitlines()
+    except FileNotFoundError:
+        return []
+    records = []
+    for number, line in enumerate(lines):
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            if number < len(lines) - 1:
+                log.warning("skipping corrupt line %d of %s", number + 1, path)
+            continue
+        if record.get("kind") != "solve":
+            records.append(record)
+    return records
+
+
+class CheckpointLog:
+    """Directory of per-solve checkpoint logs"""
+
+    def __init__(self, directory: str = "checkpoints"):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._open: set[str] = set()
+
+    @classmethod
+    def from_env(cls) -> Optional["CheckpointLog"]:
+        """
+        ATOM_CHECKPOINT_DIR=checkpoints   checkpoint solves here (default: off)
+        """
+        directory = os.getenv("ATOM_CHECKPOINT_DIR")
+        return cls(directory) if directory else None
+
+    @staticmethod
+    def key(problem: str, user_id: Optional[str]) -> str:
+        return hashlib.sha256(f"{user_id or ''}\0{problem}".encode("utf-8")).hexdigest()[:24]
+
+    def open(self, problem: str, user_id: Optional[str] = None) -> Optional[SolveCheckpoint]:
+        """
+        The checkpoint for a solve, resuming whatever an earlier process left
+
+        None while the same problem is already being solved for the same user
+        in this process: two solves must not append to one log.
+        """
+        key = self.key(problem, user_id)
+        with self._lock:
+            if key in self._open:
+                return None
+            self._open.add(key)
+
+        def release():
+            with self._lock:
+                self._open.discard(key)
+
+        return SolveCheckpoint(self.directory / f"{key}.jsonl", problem, user_id, release)
+
+    def pending(self) -> list[ResumePoint]:
+        """Solves whose logs survived their process, oldest first"""
+        points = []
+        for path in sorted(self.directory.glob("*.jsonl")):
+            lines = path.read_text(encoding="utf-8").splitlines()
+            header = json.loads(lines[0]) if lines else {}
+            point = SolveCheckpoint(path, header.get("problem", ""), header.get("user_id"), None).resume_point()
+            if point is not None:
+                points.append(point)
+        return sorted(points, key=lambda point: point.updated_at)
+
+    def clear(self) -> int:
+        """Discard every log not open in this process; returns the number removed"""
+        removed = 0
+        for path in self.directory.glob("*.jsonl"):
+            if path.stem not in self._open:
+                path.unlink(missing_ok=True)
+                removed += 1
+        return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or discard checkpoints of interrupted solves")
+    parser.add_argument("command", choices=["list", "clear"])
+    parser.add_argument("--dir", default=os.getenv("ATOM_CHECKPOINT_DIR", "checkpoints"))
+    args = parser.parse_args()
+
+    checkpoints = CheckpointLog(args.dir)
+    if args.command == "list":
+        for point in checkpoints.pending():
+            age = time.time() - point.updated_at
+            print(f"iteration {point.iteration:>3}  {age:>8.0f}s ago  {point.user_id or '-':<12}  {point.problem}")
+    else:
+        print(f"Removed {checkpoints.clear()} checkpoint(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Deadlines: One wall-clock deadline per solve, seen by every layer
+Deterministic: A ContextVar carries the Deadline (like the usage ledger), so
+LLM calls, tool calls and email sending each wait at most for the time left,
+and the action server receives the remaining budget with every tool call
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Optional, TypeVar
+import asyncio
+import functools
+import os
+import time
+
+T = TypeVar("T")
+
+
+class DeadlineExceeded(Exception):
+    """The solve's deadline expired while (or before) a layer was waiting"""
+
+    def __init__(self, layer: str, deadline: "Deadline"):
+        super().__init__(f"deadline of {deadline.seconds:.1f}s exceeded in {layer}")
+        self.layer = layer
+
+
+class Deadline:
+    """An absolute expiry on the monotonic clock"""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    @classmethod
+    def from_env(cls) -> Optional["Deadline"]:
+        """
+        ATOM_SOLVE_DEADLINE_MS=60000      wall-clock limit per solve (default: none)
+        """
+        ms = os.getenv("ATOM_SOLVE_DEADLINE_MS")
+        return cls(int(ms) / 1000) if ms else None
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def cap(self, timeout: Optional[float]) -> float:
+        """The smaller of a call's own timeout and the time left"""
+        remaining = self.remaining()
+        return remaining if timeout is None else min(timeout, remaining)
+
+    def __repr__(self) -> str:
+        return f"Deadline({self.seconds:.1f}s, {self.remaining():.2f}s left)"
+
+
+_current_deadline: ContextVar[Optional[Deadline]] = ContextVar("atom_deadline", default=None)
+
+
+def current() -> Optional[Deadline]:
+    return _current_deadline.get()
+
+
+@contextmanager
+def scope(deadline: Optional[Deadline]):
+    """Make deadline current for the block (None: no deadline)"""
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+def enforced(fn):
+    """
+    Decorator running a coroutine function under a deadline: its deadline=
+    keyword, else an enclosing one, else Deadline.from_env()
+    """
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        deadline = kwargs.get("deadline") or current() or Deadline.from_env()
+        with scope(deadline):
+            return await fn(*args, **kwargs)
+    return wrapper
+
+
+def timeout(default: Optional[float] = None) -> Optional[float]:
+    """A call's timeout capped by the current deadline (default when there is none)"""
+    deadline = current()
+    return default if deadline is None else deadline.cap(default)
+
+
+async def bounded(awaitable: Awaitable[T], layer: str, own_timeout: Optional[float] = None) -> T:
+    """
+    Await within the current deadline; raises DeadlineExceeded (and cancels
+    the awaitable) if it expires first. A timeout of the call's own still
+    raises asyncio.TimeoutError.
+    """
+    deadline = current()
+    if deadline is None:
+        return await asyncio.wait_for(awaitable, own_timeout) if own_timeout else await awaitable
+    if deadline.expired:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise DeadlineExceeded(layer, deadline)
+    capped = deadline.cap(own_timeout)
+    try:
+        return await asyncio.wait_for(awaitable, capped)
+    except asyncio.TimeoutError:
+        if own_timeout is None or capped < own_timeout:
+            raise DeadlineExceeded(layer, deadline) from None
+        raise
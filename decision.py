@@ -5,19 +5,19 @@ Non-Deterministic: Uses LLM for planning and decision-making
 """
 
 from pydantic import BaseModel, Field
-from typing import Literal, Optional, Any
+from typing import Any, Callable, Literal, Optional
 from perception import PerceivedQuery
 from memory import MemoryContext
-from google import genai
+from llm import LLMGateway, extract_json, get_llm
+from planner import DeterministicPlanner, PlanState
+from similar import SimilarityIndex
 import asyncio
 import json
-import os
-from dotenv import load_dotenv
+import tracing
 
-# Load environment
-load_dotenv()
-api_key = os.getenv("GEMINI_API_KEY")
-client = genai.Client(api_key=api_key)
+
+# Solved problems shown as few-shot plans in the decision prompt
+SIMILAR_EXAMPLES = 2
 
 
 # Pydantic Models
@@ -43,19 +43,27 @@ class DecisionOutput(BaseModel):
 class DecisionLayer:
     """Decision cognitive layer - plans execution strategy"""
 
-    def __init__(self):
-        self.client = client
+    def __init__(self, llm: Optional[LLMGateway] = None, similar: Optional[SimilarityIndex] = None):
+        self.llm = llm or get_llm()
+        self.planner = DeterministicPlanner()
+        self.similar = similar
         self.conversation_history = []
-    def _build_decision_prompt(
-            self,
-            perceived: PerceivedQuery,
-            memory: MemoryContext,
-            tool_result: Optional[str] = None
-        ) -> str:
-        """Build prompt for decision-making LLM with full reasoning and error handling"""
-
-        # --- USER PREFERENCES CONTEXT ---
-        user_prefs = f"""
+        # Rendered prompt sections with the memory snapshot they were rendered from
+        self._sections: dict[str, tuple[MemoryContext, Any]] = {}
+
+    def _similar_examples(self, perceived: PerceivedQuery) -> str:
+        """Plans of the nearest solved problems, one line each (empty without an index or a match)"""
+        if self.similar is None:
+            return ""
+        examples = self.similar.query(perceived.expression, perceived.variable, k=SIMILAR_EXAMPLES)
+        if not examples:
+            return ""
+        lines = "\n".join(f"  {e.expression} (similarity {e.similarity:.2f}): {e.plan}" for e in examples)
+        return f"\nSIMILAR SOLVED PROBLEMS (tool sequences that worked):\n{lines}\n"
+
+    @staticmethod
+    def _preferences_context(memory: MemoryContext) -> str:
+        return f"""
                         USER PREFERENCES (from memory):
                         - Name: {memory.preferences.name}
                         - Explanation Style: {memory.preferences.preferred_explanation_style}
@@ -71,6 +79,29 @@ class DecisionLayer:
                         - Signature: {memory.preferences.signature}
                         """
 
+    def _section(self, name: str, memory: MemoryContext, fields: set[str], render: Callable[[], Any]) -> Any:
+        """A rendered prompt section, reused until one of the snapshot fields it shows changes"""
+        cached = self._sections.get(name)
+        if cached is not None and not memory.changed_since(cached[0]) & fields:
+            return cached[1]
+        value = render()
+        self._sections[name] = (memory, value)
+        return value
+
+    def _build_decision_prompt(
+            self,
+            perceived: PerceivedQuery,
+            memory: MemoryContext,
+            tool_result: Optional[str] = None
+        ) -> str:
+        """Build prompt for decision-making LLM with full reasoning and error handling"""
+
+        # --- USER PREFERENCES CONTEXT ---
+        user_prefs = self._section("preferences", memory, {"preferences"}, lambda: self._preferences_context(memory))
+
+        # Term lists within the prompt budget, or by reference past it
+        view = self._section("terms", memory, {"parsed_terms", "integrated_terms"}, memory.prompt_view)
+
         # --- PERCEIVED CONTEXT ---
         problem_context = f"""
                             PERCEIVED PROBLEM:
@@ -79,43 +110,54 @@ class DecisionLayer:
                             - Variable: {perceived.variable}
                             - Features: {json.dumps(perceived.key_features)}
                             """
+        problem_context += self._similar_examples(perceived)
 
         session_context = f"""
                         SESSION STATE:
                         - Iteration: {memory.session.iteration_count}
-                        - Parsed Terms: {memory.session.parsed_terms}
+                        - Parsed Terms: {view.parsed_terms}
                         - Integrated Terms Count: {len(memory.session.integrated_terms)}
                         - Differentiated Terms Count: {len(memory.session.differentiated_terms)}
                         """
+        if view.next_term:
+            session_context += f"- Next Term: {view.next_term}\n"
 
         # --- ALREADY INTEGRATED TERMS ---
         integrated_terms_context = ""
         if memory.session.integrated_terms:
             integrated_terms_context = f"""
                 ALREADY INTEGRATED TERMS:
-                {memory.session.integrated_terms}
+                {view.integrated_terms}
                 Ensure that these terms are NOT integrated again.
             """
 
+        if view.by_reference:
+            integrated_terms_context += """
+                TERM LISTS BY REFERENCE:
+                The term lists are too long to show in full. Pass "@parsed_terms" or "@integrated_terms"
+                as a tool argument and the full list is substituted before the call.
+                compare_polynomials(..., differentiate_verified=true) differentiates verified_terms itself.
+            """
+
         tool_context = f"\nLAST TOOL RESULT:\n{tool_result}\n" if tool_result else ""
 
         # --- TOOL CONTEXT AND WORKFLOW ---
         workflow_guidance = f"""
                             AVAILABLE TOOLS:
-                            1. show_reasoning(steps: list)
-                            2. parse_polynomial(expression: str)
-                            3. integrate_term(coeff: float, power: float)
-                            4. differentiate_term(coeff: float, power: float)
-                            5. format_polynomial_latex(terms: list)
-                            6. compare_polynomials(original: list, verified: list)
-                            7. integrate_symbolic(expression: str, variable: str)
-                            8. differentiate_symbolic(expression: str, variable: str)
-                            9. verify_symbolic_integration(original: str, antiderivative: str, variable: str)
-                            10. send_gmail_text_personalized(to: str,subject: str,body: str,font_style: str = "Arial",font_color: str = "black",signature: str = "",tone: str = "friendly",sender: str = "me")
+                            1. parse_polynomial(expression: str)
+                            2. integrate_term(coeff: float, power: float)
+                            3. differentiate_term(coeff: float, power: float)
+                            4. format_polynomial_latex(terms: list)
+                            5. compare_polynomials(original: list, verified: list)
+                            6. integrate_symbolic(expression: str, variable: str)
+                            7. differentiate_symbolic(expression: str, variable: str)
+                            8. verify_symbolic_integration(original: str, antiderivative: str, variable: str)
+                            9. send_gmail_text_personalized(to: str,subject: str,body: str,font_style: str = "Arial",font_color: str = "black",signature: str = "",tone: str = "friendly",sender: str = "me")
 
                             DECISION RULES:
                             - Choose polynomial or symbolic workflow depending on problem type and user preference.
                             - Always separate reasoning steps from tool calls.
+                            - Put all reasoning in "reasoning_steps"; it is displayed to the user automatically. Never spend an action just to show reasoning.
                             - Show step-by-step reasoning, and tag each step with reasoning type (arithmetic, symbolic, logic, verification, communication, etc.)
                             - Before finalizing, perform internal sanity checks:
                             • Verify calculations or derivations using available tools.
@@ -306,6 +348,7 @@ class DecisionLayer:
     #                 Respond ONLY in JSON format:
     #             """
     
+    @tracing.traced("decision.decide", cat="decision")
     async def decide(
         self,
         perceived: PerceivedQuery,
@@ -318,44 +361,34 @@ class DecisionLayer:
         prompt = self._build_decision_prompt(perceived, memory, tool_result)
 
         try:
-            # Run model inference asynchronously
-            loop = asyncio.get_event_loop()
-            response = await asyncio.wait_for(
-                loop.run_in_executor(
-                    None,
-                    lambda: self.client.models.generate_content(
-                        model="gemini-2.5-flash",
-                        contents=prompt
-                    )
-                ),
-                timeout=30
+            # Run model inference asynchronously (deterministic states hit the cache)
+            response = await self.llm.generate("decision", prompt, timeout=30)
+            parsed = extract_json(response.text)
+            tracing.annotate(
+                iteration=memory.session.iteration_count,
+                action_type=parsed.get("action_type"),
+                cache_hit=response.cached
             )
-
-            result_text = response.text.strip()
-
-            # --- Clean JSON ---
-            if "```json" in result_text:
-                result_text = result_text.split("```json")[1].split("```")[0].strip()
-            elif "```" in result_text:
-                result_text = result_text.split("```")[1].strip()
-
-            parsed = json.loads(result_text)
-
             # --- Construct DecisionOutput ---
+            # Cached only once it validates, so a malformed response is retried next time
             if parsed.get("action_type") == "tool_call":
-                return DecisionOutput(
+                output = DecisionOutput(
                     action_type="tool_call",
                     tool_call=ToolCall(**parsed["tool_call"]),
                     reasoning_steps=parsed.get("reasoning_steps", []),
                     should_continue=parsed.get("should_continue", True)
                 )
+                self.llm.remember("decision", prompt, response)
+                return output
             elif parsed.get("action_type") == "final_answer":
-                return DecisionOutput(
+                output = DecisionOutput(
                     action_type="final_answer",
                     final_answer=parsed.get("final_answer"),
                     reasoning_steps=parsed.get("reasoning_steps", []),
                     should_continue=False
                 )
+                self.llm.remember("decision", prompt, response)
+                return output
             else:
                 return DecisionOutput(
                     action_type="error",
@@ -376,13 +409,60 @@ class DecisionLayer:
                 should_continue=False
             )
 
+    def decide_deterministic(self, perceived: PerceivedQuery, memory: MemoryContext) -> DecisionOutput:
+        """
+        Plan the next action with the rule-based planner, without an LLM call
+
+        Used once a solve has spent its token/cost budget; the plan state is
+        read from the session rather than parsed back out of a prompt.
+        """
+        session = memory.session
+        state = PlanState(
+            problem_type=perceived.problem_type,
+            expression=perceived.expression,
+            variable=perceived.variable,
+            verification_required=memory.preferences.verification_required,
+            parsed_terms=session.parsed_terms,
+            integrated_terms=session.integrated_terms
+        )
+        if session.history:
+            state.last_tool = session.history[-1].get("tool")
+            state.last_result = session.history[-1].get("result")
+        antiderivative = session.latest_results.get("integrate_symbolic")
+        if isinstance(antiderivative, dict):
+            state.antiderivative = antiderivative
+
+        planned = self.planner.next_action(state)
+        tracing.annotate(iteration=session.iteration_count, action_type=planned["action_type"], deterministic=True)
+        if planned["action_type"] == "tool_call":
+            return DecisionOutput(
+                action_type="tool_call",
+                tool_call=ToolCall(**planned["tool_call"]),
+                reasoning_steps=planned["reasoning_steps"]
+            )
+        if planned["action_type"] == "final_answer":
+            return DecisionOutput(
+                action_type="final_answer",
+                final_answer=planned["final_answer"],
+                reasoning_steps=planned["reasoning_steps"],
+                should_continue=False
+            )
+        return DecisionOutput(
+            action_type="error",
+            error_message=planned.get("message", "Planner error"),
+            reasoning_steps=planned["reasoning_steps"],
+            should_continue=False
+        )
+
 ### NEW ADDITIONS
 
+    @tracing.traced("decision.draft_email", cat="decision")
     async def draft_email_content(
         self,
         perceived: PerceivedQuery,
         memory: MemoryContext,
-        final_answer: str
+        final_answer: str,
+        use_llm: bool = True
     ) -> dict:
         """
         Use LLM to draft email subject and body based on user instructions
@@ -391,6 +471,7 @@ class DecisionLayer:
             perceived: Contains email_instruction with user requirements
             memory: User preferences and session history
             final_answer: The computed integration result
+            use_llm: False fills the step-list template instead (budget spent)
             
         Returns:
             dict with 'subject' and 'body' keys
@@ -406,6 +487,8 @@ class DecisionLayer:
         
         # Get session steps for context
         steps_summary = []
+        if memory.session.history_digest.entries:
+            steps_summary.append(memory.session.history_digest.summary())
         for entry in memory.session.history:
             tool = entry.get("tool", "")
             result = entry.get("result", {})
@@ -422,6 +505,9 @@ class DecisionLayer:
             elif tool == "compare_polynomials":
                 status = result.get("status", "")
                 steps_summary.append(f"Verification: {status}")
+
+        if not use_llm:
+            return self._template_email(perceived, steps_summary, final_answer)
         
         # Build drafting prompt
         drafting_prompt = f"""
@@ -476,27 +562,8 @@ class DecisionLayer:
 
         try:
             # Call LLM to draft email
-            loop = asyncio.get_event_loop()
-            response = await asyncio.wait_for(
-                loop.run_in_executor(
-                    None,
-                    lambda: self.client.models.generate_content(
-                        model="gemini-2.5-flash",
-                        contents=drafting_prompt
-                    )
-                ),
-                timeout=30
-            )
-            
-            result_text = response.text.strip()
-            
-            # Clean JSON
-            if "```json" in result_text:
-                result_text = result_text.split("```json")[1].split("```")[0].strip()
-            elif "```" in result_text:
-                result_text = result_text.split("```")[1].strip()
-            
-            drafted = json.loads(result_text)
+            response = await self.llm.generate("email", drafting_prompt, timeout=30)
+            drafted = extract_json(response.text)
             
             # Replace placeholder with styled final answer
             body = drafted.get("body", "")
@@ -504,23 +571,29 @@ class DecisionLayer:
             body = body.replace("{{FINAL_ANSWER}}", styled_answer)
             body = body.replace("{{{{FINAL_ANSWER}}}}", styled_answer)
             
-            return {
+            email = {
                 "subject": drafted.get("subject", f"Answer to {perceived.expression}"),
                 "body": body
             }
+            self.llm.remember("email", drafting_prompt, response)
+            return email
             
         except Exception as e:
             # Fallback if LLM fails
-            return {
-                "subject": f"Answer to the integral of {perceived.expression}",
-                "body": f"""
-                <p>Here are the steps to solve the integral:</p>
-                <ol>
-                    {''.join(f'<li>{step}</li>' for step in steps_summary)}
-                </ol>
-                <p style="font-family: serif; font-size: 18px; font-weight: bold;">
-                Final Answer: {final_answer}
-                </p>
-                """
-            }
+            return self._template_email(perceived, steps_summary, final_answer)
+
+    @staticmethod
+    def _template_email(perceived: PerceivedQuery, steps_summary: list[str], final_answer: str) -> dict:
+        return {
+            "subject": f"Answer to the integral of {perceived.expression}",
+            "body": f"""
+            <p>Here are the steps to solve the integral:</p>
+            <ol>
+                {''.join(f'<li>{step}</li>' for step in steps_summary)}
+            </ol>
+            <p style="font-family: serif; font-size: 18px; font-weight: bold;">
+            Final Answer: {final_answer}
+            </p>
+            """
+        }
 
@@ -0,0 +1,79 @@
+"""
+Solve Events: Typed progress events emitted while a problem is being solved
+Deterministic: Plain pydantic models; main.solve() hands them to an optional
+sink and main.solve_stream() yields them as an async generator
+"""
+
+from pydantic import BaseModel, Field
+from typing import Any, Callable, Literal, Optional, Union
+
+
+class _Event(BaseModel):
+    elapsed: float = Field(description="Seconds since the solve started")
+    iteration: int = 0
+
+
+class PerceptionDone(_Event):
+    type: Literal["perception"] = "perception"
+    problem_type: str
+    expression: str
+    variable: str
+    email_recipient: Optional[str] = Field(default=None, description="Set when the answer will be emailed")
+
+
+class DecisionMade(_Event):
+    type: Literal["decision"] = "decision"
+    action_type: str
+    tool_name: Optional[str] = None
+    deterministic: bool = Field(default=False, description="Planned without the LLM (budget exhausted)")
+    reasoning_steps: list[str] = Field(default_factory=list)
+
+
+class ToolStarted(_Event):
+    type: Literal["tool_started"] = "tool_started"
+    tool_name: str
+    arguments: dict[str, Any] = Field(default_factory=dict, description="As decided (@references unexpanded)")
+
+
+class ToolFinished(_Event):
+    type: Literal["tool_finished"] = "tool_finished"
+    tool_name: str
+    success: bool
+    result: Any = None
+    error_message: Optional[str] = None
+    seconds: float = 0.0
+
+
+class FinalAnswer(_Event):
+    type: Literal["final_answer"] = "final_answer"
+    answer: Optional[str] = Field(default=None, description="None if the decision gave no text")
+    from_solution_store: bool = False
+
+
+class EmailQueued(_Event):
+    type: Literal["email_queued"] = "email_queued"
+    recipient: str
+    speculative_draft: bool = Field(default=False, description="Reusing the draft written during verification")
+
+
+class LoopIntervened(_Event):
+    """The loop guard replayed a repeated call or took over planning"""
+    type: Literal["loop_intervened"] = "loop_intervened"
+    kind: str = Field(description="replay, cycle or stall")
+    tool_name: str
+    action: str
+
+
+class SolveFinished(_Event):
+    """Always the last event of solve_stream(); carries the full SolveStats as a dict"""
+    type: Literal["finished"] = "finished"
+    status: str
+    final_answer: Optional[str] = None
+    stats: dict[str, Any] = Field(default_factory=dict)
+
+
+SolveEvent = Union[
+    PerceptionDone, DecisionMade, ToolStarted, ToolFinished, FinalAnswer, EmailQueued, LoopIntervened, SolveFinished
+]
+
+EventSink = Callable[[SolveEvent], None]
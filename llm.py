@@ -0,0 +1,412 @@
+"""
+LLM Gateway: Pluggable backends behind every LLM call site
+Non-Deterministic: Gemini in production; a scriptable local stub for offline
+load testing (canned or rule-generated JSON, configurable latency and errors)
+"""
+
+from abc import ABC, abstractmethod
+from pydantic import BaseModel, Field
+from typing import Any, Callable, Optional
+import ast
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import time
+from dotenv import load_dotenv
+
+from llm_cache import ResponseCache, get_response_cache
+from planner import DeterministicPlanner, PlanState
+import tracing
+import accounting
+import deadlines
+from accounting import estimate_usage
+
+load_dotenv()
+
+DEFAULT_MODEL = "gemini-2.5-flash"
+
+
+class LLMResponse(BaseModel):
+    """Text returned by a backend (or the cache)"""
+    text: str
+    backend: str = ""
+    cached: bool = False
+    usage: dict[str, int] = Field(
+        default_factory=dict,
+        description="prompt_tokens, output_tokens, cached_tokens as reported by the backend"
+    )
+
+
+def extract_json(text: str) -> Any:
+    """Strip markdown fences from an LLM response and parse the JSON inside"""
+    with tracing.span("json.parse", cat="parse", chars=len(text)):
+        result_text = text.strip()
+        if "```json" in result_text:
+            result_text = result_text.split("```json")[1].split("```")[0].strip()
+        elif "```" in result_text:
+            result_text = result_text.split("```")[1].strip()
+        return json.loads(result_text)
+
+
+# ----------------------------------------------------------------------------
+# Backends
+# ----------------------------------------------------------------------------
+
+class LLMBackend(ABC):
+    """Interface implemented by every LLM backend; LLMGateway only calls agenerate()"""
+
+    name = "base"
+
+    @abstractmethod
+    async def agenerate(
+        self,
+        model: str,
+        prompt: str,
+        config: Optional[dict[str, Any]] = None,
+        call_site: Optional[str] = None,
+        timeout: float = 30
+    ) -> LLMResponse:
+        """Generate a response, raising asyncio.TimeoutError after timeout seconds"""
+
+
+class GeminiBackend(LLMBackend):
+    """Google Gemini through google.genai"""
+
+    name = "gemini"
+
+    def __init__(self, api_key: Optional[str] = None):
+        self.api_key = api_key or os.getenv("GEMINI_API_KEY")
+        self._client = None
+
+    @property
+    def client(self):
+        # Created lazily so importing the layers never needs an API key
+        if self._client is None:
+            from google import genai
+            self._client = genai.Client(api_key=self.api_key)
+        return self._client
+
+    async def agenerate(self, model, prompt, config=None, call_site=None, timeout=30) -> LLMResponse:
+        """Run the blocking client call in the default executor with a timeout"""
+        loop = asyncio.get_event_loop()
+        return await asyncio.wait_for(
+            loop.run_in_executor(None, lambda: self.generate(model, prompt, config, call_site)),
+            timeout=timeout
+        )
+
+    def generate(self, model, prompt, config=None, call_site=None) -> LLMResponse:
+        """Blocking generation call"""
+        response = self.client.models.generate_content(
+            model=model,
+            contents=prompt,
+            config=config or None
+        )
+        return LLMResponse(text=response.text, backend=self.name, usage=self._usage(response))
+
+    @staticmethod
+    def _usage(response) -> dict[str, int]:
+        meta = getattr(response, "usage_metadata", None)
+        if meta is None:
+            return {}
+        # Thinking tokens are billed as output
+        return {
+            "prompt_tokens": meta.prompt_token_count or 0,
+            "output_tokens": (meta.candidates_token_count or 0) + (meta.thoughts_token_count or 0),
+            "cached_tokens": meta.cached_content_token_count or 0
+        }
+
+
+class StubBackendError(RuntimeError):
+    """Error injected by the stub backend"""
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """
+    Parse a latency distribution spec into a sampler returning seconds
+
+    Specs (milliseconds): "fixed:200", "uniform:100,400",
+    "normal:250,50", "lognormal:250,0.5" (median ms, sigma)
+    """
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",") if v.strip()] or [0.0]
+    if kind == "fixed":
+        return lambda rng: values[0] / 1000
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1]) / 1000
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1])) / 1000
+    if kind == "lognormal":
+        mu = math.log(max(values[0], 1e-3))
+        return lambda rng: rng.lognormvariate(mu, values[1]) / 1000
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+class StubBackend(LLMBackend):
+    """
+    Local scriptable stand-in for Gemini
+
+    Responses come from the first matching script rule
+    ({"match": regex, "call_site": optional, "response": str | dict}),
+    otherwise they are generated by rules that mimic each call site, so the
+    full agent can run end to end with no network.
+    """
+
+    name = "stub"
+
+    def __init__(
+        self,
+        script: Optional[list[dict]] = None,
+        latency: str = "fixed:0",
+        error_rate: float = 0.0,
+        seed: Optional[int] = None
+    ):
+        self.script = [
+            {**rule, "_pattern": re.compile(rule["match"], re.DOTALL)}
+            for rule in (script or [])
+        ]
+        self.sample_latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.planner = DeterministicPlanner()
+        self.calls = 0
+        # Latest antiderivative per (expression, variable); the decision prompt
+        # only shows the last tool result
+        self._antiderivatives: dict[tuple[str, str], dict] = {}
+
+    @classmethod
+    def from_script_file(cls, path: str, **kwargs) -> "StubBackend":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(script=json.load(f), **kwargs)
+
+    def generate(self, model, prompt, config=None, call_site=None) -> LLMResponse:
+        time.sleep(self.sample_latency(self.rng))
+        return self._respond(prompt, call_site)
+
+    async def agenerate(self, model, prompt, config=None, call_site=None, timeout=30) -> LLMResponse:
+        # Sleep on the event loop rather than in a worker thread so thousands
+        # of concurrent stub calls do not exhaust the executor
+        async def respond():
+            await asyncio.sleep(self.sample_latency(self.rng))
+            return self._respond(prompt, call_site)
+        return await asyncio.wait_for(respond(), timeout=timeout)
+
+    def _respond(self, prompt: str, call_site: Optional[str]) -> LLMResponse:
+        self.calls += 1
+        if self.error_rate and self.rng.random() < self.error_rate:
+            raise StubBackendError("Injected stub backend error")
+
+        call_site = call_site or self._guess_call_site(prompt)
+        for rule in self.script:
+            if rule.get("call_site") not in (None, call_site):
+                continue
+            if rule["_pattern"].search(prompt):
+                response = rule["response"]
+                text = response if isinstance(response, str) else json.dumps(response)
+                return LLMResponse(text=text, backend=self.name, usage=estimate_usage(prompt, text))
+
+        if call_site == "perception":
+            payload = self._perceive(prompt)
+        elif call_site == "email":
+            payload = self._draft_email(prompt)
+        else:
+            payload = self._decide(prompt)
+        text = json.dumps(payload)
+        return LLMResponse(text=text, backend=self.name, usage=estimate_usage(prompt, text))
+
+    @staticmethod
+    def _guess_call_site(prompt: str) -> str:
+        if "USER QUERY:" in prompt:
+            return "perception"
+        if "drafting an email" in prompt:
+            return "email"
+        return "decision"
+
+    # --- Rule-generated responses ---
+
+    @staticmethod
+    def _perceive(prompt: str) -> dict:
+        query = prompt.split("USER QUERY:", 1)[-1].split("Analyze and respond", 1)[0].strip()
+        email = re.search(r'[\w\.-]+@[\w\.-]+', query)
+
+        text = re.split(r'\b(?:and\s+)?(?:send|email|mail)\b', query, flags=re.IGNORECASE)[0]
+        text = re.sub(
+            r'\b(solve|find|compute|calculate|evaluate|integrate|the|integral|of|please)\b',
+            " ", text, flags=re.IGNORECASE
+        )
+        variable_match = re.search(r'\bd([a-z])\s*$', text.strip())
+        variable = variable_match.group(1) if variable_match else "x"
+        expression = re.sub(rf'\s*d{variable}\s*$', "", text.strip())
+        expression = expression.replace("∫", "").strip(" .,:")
+
+        features = {
+            "has_trig": bool(re.search(r'sin|cos|tan|sec|csc|cot', expression)),
+            "has_exp": bool(re.search(r'exp|e\^', expression)),
+            "has_log": bool(re.search(r'log|ln', expression)),
+        }
+        features["has_polynomials"] = variable in expression
+        if any(features[k] for k in ("has_trig", "has_exp", "has_log")):
+            problem_type = "symbolic"
+        elif re.fullmatch(rf'[\d\s\.\+\-\*\^{variable}]+', expression):
+            problem_type = "polynomial"
+        else:
+            problem_type = "unknown"
+
+        return {
+            "problem_type": problem_type,
+            "expression": expression,
+            "variable": variable,
+            "reasoning": [f"[CLASSIFICATION_LOGIC] Stub classified as {problem_type}"],
+            "key_features": features,
+            "email_instruction": {"recipient": email.group(0)} if email else None
+        }
+
+    def _decide(self, prompt: str) -> dict:
+        def field(label: str, default: str = "") -> str:
+            match = re.search(rf'- {label}: (.*)', prompt)
+            return match.group(1).strip() if match else default
+
+        def literal(text: str) -> Any:
+            try:
+                return ast.literal_eval(text)
+            except (ValueError, SyntaxError):
+                return None
+
+        state = PlanState(
+            problem_type=field("Type", "unknown"),
+            expression=field("Expression"),
+            variable=field("Variable", "x"),
+            verification_required=field("Verification Required", "True") == "True",
+            parsed_terms=literal(field("Parsed Terms", "None"))
+        )
+        integrated = re.search(r'ALREADY INTEGRATED TERMS:\s*(\[.*?\])\s*\n', prompt, re.DOTALL)
+        if integrated:
+            state.integrated_terms = literal(integrated.group(1)) or []
+        # Long term lists arrive as @references with counts and the next term
+        referenced = re.match(r'@parsed_terms \((\d+) terms', field("Parsed Terms"))
+        if referenced:
+            state.by_reference = True
+            state.parsed_count = int(referenced.group(1))
+            next_term = re.match(r'#\d+ (\{.*\})', field("Next Term"))
+            state.next_term = literal(next_term.group(1)) if next_term else None
+            done = re.search(r'ALREADY INTEGRATED TERMS:\s*@integrated_terms \((\d+) terms, (\d+) errors', prompt)
+            if done:
+                state.integrated_count, state.integrated_errors = int(done.group(1)), int(done.group(2))
+
+        last = re.search(
+            r"LAST TOOL RESULT:\nTool '(\w+)' (succeeded|failed): (.*?)\n\s*AVAILABLE TOOLS:",
+            prompt, re.DOTALL
+        )
+        key = (state.expression, state.variable)
+        if last:
+            state.last_tool = last.group(1)
+            try:
+                state.last_result = json.loads(last.group(3))
+            except json.JSONDecodeError:
+                state.last_result = last.group(3).strip()
+            if state.last_tool == "integrate_symbolic" and isinstance(state.last_result, dict):
+                self._antiderivatives[key] = state.last_result
+        else:
+            self._antiderivatives.pop(key, None)
+        state.antiderivative = self._antiderivatives.get(key)
+        return self.planner.next_action(state)
+
+    @staticmethod
+    def _draft_email(prompt: str) -> dict:
+        expression = re.search(r'- Expression: (.*)', prompt)
+        expression = expression.group(1).strip() if expression else "the problem"
+        return {
+            "subject": f"Answer to the integral of {expression}",
+            "body": f"<p>Hello,</p><p>Here is the integral of {expression}:</p><p>{{{{FINAL_ANSWER}}}}</p>"
+        }
+
+
+def get_backend(name: Optional[str] = None) -> LLMBackend:
+    """
+    Select a backend by name or from the environment
+
+    ATOM_LLM_BACKEND=gemini|stub
+    ATOM_STUB_SCRIPT=path.json         canned stub rules
+    ATOM_STUB_LATENCY=lognormal:300,0.4
+    ATOM_STUB_ERROR_RATE=0.05
+    ATOM_STUB_SEED=42
+    """
+    name = (name or os.getenv("ATOM_LLM_BACKEND", "gemini")).lower()
+    if name == "gemini":
+        return GeminiBackend()
+    if name == "stub":
+        kwargs = {
+            "latency": os.getenv("ATOM_STUB_LATENCY", "fixed:0"),
+            "error_rate": float(os.getenv("ATOM_STUB_ERROR_RATE", "0")),
+            "seed": int(os.getenv("ATOM_STUB_SEED")) if os.getenv("ATOM_STUB_SEED") else None
+        }
+        script = os.getenv("ATOM_STUB_SCRIPT")
+        return StubBackend.from_script_file(script, **kwargs) if script else StubBackend(**kwargs)
+    raise ValueError(f"Unknown LLM backend: {name}")
+
+
+# ----------------------------------------------------------------------------
+# Gateway
+# ----------------------------------------------------------------------------
+
+class LLMGateway:
+    """Single entry point for LLM calls: response cache in front of a backend"""
+
+    def __init__(
+        self,
+        backend: Optional[LLMBackend] = None,
+        cache: Optional[ResponseCache] = None,
+        model: Optional[str] = None
+    ):
+        self.backend = backend or get_backend()
+        self.cache = cache or get_response_cache()
+        self.model = model or os.getenv("ATOM_LLM_MODEL", DEFAULT_MODEL)
+
+    async def generate(
+        self,
+        call_site: str,
+        prompt: str,
+        config: Optional[dict[str, Any]] = None,
+        timeout: float = 30
+    ) -> LLMResponse:
+        """Serve from cache or call the backend (within the current solve deadline, if any)"""
+        with tracing.span(
+            "llm.generate", cat="llm",
+            call_site=call_site, backend=self.backend.name, model=self.model, prompt_chars=len(prompt)
+        ) as span:
+            cached = self.cache.get(call_site, self.model, prompt, config)
+            span.set(cache_hit=cached is not None)
+            if cached is not None:
+                accounting.record(call_site, self.model, {}, cached=True)
+                return LLMResponse(text=cached, backend=self.backend.name, cached=True)
+            response = await deadlines.bounded(
+                self.backend.agenerate(self.model, prompt, config, call_site=call_site, timeout=timeout),
+                layer=f"llm.{call_site}"
+            )
+            accounting.record(call_site, self.model, response.usage)
+            span.set(response_chars=len(response.text), **response.usage)
+            return response
+
+    def remember(
+        self,
+        call_site: str,
+        prompt: str,
+        response: LLMResponse,
+        config: Optional[dict[str, Any]] = None
+    ):
+        """Cache a response once the call site has parsed it successfully"""
+        if not response.cached:
+            self.cache.put(call_site, self.model, prompt, response.text, config)
+
+
+_default_gateway: Optional[LLMGateway] = None
+
+
+def get_llm() -> LLMGateway:
+    """Process-wide gateway shared by all layers"""
+    global _default_gateway
+    if _default_gateway is None:
+        _default_gateway = LLMGateway()
+    return _default_gateway
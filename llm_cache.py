@@ -0,0 +1,194 @@
+"""
+LLM Response Cache: Content-addressed cache in front of every LLM call site
+Deterministic: In-memory LRU with an optional SQLite tier, keyed by a hash of
+(model, prompt, generation config) and tagged with the prompt version
+"""
+
+from collections import OrderedDict
+from typing import Any, Optional
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+# Bump whenever a prompt template changes meaning; entries written under any
+# other version are treated as expired and purged from the disk tier.
+PROMPT_VERSION = "1"
+
+CALL_SITES = ("perception", "decision", "email")
+
+
+class ResponseCache:
+    """Two-tier (memory LRU + optional SQLite) cache of raw LLM response text"""
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        db_path: Optional[str] = None,
+        prompt_version: str = PROMPT_VERSION,
+        enabled_sites: Optional[set[str]] = None
+    ):
+        self.max_entries = max_entries
+        self.prompt_version = prompt_version
+        self.enabled_sites = set(CALL_SITES if enabled_sites is None else enabled_sites)
+        # key -> (call site, response text)
+        self._memory: OrderedDict[str, tuple[str, str]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " key TEXT PRIMARY KEY,"
+                " call_site TEXT NOT NULL,"
+                " prompt_version TEXT NOT NULL,"
+                " response TEXT NOT NULL,"
+                " created_at REAL NOT NULL)"
+            )
+            self._expire_stale_versions()
+
+    @classmethod
+    def from_env(cls) -> "ResponseCache":
+        """
+        Build a cache from environment variables
+
+        ATOM_LLM_CACHE=0            disable caching for every call site
+        ATOM_LLM_CACHE_SITES=a,b    enable only these call sites
+        ATOM_LLM_CACHE_SIZE=512     in-memory LRU capacity
+        ATOM_LLM_CACHE_DB=path      enable the SQLite tier
+        ATOM_PROMPT_VERSION=tag     override the prompt-version tag
+        """
+        if os.getenv("ATOM_LLM_CACHE", "1") == "0":
+            sites: set[str] = set()
+        elif os.getenv("ATOM_LLM_CACHE_SITES"):
+            sites = {s.strip() for s in os.getenv("ATOM_LLM_CACHE_SITES", "").split(",") if s.strip()}
+        else:
+            sites = set(CALL_SITES)
+        return cls(
+            max_entries=int(os.getenv("ATOM_LLM_CACHE_SIZE", "512")),
+            db_path=os.getenv("ATOM_LLM_CACHE_DB") or None,
+            prompt_version=os.getenv("ATOM_PROMPT_VERSION", PROMPT_VERSION),
+            enabled_sites=sites
+        )
+
+    @staticmethod
+    def make_key(model: str, prompt: str, config: Optional[dict[str, Any]] = None) -> str:
+        """Content address of a request"""
+        payload = json.dumps([model, prompt, config or {}], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def is_enabled(self, call_site: str) -> bool:
+        return call_site in self.enabled_sites
+
+    def get(
+        self,
+        call_site: str,
+        model: str,
+        prompt: str,
+        config: Optional[dict[str, Any]] = None
+    ) -> Optional[str]:
+        """Return the cached response text, or None on a miss"""
+        if not self.is_enabled(call_site):
+            return None
+        key = self.make_key(model, prompt, config)
+
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key][1]
+
+        if self._db is not None:
+            row = self._db.execute(
+                "SELECT response FROM llm_cache WHERE key = ? AND prompt_version = ?",
+                (key, self.prompt_version)
+            ).fetchone()
+            if row:
+                self._remember(call_site, key, row[0])
+                with self._lock:
+                    self.hits += 1
+                    self.disk_hits += 1
+                return row[0]
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(
+        self,
+        call_site: str,
+        model: str,
+        prompt: str,
+        response_text: str,
+        config: Optional[dict[str, Any]] = None
+    ):
+        """Store a response that the call site successfully parsed"""
+        if not self.is_enabled(call_site):
+            return
+        key = self.make_key(model, prompt, config)
+        self._remember(call_site, key, response_text)
+        if self._db is not None:
+            with self._db:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?, ?)",
+                    (key, call_site, self.prompt_version, response_text, time.time())
+                )
+
+    def invalidate(self, call_site: Optional[str] = None):
+        """Drop cached responses: all of them, or one call site's in both tiers"""
+        with self._lock:
+            if call_site:
+                for key in [key for key, (site, _) in self._memory.items() if site == call_site]:
+                    del self._memory[key]
+            else:
+                self._memory.clear()
+        if self._db is not None:
+            with self._db:
+                if call_site:
+                    self._db.execute("DELETE FROM llm_cache WHERE call_site = ?", (call_site,))
+                else:
+                    self._db.execute("DELETE FROM llm_cache")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._memory),
+            "prompt_version": self.prompt_version
+        }
+
+    def _remember(self, call_site: str, key: str, response_text: str):
+        with self._lock:
+            self._memory[key] = (call_site, response_text)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _expire_stale_versions(self):
+        with self._db:
+            self._db.execute(
+                "DELETE FROM llm_cache WHERE prompt_version != ?",
+                (self.prompt_version,)
+            )
+
+
+_default_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> ResponseCache:
+    """Process-wide cache shared by all layers"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ResponseCache.from_env()
+    return _default_cache
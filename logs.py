@@ -0,0 +1,181 @@
+"""
+Logs: Structured, leveled logging with a non-blocking queue handler
+Deterministic: Callers only enqueue records; a listener thread renders them
+through the configured sink (rich for interactive use, json or plain text)
+"""
+
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+
+import tracing
+
+
+ROOT_LOGGER = "atom"
+
+# Attributes every LogRecord has; anything else came in through extra=
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+def record_fields(record: logging.LogRecord) -> dict:
+    """Structured fields passed as extra= (plus trace ids, when tracing)"""
+    return {k: v for k, v in vars(record).items() if k not in _RECORD_ATTRS}
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """
+    Enqueues records without formatting them
+
+    The stdlib QueueHandler renders the message in the calling thread so the
+    record can be pickled; our listener lives in the same process, so the
+    %-formatting and field rendering move to the listener thread as well.
+    Callers must not mutate objects passed as args after logging them.
+    When the queue is full the record is dropped rather than blocking.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        context = tracing.current_context()
+        if context is not None:
+            record.trace_id = context["trace_id"]
+            record.span_id = context["span_id"]
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+            **record_fields(record)
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Plain `time level logger: message key=value ...` lines"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = record_fields(record)
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return line
+
+
+def _rich_handler(stream) -> logging.Handler:
+    from rich.console import Console
+    from rich.logging import RichHandler
+
+    class _RichFieldsHandler(RichHandler):
+        def render_message(self, record, message):
+            fields = record_fields(record)
+            fields.pop("trace_id", None)
+            fields.pop("span_id", None)
+            message = f"{record.name.rpartition('.')[2]}: {message}"
+            if fields:
+                message += "  " + " ".join(f"{k}={v}" for k, v in fields.items())
+            return super().render_message(record, message)
+
+    return _RichFieldsHandler(
+        console=Console(file=stream, force_terminal=False),
+        show_time=False,
+        show_path=False,
+        markup=False,
+        rich_tracebacks=False
+    )
+
+
+# ----------------------------------------------------------------------------
+# Module API
+# ----------------------------------------------------------------------------
+
+_handler: Optional[_DeferredQueueHandler] = None
+_listener: Optional[QueueListener] = None
+
+
+def configure(
+    level: Optional[str] = None,
+    sink: Optional[str] = None,
+    path: Optional[str] = None,
+    queue_size: int = 10000
+) -> QueueListener:
+    """
+    Route the "atom" loggers through a queue to one sink
+
+    ATOM_LOG_LEVEL=INFO          DEBUG | INFO | WARNING | ERROR
+    ATOM_LOG_SINK=rich           rich | json | text
+    ATOM_LOG_FILE=agent.log      append there instead of stderr
+
+    Arguments take precedence over the environment.
+    """
+    global _handler, _listener
+    shutdown()
+
+    level = (level or os.getenv("ATOM_LOG_LEVEL", "INFO")).upper()
+    sink = sink or os.getenv("ATOM_LOG_SINK", "rich")
+    path = path or os.getenv("ATOM_LOG_FILE")
+    stream = open(path, "a", encoding="utf-8") if path else sys.stderr
+
+    if sink == "rich":
+        output = _rich_handler(stream)
+    else:
+        output = logging.StreamHandler(stream)
+        output.setFormatter(JSONFormatter() if sink == "json" else TextFormatter())
+
+    _handler = _DeferredQueueHandler(queue.Queue(maxsize=queue_size))
+    logger = logging.getLogger(ROOT_LOGGER)
+    logger.handlers = [_handler]
+    logger.setLevel(level)
+    logger.propagate = False
+
+    _listener = QueueListener(_handler.queue, output)
+    _listener.start()
+    atexit.register(shutdown)
+    return _listener
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    Logger under "atom"
+
+    Until configure() runs the level is inherited from the root logger
+    (WARNING), so info/debug calls return before any formatting.
+    """
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def dropped() -> int:
+    """Records dropped because the queue was full"""
+    return _handler.dropped if _handler is not None else 0
+
+
+def shutdown():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,125 @@
+"""
+Loop Guard: Catches the decision loop repeating itself
+Deterministic: Fingerprints every tool call as (tool_name, resolved arguments);
+repeated calls to pure tools are answered from the solve's earlier results,
+and a cycle or a streak of iterations without progress hands planning to the
+rule-based planner
+"""
+
+from pydantic import BaseModel, Field
+from typing import Any, Literal, Optional
+import hashlib
+import json
+import os
+
+from action import ActionResult
+
+
+def fingerprint(tool_name: str, arguments: dict[str, Any]) -> str:
+    """Stable id of a call: the same tool with equal arguments (key order ignored)"""
+    payload = json.dumps([tool_name, arguments], sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class LoopIntervention(BaseModel):
+    """One time the guard stepped in"""
+    iteration: int
+    kind: Literal["replay", "repeat", "cycle", "stall"]
+    tool_name: str = Field(description="The repeated (or stalled) call")
+    fingerprint: str
+    action: str = Field(description="What was done instead")
+    period: int = Field(default=0, description="Calls per repetition of a cycle")
+    iterations_saved_upper_bound: int = Field(
+        default=0,
+        description="Iterations left before max_iterations when the solve finished after a takeover; "
+                    "an upper bound, since the LLM might have left the loop on its own sooner"
+    )
+    seconds_saved: float = Field(default=0.0, description="Round trip avoided by a replay")
+
+
+class LoopGuard:
+    """
+    Per-solve record of tool calls
+
+    check() runs on each LLM-decided tool call before it executes: it returns
+    "repeat" for a pure call that already succeeded, "cycle" when the call
+    would complete the same block of calls twice in a row (period up to
+    max_period, so A A or A B A B, failed calls included), or "stall" after
+    stall_limit iterations in a row produced nothing new. replay() returns
+    the earlier successful result of an identical call to a pure tool.
+    """
+
+    def __init__(self, replayable: set[str], max_period: int = 3, stall_limit: int = 3):
+        self.replayable = replayable
+        self.max_period = max_period
+        self.stall_limit = stall_limit
+        self.calls: list[str] = []
+        self.stalled = 0
+        self.interventions: list[LoopIntervention] = []
+        self._results: dict[str, ActionResult] = {}
+
+    @classmethod
+    def from_env(cls, replayable: set[str]) -> Optional["LoopGuard"]:
+        """
+        ATOM_LOOP_GUARD=0                disable loop detection and replays
+        ATOM_LOOP_MAX_PERIOD=3           longest repeating block of calls detected
+        ATOM_LOOP_STALL=3                iterations without progress before taking over
+        """
+        if os.getenv("ATOM_LOOP_GUARD", "1") == "0":
+            return None
+        return cls(
+            replayable,
+            max_period=int(os.getenv("ATOM_LOOP_MAX_PERIOD", "3")),
+            stall_limit=int(os.getenv("ATOM_LOOP_STALL", "3"))
+        )
+
+    def check(self, call: str) -> Optional[tuple[str, int]]:
+        """("repeat", 0), ("cycle", period) or ("stall", 0) if the call should not be trusted, else None"""
+        if call in self._results:
+            return "repeat", 0
+        calls = [*self.calls, call]
+        for period in range(1, self.max_period + 1):
+            if len(calls) >= 2 * period and calls[-period:] == calls[-2 * period:-period]:
+                return "cycle", period
+        if self.stalled >= self.stall_limit:
+            return "stall", 0
+        return None
+
+    def replay(self, call: str) -> Optional[ActionResult]:
+        """The earlier result of this exact call, if the tool is pure and it succeeded"""
+        return self._results.get(call)
+
+    def record(self, tool_name: str, call: str, result: ActionResult):
+        """
+        Count an executed (or replayed) call; progress is the first successful
+        call of a pure tool (display-only calls never count)
+        """
+        succeeded = result.success and not _is_error(result.result)
+        progressed = succeeded and tool_name in self.replayable and call not in self.calls
+        self.calls.append(call)
+        self.stalled = 0 if progressed else self.stalled + 1
+        if succeeded and tool_name in self.replayable:
+            self._results.setdefault(call, result)
+
+    def intervene(self, iteration: int, kind: str, tool_name: str, call: str, action: str, **fields) -> LoopIntervention:
+        intervention = LoopIntervention(
+            iteration=iteration, kind=kind, tool_name=tool_name, fingerprint=call, action=action, **fields
+        )
+        self.interventions.append(intervention)
+        return intervention
+
+    def settle(self, solved: bool, iterations: int, max_iterations: int):
+        """
+        Bound what a takeover saved: at worst a loop left alone runs until
+        max_iterations, so a solve finished after one saved at most the rest
+        """
+        if not solved:
+            return
+        for intervention in self.interventions:
+            if intervention.kind != "replay":
+                intervention.iterations_saved_upper_bound = max(0, max_iterations - iterations)
+                break
+
+
+def _is_error(result: Any) -> bool:
+    return isinstance(result, dict) and result.get("status") == "error"
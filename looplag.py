@@ -0,0 +1,231 @@
+"""
+Loop Lag: Event-loop lag monitor and blocking-call detector
+Deterministic: A heartbeat task measures how late the loop wakes it, and a
+watchdog thread samples the loop thread's stack while the loop is stalled;
+lag stats go to the metrics registry and blocked intervals to the trace
+"""
+
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Optional
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+
+import logs
+import tracing
+from metrics import MetricsRegistry, ToolStats, histogram_lines
+
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+log = logs.get_logger("looplag")
+
+
+def _culprit(stack: list[str]) -> str:
+    """Innermost frame from this repo (the code that blocked), else the innermost frame"""
+    for frame in reversed(stack):
+        if frame.startswith(REPO_DIR) and not frame.startswith(__file__):
+            return frame[len(REPO_DIR) + 1:]
+    return stack[-1] if stack else "?"
+
+
+class LoopMonitor:
+    """
+    Measures lag of one asyncio loop and reports callbacks that block it
+
+    The heartbeat sleeps `interval` seconds at a time; lag is how much later
+    than requested it wakes up. The watchdog thread checks every threshold/2
+    and, while the next beat is more than `threshold` overdue, records up to
+    `max_samples` stacks of the loop thread. The block is reported (log
+    warning, trace span, metrics) when the heartbeat finally runs again and
+    knows how long it lasted.
+    """
+
+    def __init__(
+        self,
+        name: str = "orchestrator",
+        interval: float = 0.05,
+        threshold: float = 0.1,
+        max_samples: int = 3,
+        stack_depth: int = 20,
+        report_interval: float = 10.0,
+        registry: Optional[MetricsRegistry] = None
+    ):
+        self.name = name
+        self.interval = interval
+        self.threshold = threshold
+        self.max_samples = max_samples
+        self.stack_depth = stack_depth
+        self.report_interval = report_interval
+        self.lag = ToolStats()
+        self.blocked_total = 0
+        self.blocked_seconds = 0.0
+        self.recent_blocks: deque[dict] = deque(maxlen=20)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._beat = time.monotonic()
+        self._samples: list[list[str]] = []
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._last_report = 0.0
+        self._window = ToolStats()
+        self.registry = registry
+        if registry is not None:
+            registry.register("loop", self)
+
+    # ===== Lifecycle =====
+    def start(self):
+        """Start on the running loop"""
+        self._loop_thread = threading.get_ident()
+        self._beat = self._last_report = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat(), name="looplag-heartbeat")
+        self._watchdog = threading.Thread(target=self._watch, name="looplag-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._report_window()
+
+    # ===== Measurement =====
+    async def _heartbeat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            with self._lock:
+                self._beat = now
+                samples, self._samples = self._samples, []
+
+            blocked = lag >= self.threshold
+            self.lag.observe(lag, not blocked, 0, 0)
+            self._window.observe(lag, not blocked, 0, 0)
+            if blocked:
+                self._report_block(time.time() - (now - expected), lag, samples)
+            if now - self._last_report >= self.report_interval:
+                self._report_window()
+
+    def _watch(self):
+        """Watchdog thread: sample the loop thread's stack while it is stalled"""
+        frames = sys._current_frames
+        while not self._stop.wait(self.threshold / 2):
+            with self._lock:
+                overdue = time.monotonic() - self._beat - self.interval
+                if overdue < self.threshold or len(self._samples) >= self.max_samples:
+                    continue
+                frame = frames().get(self._loop_thread)
+                if frame is not None:
+                    self._samples.append([
+                        f"{entry.filename}:{entry.lineno} in {entry.name}"
+                        for entry in traceback.extract_stack(frame, limit=self.stack_depth)
+                    ])
+
+    # ===== Reporting =====
+    def _report_block(self, started: float, lag: float, samples: list[list[str]]):
+        self.blocked_total += 1
+        self.blocked_seconds += lag
+        culprit = _culprit(samples[0]) if samples else "unknown (blocked between watchdog checks)"
+        self.recent_blocks.append({
+            "at": round(started, 3),
+            "ms": round(lag * 1000, 1),
+            "culprit": culprit,
+            "stack": samples[0] if samples else []
+        })
+        log.warning("event loop blocked for %.0fms in %s", lag * 1000, culprit)
+        if samples:
+            log.debug("blocking stack:\n  %s", "\n  ".join(samples[0]))
+        tracing.complete(
+            "loop.blocked", "loop", started, lag,
+            culprit=culprit, stacks=samples, process=self.name
+        )
+
+    def _report_window(self):
+        """Periodic lag stats of the last report_interval: trace counter and metrics dump"""
+        window, self._window = self._window, ToolStats()
+        self._last_report = time.monotonic()
+        if window.calls:
+            tracing.counter(
+                "loop.lag_ms",
+                mean=window.latency_sum / window.calls * 1000,
+                p95_le=window.quantile(0.95) * 1000,
+                max=window.latency_max * 1000
+            )
+        if self.registry is not None:
+            self.registry.maybe_dump()
+
+    def snapshot(self) -> dict:
+        return {
+            "interval_ms": self.interval * 1000,
+            "threshold_ms": self.threshold * 1000,
+            "beats": self.lag.calls,
+            "lag_ms": {
+                "mean": self.lag.latency_sum / self.lag.calls * 1000 if self.lag.calls else 0.0,
+                "p50_le": self.lag.quantile(0.5) * 1000,
+                "p95_le": self.lag.quantile(0.95) * 1000,
+                "max": self.lag.latency_max * 1000
+            },
+            "blocked_total": self.blocked_total,
+            "blocked_seconds": self.blocked_seconds,
+            "recent_blocks": list(self.recent_blocks)
+        }
+
+    def prometheus_lines(self) -> list[str]:
+        labels = f'process="{self.name}"'
+        return [
+            "# HELP atom_loop_lag_seconds Event-loop heartbeat lag",
+            "# TYPE atom_loop_lag_seconds histogram",
+            *histogram_lines("atom_loop_lag_seconds", labels, self.lag),
+            "# HELP atom_loop_blocked_total Heartbeats delayed past the blocking threshold",
+            "# TYPE atom_loop_blocked_total counter",
+            f"atom_loop_blocked_total{{{labels}}} {self.blocked_total}",
+            "# HELP atom_loop_blocked_seconds_total Time the loop spent blocked",
+            "# TYPE atom_loop_blocked_seconds_total counter",
+            f"atom_loop_blocked_seconds_total{{{labels}}} {self.blocked_seconds}"
+        ]
+
+
+# ----------------------------------------------------------------------------
+# Module API
+# ----------------------------------------------------------------------------
+
+def from_env(name: str, registry: Optional[MetricsRegistry] = None) -> Optional[LoopMonitor]:
+    """
+    ATOM_LOOP_MONITOR=1              enable (off by default)
+    ATOM_LOOP_INTERVAL_MS=50         heartbeat period
+    ATOM_LOOP_BLOCK_MS=100           lag reported as a blocking call
+    """
+    if os.getenv("ATOM_LOOP_MONITOR", "0") in ("", "0", "false"):
+        return None
+    return LoopMonitor(
+        name=name,
+        interval=float(os.getenv("ATOM_LOOP_INTERVAL_MS", "50")) / 1000,
+        threshold=float(os.getenv("ATOM_LOOP_BLOCK_MS", "100")) / 1000,
+        registry=registry
+    )
+
+
+@asynccontextmanager
+async def monitored(name: str, registry: Optional[MetricsRegistry] = None):
+    """Monitor the running loop for the duration of the block, if enabled"""
+    monitor = from_env(name, registry)
+    if monitor is None:
+        yield None
+        return
+    monitor.start()
+    try:
+        yield monitor
+    finally:
+        await monitor.stop()
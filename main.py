@@ -427,215 +427,558 @@ Manages the agent loop and coordinates between layers
 Supports sending final answers via Gmail with full prompt instructions
 """
 
+import argparse
 import asyncio
+import os
 import re
-from mcp import ClientSession, StdioServerParameters
-from mcp.client.stdio import stdio_client
+import sys
+import time
+from contextlib import asynccontextmanager, contextmanager, suppress
+from typing import Any, AsyncIterator, Iterator, Literal, Optional, TextIO
+from pydantic import BaseModel, Field
 from rich.console import Console
 from rich.panel import Panel
 
 from perception import PerceptionLayer, PerceivedQuery
-from memory import MemoryLayer, MemoryContext
+from memory import MemoryLayer, MemoryContext, MemoryPool
 from decision import DecisionLayer, DecisionOutput
-from action import ActionLayer, ActionResult
+from action import ActionLayer, ActionResult, start_servers
+from reasoning import ReasoningSink
+from metrics import MetricsRegistry
+from accounting import SolveBudget, TokenUsage
+from deadlines import Deadline
+from checkpoints import CheckpointLog, SolveCheckpoint
+from solutions import Solution, SolutionStore, canonical_expression, split_terms
+from events import (
+    DecisionMade, EmailQueued, EventSink, FinalAnswer, LoopIntervened, PerceptionDone, SolveEvent,
+    SolveFinished, ToolFinished, ToolStarted
+)
+from loopguard import LoopGuard, LoopIntervention, fingerprint
+import similar
+import accounting
+import deadlines
+import logs
+import looplag
+import profiling
+import tracing
 
 console = Console()
+log = logs.get_logger("agent")
+metrics = MetricsRegistry.from_env(process="orchestrator")
+
+# Tools whose successful result is a complete antiderivative, and tools whose
+# result can overturn it
+ANSWER_TOOLS = {"format_polynomial_latex", "integrate_symbolic"}
+VERIFICATION_TOOLS = {"compare_polynomials", "verify_symbolic_integration"}
+# Tools that change the antiderivative, so an earlier verification no longer covers it
+INTEGRATION_TOOLS = {"parse_polynomial", "integrate_term", "integrate_symbolic"}
+
+# Tools whose result depends only on their arguments, so a repeated call can
+# be answered from the earlier result
+PURE_TOOLS = {
+    "parse_polynomial", "integrate_term", "differentiate_term", "format_polynomial_latex",
+    "compare_polynomials", "integrate_symbolic", "differentiate_symbolic", "verify_symbolic_integration"
+}
+
+
+def candidate_answer(action_result: ActionResult) -> Optional[str]:
+    """Extract the antiderivative produced by an answer tool, if any"""
+    if not action_result.success or action_result.tool_name not in ANSWER_TOOLS:
+        return None
+    result = action_result.result
+    if isinstance(result, dict):
+        if result.get("status") != "success":
+            return None
+        return result.get("latex")
+    return str(result) if result else None
+
+
+def same_answer(answer: Optional[str], other: Optional[str]) -> bool:
+    """Whether two answers differ only in spelling (whitespace, term order, a "+ C")"""
+    if not answer or not other:
+        return False
+    return _answer_terms(answer) == _answer_terms(other)
+
+
+def _answer_terms(answer: str) -> list[str]:
+    return [term for term in split_terms(canonical_expression(answer)) if term not in ("+C", "-C")]
+
+
+def verification_failed(action_result: ActionResult) -> bool:
+    """Whether a verification tool rejected the current antiderivative"""
+    if action_result.tool_name not in VERIFICATION_TOOLS:
+        return False
+    if not action_result.success:
+        return True
+    result = action_result.result
+    return not isinstance(result, dict) or result.get("status") != "pass"
+
+
+class SpeculativeDraft:
+    """Drafts the email in the background while verification tools run"""
+
+    def __init__(self, decision: DecisionLayer):
+        self.decision = decision
+        self.task: Optional[asyncio.Task] = None
+        self.answer: Optional[str] = None
+        self.started_at = 0.0
+        self.finished_at: Optional[float] = None
+        self.discarded = 0
+
+    def start(self, perceived: PerceivedQuery, memory: MemoryContext, answer: str):
+        """Start drafting for a candidate answer (restarts if the answer changed)"""
+        if self.task and self.answer == answer:
+            return
+        self.discard()
+        self.answer = answer
+        self.started_at = time.perf_counter()
+        self.finished_at = None
+        self.task = asyncio.create_task(self._draft(perceived, memory, answer))
+
+    async def _draft(self, perceived: PerceivedQuery, memory: MemoryContext, answer: str) -> dict:
+        try:
+            return await self.decision.draft_email_content(
+                perceived=perceived,
+                memory=memory,
+                final_answer=answer
+            )
+        finally:
+            self.finished_at = time.perf_counter()
+
+    def discard(self):
+        """Throw away the in-flight or finished draft"""
+        if self.task:
+            self.task.cancel()
+            self.discarded += 1
+        self.task = None
+        self.answer = None
+
+    async def collect(self, final_answer: Optional[str]) -> tuple[Optional[dict], float]:
+        """
+        Take the speculative draft if it was written for final_answer
+
+        A draft for a different candidate (the decision rewrote or replaced
+        the tool's answer) is discarded, so the email never disagrees with
+        the answer shown and stored; spelling differences (whitespace, term
+        order, a "+ C") do not count.
+
+        Returns:
+            (draft, seconds of drafting that overlapped the decision-action loop)
+        """
+        if not self.task:
+            return None, 0.0
+        if not same_answer(self.answer, final_answer):
+            log.info("speculative draft was for a different answer - redrafting")
+            self.discard()
+            return None, 0.0
+        wait_start = time.perf_counter()
+        try:
+            draft = await self.task
+        except Exception:
+            self.task = None
+            return None, 0.0
+        waited = time.perf_counter() - wait_start
+        self.task = None
+        return draft, max(0.0, (self.finished_at - self.started_at) - waited)
+
+
+class SolveStats(BaseModel):
+    """Outcome and per-layer timings of a single solve"""
+    problem: str
+    status: Literal["solved", "error", "max_iterations", "budget_exceeded", "deadline_exceeded", "incomplete"] = "incomplete"
+    final_answer: Optional[str] = None
+    error_message: Optional[str] = None
+    iterations: int = 0
+    tool_calls: dict[str, int] = Field(default_factory=dict)
+    layer_seconds: dict[str, list[float]] = Field(
+        default_factory=dict,
+        description="Wall time of every call, keyed by layer"
+    )
+    total_seconds: float = 0.0
+    email_overlap_saved: float = 0.0
+    token_usage: TokenUsage = Field(default_factory=TokenUsage)
+    budget_exhausted: Optional[str] = Field(
+        default=None,
+        description="Why the budget ran out; later decisions were deterministic"
+    )
+    from_solution_store: bool = Field(
+        default=False,
+        description="Answered from a stored solution without the decision-action loop"
+    )
+    plan: list[str] = Field(default_factory=list, description="Tools called, in order")
+    deadline_layer: Optional[str] = Field(
+        default=None,
+        description="Layer whose call ran past the solve deadline"
+    )
+    partial_results: dict[str, Any] = Field(
+        default_factory=dict,
+        description="What an unfinished solve had computed (latest tool results, candidate answer)"
+    )
+    resumed_from: Optional[int] = Field(
+        default=None,
+        description="Iteration restored from a checkpoint left by an interrupted process"
+    )
+    loop_interventions: list[LoopIntervention] = Field(
+        default_factory=list,
+        description="Repeated calls replayed, and cycles or stalls handed to the rule-based planner"
+    )
+    reasoning_steps: int = Field(default=0, description="Reasoning steps the decisions carried")
+    show_reasoning_intercepted: int = Field(
+        default=0,
+        description="show_reasoning tool calls handled in-process instead of over MCP"
+    )
+
+    def to_record(self) -> dict:
+        """Compact JSON-ready outcome (per-layer times summed, in ms) for batch and service results"""
+        return {
+            "status": self.status,
+            "final_answer": self.final_answer,
+            "error": self.error_message,
+            "iterations": self.iterations,
+            "from_solution_store": self.from_solution_store,
+            "tool_calls": self.tool_calls,
+            "total_ms": round(self.total_seconds * 1000, 1),
+            "email_overlap_saved_ms": round(self.email_overlap_saved * 1000, 1),
+            "layer_ms": {layer: round(sum(samples) * 1000, 1) for layer, samples in self.layer_seconds.items()},
+            "tokens": self.token_usage.total_tokens,
+            "cost_usd": self.token_usage.cost_usd,
+            "deadline_layer": self.deadline_layer,
+            "partial_results": self.partial_results,
+            "resumed_from": self.resumed_from,
+            "loop_interventions": len(self.loop_interventions),
+            "iterations_saved_upper_bound": sum(i.iterations_saved_upper_bound for i in self.loop_interventions),
+            "reasoning_steps": self.reasoning_steps,
+            "show_reasoning_intercepted": self.show_reasoning_intercepted
+        }
+
+
+def _timed(stats: SolveStats, layer: str, started: float):
+    stats.layer_seconds.setdefault(layer, []).append(time.perf_counter() - started)
+
+
+def deadline_reached(stats: SolveStats, layer: str, out: Console) -> bool:
+    """Stop the solve as deadline_exceeded if its deadline passed during layer"""
+    deadline = deadlines.current()
+    if deadline is None or not deadline.expired:
+        return False
+    stats.status = "deadline_exceeded"
+    stats.deadline_layer = layer
+    stats.error_message = f"deadline of {deadline.seconds:.1f}s exceeded in {layer}"
+    out.print(f"[red]Stopping: {stats.error_message}[/red]")
+    return True
+
+
+def partial_results(memory: MemoryLayer, candidate: Optional[str]) -> dict[str, Any]:
+    """The session's results so far, returned when a solve stops before its final answer"""
+    session = memory.session
+    partial: dict[str, Any] = {"latest_results": dict(session.latest_results)}
+    if session.integrated_terms:
+        partial["integrated_terms"] = list(session.integrated_terms)
+    if candidate:
+        partial["candidate_answer"] = candidate
+    return partial
+
+
+def verification_status(memory: MemoryLayer, final_answer: Optional[str], verified: Optional[str]) -> str:
+    """
+    How the final answer was verified: pass (it is the verified candidate),
+    skipped (verification not required) or unverified
+    """
+    if same_answer(final_answer, verified):
+        return "pass"
+    return "unverified" if memory.preferences.verification_required else "skipped"
+
+
+async def send_answer_email(
+    action: ActionLayer,
+    memory: MemoryLayer,
+    recipient_email: str,
+    email_draft: dict,
+    stats: SolveStats,
+    started: float,
+    out: Console
+):
+    """Send a drafted answer email with the user's styling preferences"""
+    out.print(f"[magenta]Sending to {recipient_email}...[/magenta]")
+
+    # Send email with drafted content + styling preferences
+    with tracing.span("email.send", cat="email", recipient=recipient_email) as span:
+        trace_context = span.context()
+        try:
+            email_result = await deadlines.bounded(
+                action.session.call_tool(
+                    "send_gmail_text_personalized",
+                    arguments={
+                        "to": recipient_email,
+                        "subject": email_draft["subject"],
+                        "body": email_draft["body"],
+                        "font_style": memory.preferences.font_style,
+                        "font_color": memory.preferences.font_color,
+                        "signature": memory.preferences.signature,
+                        "tone": memory.preferences.communication_tone
+                    },
+                    meta=action.request_meta(trace_context)
+                ),
+                layer="email"
+            )
+        except deadlines.DeadlineExceeded as e:
+            # The answer stands; only its delivery was cut off
+            stats.error_message = f"email not sent: {e}"
+            out.print(f"[red]{stats.error_message}[/red]")
+            return
+        finally:
+            _timed(stats, "email", started)
+
+    if email_result.content and email_result.content[0].text:
+        out.print(f"[green]✓ {email_result.content[0].text}[/green]")
+
+
+@tracing.traced("solve", cat="agent")
+@accounting.metered
+@deadlines.enforced
+async def solve(
+    problem: str,
+    perception: PerceptionLayer,
+    memory: MemoryLayer,
+    decision: DecisionLayer,
+    action: ActionLayer,
+    max_iterations: int = 25,
+    send_emails: bool = True,
+    out: Console = console,
+    budget: Optional[SolveBudget] = None,
+    solutions: Optional[SolutionStore] = None,
+    events: Optional[EventSink] = None,
+    deadline: Optional[Deadline] = None,
+    checkpoint: Optional[SolveCheckpoint] = None
+) -> SolveStats:
+    """
+    Run perception and the decision-action loop for one problem
+
+    Args:
+        problem: Raw user query
+        max_iterations: Upper bound on decision-action iterations
+        send_emails: Honor email instructions (disable for benchmarks)
+        out: Console for progress output
+        budget: Token/cost limits (default: SolveBudget.from_env())
+        solutions: Store of verified answers to reuse and add to (default: none)
+        events: Called with each progress event as it happens (see solve_stream)
+        deadline: Wall-clock limit for every layer's calls (default: an enclosing
+            deadline, else Deadline.from_env()); past it the solve stops as
+            deadline_exceeded with its partial results
+        checkpoint: Log to resume from and to append each iteration to; it is
+            removed when the solve returns (default: none)
+
+    Returns:
+        SolveStats with the final answer and per-layer timings
+    """
+    stats = SolveStats(problem=problem)
+    solve_started = time.perf_counter()
+
+    def emit(event_type: type, **fields):
+        if events is None:
+            return
+        # Progress reporting must never break the solve it reports on
+        try:
+            events(event_type(elapsed=time.perf_counter() - solve_started, **fields))
+        except Exception:
+            log.exception("event sink failed on %s", event_type.__name__)
 
+    prefs = memory.preferences
+    budget = budget or SolveBudget.from_env()
+    ledger = accounting.current_ledger()
+    resume = await asyncio.to_thread(checkpoint.resume_point) if checkpoint else None
+
+    # STEP 4: PERCEPTION
+    out.print("\n[blue]→ PERCEPTION LAYER[/blue]")
+    if resume:
+        # Perceived before the crash: no LLM call to repeat
+        perceived: PerceivedQuery = PerceivedQuery.model_validate(resume.perceived)
+        out.print(f"  [yellow]Resuming from checkpoint after iteration {resume.iteration}[/yellow]")
+    else:
+        started = time.perf_counter()
+        perceived = await perception.perceive(problem)
+        _timed(stats, "perception", started)
+        if checkpoint:
+            await asyncio.to_thread(checkpoint.append, "perception", perceived=perceived.model_dump())
+    deadline_reached(stats, "perception", out)
+    profiling.checkpoint("perception")
+
+    out.print(f"  Problem Type: {perceived.problem_type}")
+    out.print(f"  Expression: {perceived.expression}")
+    out.print(f"  Features: {perceived.key_features}")
+
+    # ✨ NEW: Display email instructions if detected
+    if perceived.email_instruction:
+        email_inst = perceived.email_instruction
+        out.print("\n[magenta]  📧 EMAIL INSTRUCTIONS DETECTED:[/magenta]")
+        out.print(Panel(
+            f"[bold]Recipient:[/bold] {email_inst.recipient}\n"
+            f"[bold]Subject:[/bold] {email_inst.subject or 'Not specified (will be auto-generated)'}\n"
+            f"[bold]Body Template:[/bold] {email_inst.body_template or 'Not specified (will detail steps)'}\n"
+            f"[bold]Signature:[/bold] {email_inst.signature or 'Using default from memory'}\n"
+            f"[bold]Font Style:[/bold] {email_inst.font_style or 'Using preference: ' + prefs.font_style}\n"
+            f"[bold]Font Color:[/bold] {email_inst.font_color or 'Using preference: ' + prefs.font_color}",
+            title="Email Configuration",
+            border_style="magenta"
+        ))
+    else:
+        out.print("  [dim]No email instructions detected[/dim]")
 
-async def main():
-    """Main orchestrator function"""
-
-    console.print(Panel(
-        "[bold cyan]Mathematical Reasoning Agent[/bold cyan]\n"
-        "Four-Layer Cognitive Architecture",
-        border_style="cyan"
-    ))
-
-    # Initialize cognitive layers
-    console.print("\n[yellow]Initializing cognitive layers...[/yellow]")
-
-    perception = PerceptionLayer()
-    memory = MemoryLayer(memory_file="user_memory.json")
-    decision = DecisionLayer()
-
-    console.print("✓ Perception layer ready")
-    console.print("✓ Memory layer ready")
-    console.print("✓ Decision layer ready")
-
-    # STEP 1: Collect user preferences
-    console.print("\n[bold yellow]═══ PREFERENCE COLLECTION PHASE ═══[/bold yellow]")
+    # Detect email instructions
+    send_email = False
+    recipient_email = None
 
-    if not memory.memory_file.exists():
-        memory.collect_preferences_interactive()
+    if hasattr(perceived, "email_instruction") and perceived.email_instruction:
+        send_email = True
+        recipient_email = getattr(perceived.email_instruction, "recipient", None)
     else:
-        console.print(f"[green]✓ Loaded existing preferences for {memory.preferences.name}[/green]")
-
-    prefs = memory.preferences
-    console.print(Panel(
-        f"Name: {prefs.name}\n"
-        f"Explanation Style: {prefs.preferred_explanation_style}\n"
-        f"Method: {prefs.preferred_method}\n"
-        f"Math Level: {prefs.math_level}\n"
-        f"Show Reasoning: {prefs.show_reasoning}",
-        title="User Preferences",
-        border_style="green"
-    ))
+        email_match = re.search(r'[\w\.-]+@[\w\.-]+', problem)
+        if email_match:
+            send_email = True
+            recipient_email = email_match.group(0)
+
+    if send_email and not send_emails:
+        out.print(f"  [dim]Email to {recipient_email} skipped (sending disabled)[/dim]")
+        send_email = False
+    elif send_email:
+        out.print(f"  [magenta]Will send final answer to {recipient_email}[/magenta]")
+
+    emit(
+        PerceptionDone,
+        problem_type=perceived.problem_type,
+        expression=perceived.expression,
+        variable=perceived.variable,
+        email_recipient=recipient_email if send_email else None
+    )
+
+    # STEP 5: MEMORY
+    out.print("\n[blue]→ MEMORY LAYER[/blue]")
+    started = time.perf_counter()
+    memory.update_session(current_problem=problem, iteration_count=0)
+    memory_context: MemoryContext = memory.get_context()
+    _timed(stats, "memory", started)
+    out.print(f"  Loaded preferences for {memory_context.preferences.name}")
+
+    # A verified answer from an earlier session replaces the whole loop
+    stored = solutions.lookup(perceived.expression, perceived.variable) if solutions and stats.status == "incomplete" else None
+    if stored:
+        stats.status = "solved"
+        stats.final_answer = stored.final_answer
+        stats.from_solution_store = True
+        emit(FinalAnswer, answer=stored.final_answer, from_solution_store=True)
+        out.print(Panel(
+            f"[bold green]{stored.final_answer}[/bold green]",
+            title=f"✓ Final Answer (stored solution, {stored.hits} hits)",
+            border_style="green"
+        ))
+        if send_email and recipient_email:
+            started = time.perf_counter()
+            email_draft = await decision.draft_email_content(
+                perceived=perceived,
+                memory=memory.get_context(),
+                final_answer=stored.final_answer,
+                use_llm=not budget.exceeded(ledger.total)
+            )
+            emit(EmailQueued, recipient=recipient_email)
+            await send_answer_email(action, memory, recipient_email, email_draft, stats, started, out)
+    else:
+        # STEP 6: DECISION-ACTION LOOP
+        out.print("\n[blue]→ DECISION-ACTION LOOP[/blue]")
+
+    iteration = 0
+    tool_result_text = None
+    candidate = None
+    verified = False
+    loop_guard = LoopGuard.from_env(PURE_TOOLS)
+    planner_takeover = False
+    if resume and resume.session and stats.status == "incomplete":
+        memory.restore_session(resume.session)
+        iteration = stats.resumed_from = resume.iteration
+        tool_result_text = resume.tool_result_text
+        candidate = resume.candidate
+        verified = resume.verified
+        for field, value in resume.stats.items():
+            setattr(stats, field, value)
+        ledger.total.merge(TokenUsage(**resume.usage))
+    speculative = SpeculativeDraft(decision)
+    reasoning_sink = ReasoningSink.from_env(console=out, render=prefs.show_reasoning)
 
-    # STEP 2: Start MCP server for action layer
-    server_params = StdioServerParameters(command="python", args=["action.py"])
-
-    async with stdio_client(server_params) as (read, write):
-        async with ClientSession(read, write) as session:
-            await session.initialize()
-            console.print("✓ Action layer ready (MCP tools connected)\n")
-
-            action = ActionLayer(mcp_session=session)
-
-            # STEP 3: Get user problem
-            console.print("[bold yellow]═══ AGENTIC FLOW STARTS ═══[/bold yellow]\n")
-
-            problem = input("Enter integration problem (or press Enter for default): ").strip()
-            if not problem:
-                problem = "∫4x^6 - 2x^3 + 7x - 4 dx"
-
-            console.print(Panel(f"[bold]{problem}[/bold]", title="Problem", border_style="cyan"))
-
-            # STEP 4: PERCEPTION
-            console.print("\n[blue]→ PERCEPTION LAYER[/blue]")
-            perceived: PerceivedQuery = await perception.perceive(problem)
-
-            console.print(f"  Problem Type: {perceived.problem_type}")
-            console.print(f"  Expression: {perceived.expression}")
-            console.print(f"  Features: {perceived.key_features}")
-
-            # ✨ NEW: Display email instructions if detected
-            if perceived.email_instruction:
-                email_inst = perceived.email_instruction
-                console.print("\n[magenta]  📧 EMAIL INSTRUCTIONS DETECTED:[/magenta]")
-                console.print(Panel(
-                    f"[bold]Recipient:[/bold] {email_inst.recipient}\n"
-                    f"[bold]Subject:[/bold] {email_inst.subject or 'Not specified (will be auto-generated)'}\n"
-                    f"[bold]Body Template:[/bold] {email_inst.body_template or 'Not specified (will detail steps)'}\n"
-                    f"[bold]Signature:[/bold] {email_inst.signature or 'Using default from memory'}\n"
-                    f"[bold]Font Style:[/bold] {email_inst.font_style or 'Using preference: ' + prefs.font_style}\n"
-                    f"[bold]Font Color:[/bold] {email_inst.font_color or 'Using preference: ' + prefs.font_color}",
-                    title="Email Configuration",
-                    border_style="magenta"
-                ))
-            else:
-                console.print("  [dim]No email instructions detected[/dim]")
-
-            # Detect email instructions
-            send_email = False
-            recipient_email = None
-            email_subject = None
-            email_font_style = None
-            email_font_color = None
-            email_signature = None
-            email_tone = None
-
-            if hasattr(perceived, "email_instruction") and perceived.email_instruction:
-                send_email = True
-                instr = perceived.email_instruction
-                recipient_email = getattr(instr, "recipient", None)
-                email_subject = getattr(instr, "subject", "Integration Result")
-                email_font_style = getattr(instr, "font_style", prefs.font_style)
-                email_font_color = getattr(instr, "font_color", prefs.font_color)
-                email_signature = getattr(instr, "signature", prefs.signature)
-                email_tone = getattr(instr, "tone", prefs.communication_tone)
-            else:
-                email_match = re.search(r'[\w\.-]+@[\w\.-]+', problem)
-                if email_match:
-                    send_email = True
-                    recipient_email = email_match.group(0)
-                    email_subject = "Integration Result"
-                    email_font_style = prefs.font_style
-                    email_font_color = prefs.font_color
-                    email_signature = prefs.signature
-                    email_tone = prefs.communication_tone
-
-            if send_email:
-                console.print(f"  [magenta]Will send final answer to {recipient_email}[/magenta]")
-
-            # STEP 5: MEMORY
-            console.print("\n[blue]→ MEMORY LAYER[/blue]")
-            memory.update_session(current_problem=problem, iteration_count=0)
-            memory_context: MemoryContext = memory.get_context()
-            console.print(f"  Loaded preferences for {memory_context.preferences.name}")
-
-            # STEP 6: DECISION-ACTION LOOP
-            console.print("\n[blue]→ DECISION-ACTION LOOP[/blue]")
-
-            max_iterations = 25
-            iteration = 0
-            tool_result_text = None
-
-            while iteration < max_iterations:
-                iteration += 1
+    try:
+        while stats.status == "incomplete" and iteration < max_iterations:
+            iteration += 1
+            with tracing.span("iteration", cat="agent", iteration=iteration), \
+                    profiling.section(f"iteration {iteration}"):
+                started = time.perf_counter()
                 memory.update_session(iteration_count=iteration)
-
-                console.print(f"\n[dim]--- Iteration {iteration} ---[/dim]")
+                context = memory.get_context()
+                _timed(stats, "memory", started)
+                ledger.iteration = iteration
+
+                if stats.budget_exhausted is None:
+                    stats.budget_exhausted = budget.exceeded(ledger.total)
+                    if stats.budget_exhausted and budget.on_exceed == "stop":
+                        stats.status = "budget_exceeded"
+                        stats.error_message = stats.budget_exhausted
+                        out.print(f"[red]Stopping: {stats.budget_exhausted}[/red]")
+                        break
+                    if stats.budget_exhausted:
+                        out.print(f"[yellow]{stats.budget_exhausted} - planning without the LLM[/yellow]")
+
+                log.info("iteration %d", iteration)
 
                 # DECISION
-                console.print("[blue]  Decision Layer:[/blue] Planning next action...")
-                decision_output: DecisionOutput = await decision.decide(
-                    perceived=perceived,
-                    memory=memory.get_context(),
-                    tool_result=tool_result_text
+                started = time.perf_counter()
+                if stats.budget_exhausted or planner_takeover:
+                    decision_output: DecisionOutput = decision.decide_deterministic(perceived, context)
+                else:
+                    decision_output = await decision.decide(
+                        perceived=perceived,
+                        memory=context,
+                        tool_result=tool_result_text
+                    )
+                _timed(stats, "decision", started)
+                if deadline_reached(stats, "decision", out):
+                    break
+
+                # A cycle or stall in the LLM's plan hands the rest of the solve to the planner
+                if loop_guard and decision_output.action_type == "tool_call" and not (stats.budget_exhausted or planner_takeover):
+                    tool_call = decision_output.tool_call
+                    call = fingerprint(tool_call.tool_name, memory.resolve_references(tool_call.arguments))
+                    suspect = loop_guard.check(call)
+                    if suspect:
+                        planned = decision.decide_deterministic(perceived, context)
+                        planned_call = planned.tool_call
+                        # Unless the planner would make the same call (e.g. two equal terms in a row)
+                        if planned_call is None or fingerprint(
+                            planned_call.tool_name, memory.resolve_references(planned_call.arguments)
+                        ) != call:
+                            kind, period = suspect
+                            action_taken = f"planned {planned_call.tool_name if planned_call else planned.action_type} deterministically"
+                            loop_guard.intervene(iteration, kind, tool_call.tool_name, call, action_taken, period=period)
+                            log.warning("%s at iteration %d on %s: %s", kind, iteration, tool_call.tool_name, action_taken)
+                            out.print(f"[yellow]Loop guard: {kind} on {tool_call.tool_name} - {action_taken}[/yellow]")
+                            emit(LoopIntervened, iteration=iteration, kind=kind, tool_name=tool_call.tool_name, action=action_taken)
+                            decision_output = planned
+                            planner_takeover = True
+
+                emit(
+                    DecisionMade,
+                    iteration=iteration,
+                    action_type=decision_output.action_type,
+                    tool_name=decision_output.tool_call.tool_name if decision_output.tool_call else None,
+                    deterministic=stats.budget_exhausted is not None or planner_takeover,
+                    reasoning_steps=decision_output.reasoning_steps
                 )
 
-                if memory.preferences.show_reasoning and decision_output.reasoning_steps:
-                    for step in decision_output.reasoning_steps:
-                        console.print(f"    [dim]{step}[/dim]")
-
-                # Handle decision
-                # if decision_output.action_type == "final_answer":
-                #     final_ans = decision_output.final_answer
-                #     console.print(Panel(
-                #         f"[bold green]{final_ans}[/bold green]",
-                #         title="✓ Final Answer",
-                #         border_style="green"
-                #     ))
-
-                #     # Send email if required
-                #     if send_email and recipient_email:
-                #         console.print(f"[magenta]Sending final answer to {recipient_email}...[/magenta]")
-
-                #         # Safely get preferences from memory
-                #         email_subject = getattr(memory_context.preferences, "email_subject", "Integration Result")
-                #         email_font_style = getattr(memory_context.preferences, "font_style", "serif")
-                #         email_font_color = getattr(memory_context.preferences, "font_color", "black")
-                #         email_signature = getattr(memory_context.preferences, "signature", "Yours smartly,\nMath Agent")
-                #         email_tone = getattr(memory_context.preferences, "communication_tone", "neutral")
-
-                #         # Ensure all are strings
-                #         email_subject = str(email_subject)
-                #         email_font_style = str(email_font_style)
-                #         email_font_color = str(email_font_color)
-                #         email_signature = str(email_signature)
-                #         email_tone = str(email_tone)
-
-                #         # Call Gmail tool
-                #         email_result = await action.session.call_tool(
-                #             "send_gmail_text_personalized",
-                #             arguments={
-                #                 "to": recipient_email,
-                #                 "subject": email_subject,
-                #                 "body": final_ans,
-                #                 "font_style": email_font_style,
-                #                 "font_color": email_font_color,
-                #                 "signature": email_signature,
-                #                 "tone": email_tone
-                #             }
-                #         )
-
-                #         if email_result.content and email_result.content[0].text:
-                #             console.print(f"[magenta]{email_result.content[0].text}[/magenta]")
-                # In main.py, replace the email sending section:
+                # Reasoning travels inside the decision and is rendered off the loop
+                reasoning_sink.submit(iteration, decision_output.reasoning_steps)
 
                 if decision_output.action_type == "final_answer":
                     final_ans = decision_output.final_answer
-                    console.print(Panel(
+                    stats.status = "solved"
+                    stats.final_answer = final_ans
+                    emit(FinalAnswer, iteration=iteration, answer=final_ans)
+                    out.print(Panel(
                         f"[bold green]{final_ans}[/bold green]",
                         title="✓ Final Answer",
                         border_style="green"
@@ -643,91 +986,464 @@ async def main():
 
                     # Send email if required
                     if send_email and recipient_email:
-                        console.print(f"[magenta]Drafting email using LLM...[/magenta]")
-                        
-                        # Use Decision Layer to draft email content
-                        email_draft = await decision.draft_email_content(
-                            perceived=perceived,
-                            memory=memory.get_context(),
-                            final_answer=final_ans
-                        )
-                        
-                        console.print(f"[magenta]Sending to {recipient_email}...[/magenta]")
-                        
-                        # Get styling preferences
-                        font_style = memory.preferences.font_style
-                        font_color = memory.preferences.font_color
-                        signature = memory.preferences.signature
-                        tone = memory.preferences.communication_tone
-                        
-                        # Send email with drafted content + styling
-                        email_result = await action.session.call_tool(
-                            "send_gmail_text_personalized",
-                            arguments={
-                                "to": recipient_email,
-                                "subject": email_draft["subject"],
-                                "body": email_draft["body"],
-                                "font_style": font_style,
-                                "font_color": font_color,
-                                "signature": signature,
-                                "tone": tone
-                            }
-                        )
-                        
-                        # ✅ CORRECT
-                        if email_result.content and email_result.content[0].text:
-                            console.print(f"[green]✓ {email_result.content[0].text}[/green]")
+                        started = time.perf_counter()
+
+                        # Reuse the speculative draft only if it was written for this answer
+                        email_draft, overlap_saved = await speculative.collect(final_ans)
+                        from_speculation = email_draft is not None
+                        if email_draft:
+                            stats.email_overlap_saved = overlap_saved
+                            out.print(
+                                f"[magenta]Using speculative email draft "
+                                f"(overlap saved {overlap_saved:.2f}s)[/magenta]"
+                            )
+                        else:
+                            use_llm = stats.budget_exhausted is None
+                            out.print(f"[magenta]Drafting email {'using LLM' if use_llm else 'from template'}...[/magenta]")
+
+                            # Use Decision Layer to draft email content
+                            email_draft = await decision.draft_email_content(
+                                perceived=perceived,
+                                memory=memory.get_context(),
+                                final_answer=final_ans,
+                                use_llm=use_llm
+                            )
+
+                        emit(EmailQueued, iteration=iteration, recipient=recipient_email, speculative_draft=from_speculation)
+                        await send_answer_email(action, memory, recipient_email, email_draft, stats, started, out)
 
-                    
                     break
 
-
                 elif decision_output.action_type == "tool_call":
                     tool_call = decision_output.tool_call
-                    console.print(f"[blue]  Action Layer:[/blue] Executing {tool_call.tool_name}")
-                    console.print(f"    [dim]Reason: {tool_call.reasoning}[/dim]")
-
-                    action_result: ActionResult = await action.execute(tool_call)
-
+                    stats.tool_calls[tool_call.tool_name] = stats.tool_calls.get(tool_call.tool_name, 0) + 1
+                    log.info("executing %s: %s", tool_call.tool_name, tool_call.reasoning)
+                    emit(ToolStarted, iteration=iteration, tool_name=tool_call.tool_name, arguments=dict(tool_call.arguments))
+                    tool_started = time.perf_counter()
+
+                    tool_call.arguments = memory.resolve_references(tool_call.arguments)
+                    call = fingerprint(tool_call.tool_name, tool_call.arguments)
+                    if tool_call.tool_name == "show_reasoning":
+                        # Handled locally - no MCP round trip for display-only calls
+                        reasoning_sink.intercept_tool_call(iteration, tool_call.arguments)
+                        action_result = ActionResult(
+                            success=True,
+                            result="Reasoning shown",
+                            tool_name=tool_call.tool_name
+                        )
+                    else:
+                        started = time.perf_counter()
+                        replayed = loop_guard.replay(call) if loop_guard else None
+                        if replayed:
+                            action_result: ActionResult = replayed
+                            loop_guard.intervene(
+                                iteration, "replay", tool_call.tool_name, call, "replayed the earlier result",
+                                seconds_saved=action.mean_round_trip
+                            )
+                            emit(LoopIntervened, iteration=iteration, kind="replay", tool_name=tool_call.tool_name,
+                                 action="replayed the earlier result")
+                        else:
+                            action_result = await action.execute(tool_call)
+                        stats.plan.append(tool_call.tool_name)
+                        _timed(stats, "action", started)
+                    if loop_guard:
+                        loop_guard.record(tool_call.tool_name, call, action_result)
+                    emit(
+                        ToolFinished,
+                        iteration=iteration,
+                        tool_name=tool_call.tool_name,
+                        success=action_result.success,
+                        result=action_result.result,
+                        error_message=action_result.error_message,
+                        seconds=time.perf_counter() - tool_started
+                    )
+
+                    started = time.perf_counter()
                     if action_result.success:
-                        console.print(f"    [green]✓ Success[/green]")
+                        log.info("%s succeeded", tool_call.tool_name)
 
                         # Update memory
                         if tool_call.tool_name == "parse_polynomial":
                             memory.update_session(parsed_terms=action_result.result)
                         elif tool_call.tool_name == "integrate_term":
-                            memory.session.integrated_terms.append(action_result.result)
+                            memory.append_session("integrated_terms", action_result.result)
                         elif tool_call.tool_name == "differentiate_term":
-                            memory.session.differentiated_terms.append(action_result.result)
+                            memory.append_session("differentiated_terms", action_result.result)
 
                         # Add to history
                         memory.add_to_history({
                             "iteration": iteration,
                             "tool": tool_call.tool_name,
-                            "result": action_result.result
+                            "result": action_result.result,
+                            "tokens": ledger.iteration_tokens(iteration)
                         })
                     else:
-                        console.print(f"    [red]✗ Failed: {action_result.error_message}[/red]")
+                        log.warning("%s failed: %s", tool_call.tool_name, action_result.error_message)
+                    _timed(stats, "memory", started)
+
+                    # Speculatively draft the email as soon as an antiderivative exists
+                    answer = candidate_answer(action_result)
+                    candidate = answer or candidate
+                    # A passing verification covers the current antiderivative, and so
+                    # the candidate formatted from it, until the antiderivative changes
+                    if tool_call.tool_name in INTEGRATION_TOOLS or verification_failed(action_result):
+                        verified = False
+                    elif tool_call.tool_name in VERIFICATION_TOOLS:
+                        verified = True
+                    if send_email and recipient_email and not stats.budget_exhausted:
+                        if answer:
+                            speculative.start(perceived, memory.get_context(), answer)
+                        elif verification_failed(action_result) and speculative.task:
+                            log.warning("verification changed the answer - discarding email draft")
+                            speculative.discard()
 
                     tool_result_text = action.format_result_for_decision(action_result)
+                    if checkpoint:
+                        await asyncio.to_thread(
+                            checkpoint.append, "iteration",
+                            iteration=iteration,
+                            session=memory.session.model_dump(),
+                            decision=decision_output.model_dump(),
+                            tool_result=action_result.model_dump(),
+                            tool_result_text=tool_result_text,
+                            candidate=candidate,
+                            verified=verified,
+                            stats=stats.model_dump(include={"tool_calls", "plan", "layer_seconds", "budget_exhausted"}),
+                            usage=ledger.total.model_dump()
+                        )
+                    if deadline_reached(stats, "action", out):
+                        break
 
                 elif decision_output.action_type == "error":
-                    console.print(f"[red]Error: {decision_output.error_message}[/red]")
+                    stats.status = "error"
+                    stats.error_message = decision_output.error_message
+                    out.print(f"[red]Error: {decision_output.error_message}[/red]")
                     break
 
                 if not decision_output.should_continue:
                     break
+    finally:
+        # Drop a draft that never reached the final answer, also when the solve raised or was cancelled
+        if speculative.task:
+            speculative.task.cancel()
+        reasoning_sink.close()
+
+    if iteration >= max_iterations and stats.status == "incomplete":
+        stats.status = "max_iterations"
+        out.print("[red]Warning: Max iterations reached[/red]")
+
+    stats.reasoning_steps = reasoning_sink.steps
+    stats.show_reasoning_intercepted = reasoning_sink.intercepted_calls
+    if loop_guard and loop_guard.interventions:
+        loop_guard.settle(stats.status == "solved", iteration, max_iterations)
+        stats.loop_interventions = loop_guard.interventions
+        for intervention in loop_guard.interventions:
+            log.info(
+                "loop guard %s at iteration %d (%s): %s, saved up to %d iterations / %.3fs",
+                intervention.kind, intervention.iteration, intervention.tool_name, intervention.action,
+                intervention.iterations_saved_upper_bound, intervention.seconds_saved
+            )
+    if stats.status != "solved":
+        stats.partial_results = partial_results(memory, candidate)
+    stats.iterations = iteration
+    stats.total_seconds = time.perf_counter() - solve_started
+    stats.token_usage = ledger.total
+    memory.record_usage(ledger.total)
+    await asyncio.to_thread(memory.record_solved, stats.status, stats.final_answer, perceived.expression, iteration)
+    memory.request_save()
+    if solutions and stats.status == "solved" and not stats.from_solution_store and perceived.expression:
+        latex = memory.session.latest_results.get("format_polynomial_latex")
+        symbolic = memory.session.latest_results.get("integrate_symbolic")
+        if isinstance(symbolic, dict) and symbolic.get("status") == "success":
+            latex = symbolic.get("latex")
+        solutions.put(Solution(
+            expression=perceived.expression,
+            variable=perceived.variable,
+            final_answer=stats.final_answer,
+            latex=latex if isinstance(latex, str) else None,
+            verification=verification_status(memory, stats.final_answer, candidate if verified else None),
+            plan=stats.plan,
+            provenance={
+                "problem": problem,
+                "user_id": memory.user_id,
+                "session_id": memory.session.session_id,
+                "backend": decision.llm.backend.name,
+                "model": decision.llm.model,
+                "tool_calls": stats.tool_calls,
+                "deterministic": stats.budget_exhausted is not None
+            }
+        ))
+        if decision.similar is not None and stats.plan:
+            decision.similar.add(perceived.expression, perceived.variable, stats.plan)
+    if checkpoint:
+        # Outcome recorded: nothing is left to resume
+        await asyncio.to_thread(checkpoint.finish)
+    tracing.annotate(
+        problem_type=perceived.problem_type,
+        status=stats.status,
+        from_solution_store=stats.from_solution_store,
+        iterations=iteration,
+        tool_calls=sum(stats.tool_calls.values()),
+        total_tokens=ledger.total.total_tokens,
+        cost_usd=ledger.total.cost_usd
+    )
+    out.print(f"\n[green]✓ Agent completed in {iteration} iterations[/green]")
+    out.print(
+        f"[dim]Reasoning: {reasoning_sink.steps} steps {'rendered' if prefs.show_reasoning else 'received'}, "
+        f"{reasoning_sink.intercepted_calls} show_reasoning calls handled locally[/dim]"
+    )
+    out.print(
+        f"[dim]LLM usage: {ledger.total.calls} calls, {ledger.total.prompt_tokens} prompt + "
+        f"{ledger.total.output_tokens} output tokens (${ledger.total.cost_usd:.4f}), "
+        f"{ledger.response_cache_hits} served from cache[/dim]"
+    )
+    return stats
+
+
+async def solve_stream(
+    problem: str,
+    perception: PerceptionLayer,
+    memory: MemoryLayer,
+    decision: DecisionLayer,
+    action: ActionLayer,
+    **kwargs
+) -> AsyncIterator[SolveEvent]:
+    """
+    solve() as an async generator of progress events
+
+    Yields PerceptionDone, DecisionMade, ToolStarted/ToolFinished,
+    FinalAnswer and EmailQueued as they happen, then SolveFinished with the
+    full stats. Leaving the loop early (e.g. a caller's own timeout)
+    cancels the solve. Keyword arguments are passed through to solve().
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    done = object()
+    task = asyncio.create_task(solve(
+        problem, perception, memory, decision, action,
+        out=kwargs.pop("out", Console(quiet=True)), events=queue.put_nowait, **kwargs
+    ))
+    task.add_done_callback(lambda _: queue.put_nowait(done))
+    try:
+        while (event := await queue.get()) is not done:
+            yield event
+        stats = task.result()
+        yield SolveFinished(
+            elapsed=stats.total_seconds,
+            iteration=stats.iterations,
+            status=stats.status,
+            final_answer=stats.final_answer,
+            stats=stats.model_dump()
+        )
+    finally:
+        if not task.done():
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+
+
+class AgentRuntime:
+    """
+    The four layers plus the MCP connection(s), set up once and shared by every solve
+
+    Build one with AgentRuntime.start() (or from already-built layers, e.g.
+    in benchmarks) and call solve() as often and as concurrently as needed.
+    Each solve borrows a per-user MemoryLayer from the pool; solves are
+    spread round-robin over the action servers. With a CheckpointLog every
+    iteration is logged, and a solve of the same problem for the same user
+    after a crash resumes where the log ends.
+
+        async with AgentRuntime.start(servers=2) as runtime:
+            stats = await runtime.solve("∫3x^2 + 2x dx", user="alice")
+    """
+
+    def __init__(
+        self,
+        perception: PerceptionLayer,
+        decision: DecisionLayer,
+        actions: list[ActionLayer],
+        memory: Optional[MemoryPool] = None,
+        solutions: Optional[SolutionStore] = None,
+        max_iterations: int = 25,
+        checkpoints: Optional[CheckpointLog] = None
+    ):
+        if not actions:
+            raise ValueError("AgentRuntime needs at least one ActionLayer")
+        self.perception = perception
+        self.decision = decision
+        self.actions = actions
+        self.memory = memory or MemoryPool()
+        self.solutions = solutions
+        self.max_iterations = max_iterations
+        self.checkpoints = checkpoints
+        self._next_action = 0
+        self._quiet = Console(quiet=True)
+
+    @classmethod
+    @asynccontextmanager
+    async def start(
+        cls,
+        servers: int = 1,
+        memory_file: str = "user_memory.json",
+        errlog: TextIO = sys.stderr,
+        max_iterations: int = 25
+    ) -> AsyncIterator["AgentRuntime"]:
+        """
+        Build the layers from the ATOM_* environment, start the action servers
+        and yield a runtime. On exit pending memory writes are flushed and the
+        servers and the solution store are closed.
+        """
+        solutions = SolutionStore.from_env()
+        decision = DecisionLayer(similar=similar.from_env(solutions))
+        try:
+            async with start_servers(servers, errlog) as actions:
+                runtime = cls(
+                    PerceptionLayer(llm=decision.llm), decision, actions,
+                    memory=MemoryPool(memory_file),
+                    solutions=solutions,
+                    max_iterations=max_iterations,
+                    checkpoints=CheckpointLog.from_env()
+                )
+                try:
+                    yield runtime
+                finally:
+                    await runtime.memory.flush()
+        finally:
+            if solutions:
+                solutions.close()
+
+    @contextmanager
+    def _checkpoint(self, problem: str, memory: MemoryLayer) -> Iterator[Optional[SolveCheckpoint]]:
+        checkpoint = self.checkpoints.open(problem, memory.user_id) if self.checkpoints else None
+        try:
+            yield checkpoint
+        finally:
+            if checkpoint:
+                checkpoint.close()
+
+    def next_action(self) -> ActionLayer:
+        """The action layer for the next solve (round-robin over the servers)"""
+        action = self.actions[self._next_action % len(self.actions)]
+        self._next_action += 1
+        return action
+
+    async def solve(
+        self,
+        problem: str,
+        user: Optional[str] = None,
+        send_emails: bool = False,
+        out: Optional[Console] = None,
+        budget: Optional[SolveBudget] = None,
+        max_iterations: Optional[int] = None,
+        deadline: Optional[Deadline] = None
+    ) -> SolveStats:
+        """
+        Solve one problem for a user (default: ATOM_USER_ID)
+
+        Args:
+            problem: Raw user query
+            user: Whose preferences and history to use
+            send_emails: Honor email instructions in the problem
+            out: Console for progress output (default: silent)
+            budget: Token/cost limits (default: SolveBudget.from_env())
+            max_iterations: Override the runtime's iteration bound
+            deadline: Wall-clock limit for the solve (default: Deadline.from_env())
+
+        Returns:
+            SolveStats with the final answer, per-layer timings and usage
+        """
+        async with self.memory.session(user) as memory:
+            with self._checkpoint(problem, memory) as checkpoint:
+                return await solve(
+                    problem, self.perception, memory, self.decision, self.next_action(),
+                    max_iterations=max_iterations or self.max_iterations,
+                    send_emails=send_emails,
+                    out=out or self._quiet,
+                    budget=budget,
+                    solutions=self.solutions,
+                    deadline=deadline,
+                    checkpoint=checkpoint
+                )
 
-            if iteration >= max_iterations:
-                console.print("[red]Warning: Max iterations reached[/red]")
+    async def solve_stream(self, problem: str, user: Optional[str] = None, **kwargs) -> AsyncIterator[SolveEvent]:
+        """solve() as a stream of progress events (see the module-level solve_stream)"""
+        async with self.memory.session(user) as memory:
+            kwargs.setdefault("max_iterations", self.max_iterations)
+            with self._checkpoint(problem, memory) as checkpoint:
+                async for event in solve_stream(
+                    problem, self.perception, memory, self.decision, self.next_action(),
+                    solutions=self.solutions, checkpoint=checkpoint, **kwargs
+                ):
+                    yield event
 
-            console.print(f"\n[green]✓ Agent completed in {iteration} iterations[/green]")
 
-            # Save session to memory
-            memory.save_preferences()
+async def main():
+    """Main orchestrator function"""
+
+    console.print(Panel(
+        "[bold cyan]Mathematical Reasoning Agent[/bold cyan]\n"
+        "Four-Layer Cognitive Architecture",
+        border_style="cyan"
+    ))
+
+    # Initialize cognitive layers and start the MCP server for the action layer
+    console.print("\n[yellow]Initializing cognitive layers...[/yellow]")
+
+    async with AgentRuntime.start() as runtime:
+        console.print("✓ Perception layer ready")
+        console.print("✓ Memory layer ready")
+        console.print("✓ Decision layer ready")
+        console.print("✓ Action layer ready (MCP tools connected)")
+
+        # STEP 1: Collect user preferences
+        console.print("\n[bold yellow]═══ PREFERENCE COLLECTION PHASE ═══[/bold yellow]")
+
+        memory = runtime.memory.acquire()
+        if not memory.has_saved_preferences:
+            memory.collect_preferences_interactive()
+        else:
+            console.print(f"[green]✓ Loaded existing preferences for {memory.preferences.name}[/green]")
+
+        prefs = memory.preferences
+        console.print(Panel(
+            f"Name: {prefs.name}\n"
+            f"Explanation Style: {prefs.preferred_explanation_style}\n"
+            f"Method: {prefs.preferred_method}\n"
+            f"Math Level: {prefs.math_level}\n"
+            f"Show Reasoning: {prefs.show_reasoning}",
+            title="User Preferences",
+            border_style="green"
+        ))
+        # The solve below borrows this same layer back from the pool
+        runtime.memory.release(memory)
+
+        # STEP 3: Get user problem
+        console.print("\n[bold yellow]═══ AGENTIC FLOW STARTS ═══[/bold yellow]\n")
+
+        problem = input("Enter integration problem (or press Enter for default): ").strip()
+        if not problem:
+            problem = "∫4x^6 - 2x^3 + 7x - 4 dx"
+
+        console.print(Panel(f"[bold]{problem}[/bold]", title="Problem", border_style="cyan"))
+
+        # Lag is measured from here: the prompt above blocks the loop by design
+        async with looplag.monitored("orchestrator", metrics):
+            await runtime.solve(problem, send_emails=True, out=console)
+        # Leaving the runtime saves the session to memory
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mathematical Reasoning Agent")
+    parser.add_argument("--profile", action="store_true",
+                        help="Sample CPU and trace allocations per layer (orchestrator and action server)")
+    parser.add_argument("--profile-dir", default="profile", help="Where --profile writes its reports")
+    args = parser.parse_args()
+
+    if args.profile:
+        # Forwarded to the action server with the other ATOM_* settings
+        os.environ["ATOM_PROFILE_DIR"] = args.profile_dir
+        profiling.start(args.profile_dir, "orchestrator")
+
+    logs.configure()
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
@@ -736,3 +1452,6 @@ if __name__ == "__main__":
         console.print(f"[red]Fatal error: {e}[/red]")
         import traceback
         traceback.print_exc()
+    finally:
+        for path in profiling.stop():
+            console.print(f"[dim]Profile written to {path}[/dim]")
@@ -190,15 +190,33 @@
 
 """
 Memory Layer: Stores and retrieves user preferences and state
-Deterministic: Simple JSON-based storage and retrieval
+Deterministic: JSON file or SQLite storage and retrieval (see memory_store.py)
 """
 
-from pydantic import BaseModel, Field
-from typing import Optional, Any
-import json
-from pathlib import Path
+from contextlib import asynccontextmanager
+from pydantic import BaseModel, ConfigDict, Field, PrivateAttr
+from typing import AsyncIterator, Optional, Any
+import asyncio
+import itertools
+import os
+import uuid
 import webcolors
 
+import tracing
+from accounting import TokenUsage
+from memory_store import MemoryStore, SQLiteStore, store_from_env
+
+
+# History entries kept verbatim; older ones are folded into the digest
+HISTORY_WINDOW = int(os.getenv("ATOM_HISTORY_WINDOW", "16"))
+
+# Token budget for the term lists in the decision prompt; longer lists are
+# shown as @references that the orchestrator expands before the tool call
+PROMPT_TERMS_BUDGET = int(os.getenv("ATOM_PROMPT_TERMS_BUDGET", "1000"))
+
+# Session fields the decision layer may reference as "@<name>" in tool arguments
+REFERENCES = ("parsed_terms", "integrated_terms")
+
 
 # ===== Utility Function =====
 def get_hex_color(color_name: str) -> str:
@@ -215,7 +233,45 @@ def get_hex_color(color_name: str) -> str:
 
 
 # ===== Pydantic Models =====
-class UserPreferences(BaseModel):
+# Every field assignment draws its version from here, so versions are unique
+# across models, sessions and memory layers
+_versions = itertools.count(1)
+
+
+class VersionedModel(BaseModel):
+    """
+    Records a version for each field whenever it is assigned
+
+    Only assignment counts: list and dict fields must be replaced, not
+    mutated in place, or snapshots taken earlier would change with them
+    (MemoryLayer updates them copy-on-write).
+    """
+    _field_versions: dict[str, int] = PrivateAttr(default_factory=dict)
+
+    def model_post_init(self, __context: Any):
+        self._field_versions = dict.fromkeys(type(self).model_fields, next(_versions))
+
+    def __setattr__(self, name: str, value: Any):
+        super().__setattr__(name, value)
+        if name in type(self).model_fields:
+            self._field_versions[name] = next(_versions)
+
+    @property
+    def field_versions(self) -> dict[str, int]:
+        return self._field_versions
+
+    @property
+    def version(self) -> int:
+        return max(self._field_versions.values(), default=0)
+
+    def snapshot(self, frozen_cls: type["VersionedModel"]) -> "VersionedModel":
+        """Read-only copy sharing every field value (no validation, no deep copy)"""
+        snapshot = frozen_cls.model_construct(_fields_set=self.model_fields_set, **self.__dict__)
+        snapshot._field_versions = dict(self._field_versions)
+        return snapshot
+
+
+class UserPreferences(VersionedModel):
     """User preferences stored in memory"""
 
     name: Optional[str] = Field(default="User", description="User's name")
@@ -282,54 +338,297 @@ class UserPreferences(BaseModel):
     )
 
 
-class SessionState(BaseModel):
+class HistoryDigest(BaseModel):
+    """Deterministic summary of the history entries that left the window"""
+    entries: int = 0
+    first_iteration: Optional[int] = None
+    last_iteration: Optional[int] = None
+    tool_counts: dict[str, int] = Field(default_factory=dict)
+    power_range: Optional[tuple[float, float]] = Field(
+        default=None,
+        description="Lowest and highest power of the folded integrate_term results"
+    )
+    tokens: int = 0
+
+    def fold(self, entry: dict):
+        self.entries += 1
+        iteration = entry.get("iteration")
+        if iteration is not None:
+            if self.first_iteration is None:
+                self.first_iteration = iteration
+            self.last_iteration = iteration
+        tool = entry.get("tool", "unknown")
+        self.tool_counts[tool] = self.tool_counts.get(tool, 0) + 1
+        self.tokens += entry.get("tokens", 0)
+
+        result = entry.get("result")
+        if tool == "integrate_term" and isinstance(result, dict) and "power" in result:
+            power = result["power"]
+            low, high = self.power_range or (power, power)
+            self.power_range = (min(low, power), max(high, power))
+
+    def summary(self) -> str:
+        if not self.entries:
+            return ""
+        tools = ", ".join(f"{tool} x{count}" for tool, count in self.tool_counts.items())
+        text = f"{self.entries} earlier steps (iterations {self.first_iteration}-{self.last_iteration}): {tools}"
+        if self.power_range:
+            text += f"; integrated powers {self.power_range[0]:g}..{self.power_range[1]:g}"
+        return text
+
+
+class SessionPromptView(BaseModel):
+    """Term lists of the session as rendered into a prompt"""
+    parsed_terms: str
+    integrated_terms: str
+    next_term: Optional[str] = Field(default=None, description="Only set when the lists are referenced")
+    by_reference: bool = False
+
+
+class SessionState(VersionedModel):
     """Current session state"""
+    session_id: str = Field(default_factory=lambda: uuid.uuid4().hex)
     current_problem: Optional[str] = None
     iteration_count: int = 0
     parsed_terms: Optional[Any] = None
     integrated_terms: list = Field(default_factory=list)
     differentiated_terms: list = Field(default_factory=list)
-    history: list[dict] = Field(default_factory=list)
+    history: list[dict] = Field(default_factory=list, description=f"Last {HISTORY_WINDOW} entries")
+    history_digest: HistoryDigest = Field(default_factory=HistoryDigest)
+    latest_results: dict[str, Any] = Field(
+        default_factory=dict,
+        description="Most recent result per tool, kept after its entry leaves the window"
+    )
+    token_usage: TokenUsage = Field(default_factory=TokenUsage, description="LLM usage of this solve")
+
+
+class PreferencesSnapshot(UserPreferences):
+    """UserPreferences as of one get_context() call"""
+    model_config = ConfigDict(frozen=True)
+
+
+class SessionSnapshot(SessionState):
+    """SessionState as of one get_context() call"""
+    model_config = ConfigDict(frozen=True)
 
 
 class MemoryContext(BaseModel):
-    """Complete memory context passed to other layers"""
+    """
+    Complete memory context passed to other layers
+
+    An immutable snapshot: safe to hand to concurrent tasks, and two
+    snapshots can be compared field by field with changed_since().
+    """
+    model_config = ConfigDict(frozen=True)
+
     preferences: UserPreferences
     session: SessionState
 
+    @property
+    def version(self) -> tuple[int, int]:
+        return (self.preferences.version, self.session.version)
+
+    def changed_since(self, other: Optional["MemoryContext"]) -> set[str]:
+        """Session fields (and "preferences") that differ from an earlier snapshot; everything if None"""
+        fields = self.session.field_versions
+        if other is None:
+            return {"preferences", *fields}
+        changed = {name for name, version in fields.items() if other.session.field_versions.get(name) != version}
+        if self.preferences.field_versions != other.preferences.field_versions:
+            changed.add("preferences")
+        return changed
+
+    def prompt_view(self, budget_tokens: int = PROMPT_TERMS_BUDGET) -> SessionPromptView:
+        """
+        Parsed and integrated terms in full while they fit in budget_tokens
+        (~4 characters per token); otherwise @references with counts, the
+        power range and the next term to integrate
+        """
+        session = self.session
+        parsed = str(session.parsed_terms)
+        integrated = str(session.integrated_terms)
+        if (len(parsed) + len(integrated)) // 4 <= budget_tokens or not isinstance(session.parsed_terms, list):
+            return SessionPromptView(parsed_terms=parsed, integrated_terms=integrated)
+
+        terms = session.parsed_terms
+        done = len(session.integrated_terms)
+        powers = [t["power"] for t in terms]
+        errors = sum(1 for t in session.integrated_terms if isinstance(t, dict) and t.get("status") == "error")
+        last = f", last {session.integrated_terms[-1]}" if done else ""
+        return SessionPromptView(
+            parsed_terms=f"@parsed_terms ({len(terms)} terms, powers {min(powers):g}..{max(powers):g})",
+            integrated_terms=f"@integrated_terms ({done} terms, {errors} errors{last})",
+            next_term=f"#{done + 1} {terms[done]}" if done < len(terms) else None,
+            by_reference=True
+        )
+
+
+# Validated preferences per (store path, user): (store version, preferences).
+# A load whose store version is unchanged copies these instead of re-validating.
+_preferences_cache: dict[tuple[str, str], tuple[Any, UserPreferences]] = {}
+
 
 # ===== Memory Layer =====
 class MemoryLayer:
     """Memory cognitive layer - manages state and preferences"""
 
-    def __init__(self, memory_file: str = "user_memory.json"):
-        self.memory_file = Path(memory_file)
+    # History entries buffered before one batched write
+    HISTORY_BATCH = 32
+    # request_save() coalesces everything asked for within this window
+    SAVE_DELAY = 0.5
+
+    def __init__(
+        self,
+        memory_file: str = "user_memory.json",
+        user_id: Optional[str] = None,
+        store: Optional[MemoryStore] = None
+    ):
+        self.memory_file = memory_file
+        self.user_id = user_id or os.getenv("ATOM_USER_ID", "default")
+        self.store = store if store is not None else store_from_env(memory_file)
+        self.has_saved_preferences = False
+        self._cache_key = (str(getattr(self.store, "path", id(self.store))), self.user_id)
         self.preferences = self._load_preferences()
+        # What the store holds, for dirty checks
+        self._saved_preferences = self.preferences.model_dump() if self.has_saved_preferences else None
         self.session = SessionState()
+        self._pending_history: list[dict] = []
+        self._save_task: Optional[asyncio.Task] = None
+        self._save_now: Optional[asyncio.Event] = None
+        self._context: Optional[MemoryContext] = None
+        self._context_key: Optional[tuple] = None
 
+    @tracing.traced("memory.load", cat="memory")
     def _load_preferences(self) -> UserPreferences:
-        """Load user preferences from JSON file"""
-        if self.memory_file.exists():
-            try:
-                with open(self.memory_file, 'r') as f:
-                    data = json.load(f)
-                    return UserPreferences(**data)
-            except Exception as e:
-                print(f"Warning: Could not load preferences: {e}")
-                return UserPreferences()
-        return UserPreferences()
-
+        """Load user preferences from the store"""
+        try:
+            version = self.store.version(self.user_id)
+            cached = _preferences_cache.get(self._cache_key)
+            if version is not None and cached is not None and cached[0] == version:
+                self.has_saved_preferences = True
+                return cached[1].model_copy(deep=True)
+
+            data = self.store.load_preferences(self.user_id)
+            # First run on SQLite: adopt an existing user_memory.json
+            if data is None and isinstance(self.store, SQLiteStore):
+                if self.store.import_json(self.memory_file, self.user_id):
+                    data = self.store.load_preferences(self.user_id)
+        except Exception as e:
+            print(f"Warning: Could not load preferences: {e}")
+            return UserPreferences()
+        if data is None:
+            return UserPreferences()
+        self.has_saved_preferences = True
+        try:
+            preferences = UserPreferences(**data)
+        except Exception as e:
+            print(f"Warning: Could not load preferences: {e}")
+            return UserPreferences()
+        _preferences_cache[self._cache_key] = (self.store.version(self.user_id), preferences.model_copy(deep=True))
+        return preferences
+
+    def is_dirty(self) -> bool:
+        """Preferences differ from what the store holds, or history is buffered"""
+        return bool(self._pending_history) or self.preferences.model_dump() != self._saved_preferences
+
+    def _take_pending(self) -> Optional[tuple[Optional[dict], list[dict], str]]:
+        """Snapshot what needs writing (on the caller's thread); None if nothing does"""
+        data = self.preferences.model_dump()
+        changed = data if data != self._saved_preferences else None
+        entries, self._pending_history = self._pending_history, []
+        if changed is None and not entries:
+            return None
+        return changed, entries, self.session.session_id
+
+    def _write(self, preferences: Optional[dict], entries: list[dict], session_id: str):
+        if entries:
+            self.store.add_history(self.user_id, session_id, entries)
+        if preferences is not None:
+            self.store.save_preferences(self.user_id, preferences)
+            _preferences_cache[self._cache_key] = (
+                self.store.version(self.user_id), UserPreferences.model_validate(preferences)
+            )
+
+    def _saved(self, pending: tuple[Optional[dict], list[dict], str]):
+        if pending[0] is not None:
+            self._saved_preferences = pending[0]
+            self.has_saved_preferences = True
+
+    @tracing.traced("memory.save", cat="memory")
     def save_preferences(self):
-        """Save preferences to JSON file"""
-        with open(self.memory_file, 'w') as f:
-            json.dump(self.preferences.model_dump(), f, indent=2)
-
+        """Save preferences (and any buffered history) to the store, if anything changed"""
+        pending = self._take_pending()
+        if pending is not None:
+            self._write(*pending)
+            self._saved(pending)
+
+    @tracing.traced("memory.save", cat="memory")
+    async def save_preferences_async(self):
+        """save_preferences() with the serialization and I/O in a worker thread"""
+        pending = self._take_pending()
+        if pending is not None:
+            await asyncio.to_thread(self._write, *pending)
+            self._saved(pending)
+
+    def request_save(self):
+        """
+        Debounced save: everything requested within SAVE_DELAY is written
+        once, off the event loop. Outside a running loop, saves immediately.
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.save_preferences()
+            return
+        if self._save_task is None or self._save_task.done():
+            self._save_now = asyncio.Event()
+            self._save_task = loop.create_task(self._debounced_save())
+
+    async def _debounced_save(self):
+        try:
+            await asyncio.wait_for(self._save_now.wait(), self.SAVE_DELAY)
+        except asyncio.TimeoutError:
+            pass
+        await self.save_preferences_async()
+
+    async def flush(self):
+        """Finish any pending debounced save now, then write whatever is still dirty"""
+        if self._save_task is not None and not self._save_task.done():
+            self._save_now.set()
+            await self._save_task
+        await self.save_preferences_async()
+
+    def flush_history(self):
+        """Write buffered history entries in one batch (synchronously)"""
+        if self._pending_history:
+            entries, self._pending_history = self._pending_history, []
+            self.store.add_history(self.user_id, self.session.session_id, entries)
+
+    @tracing.traced("memory.get_context", cat="memory")
     def get_context(self) -> MemoryContext:
-        """Get complete memory context for other layers"""
-        return MemoryContext(
-            preferences=self.preferences,
-            session=self.session
+        """
+        Snapshot of preferences and session for other layers
+
+        Returns the previous snapshot while nothing was assigned since. A new
+        snapshot reuses the previous preferences snapshot when only the
+        session changed, and shares all field values with the live state.
+        """
+        preferences, session = self.preferences, self.session
+        key = (id(preferences), preferences.version, id(session), session.version)
+        if key == self._context_key:
+            return self._context
+
+        previous = self._context
+        if previous is not None and self._context_key[:2] == key[:2]:
+            preferences_snapshot = previous.preferences
+        else:
+            preferences_snapshot = preferences.snapshot(PreferencesSnapshot)
+        self._context = MemoryContext.model_construct(
+            preferences=preferences_snapshot,
+            session=session.snapshot(SessionSnapshot)
         )
+        self._context_key = key
+        return self._context
 
     def update_session(self, **kwargs):
         """Update session state"""
@@ -337,12 +636,76 @@ class MemoryLayer:
             if hasattr(self.session, key):
                 setattr(self.session, key, value)
 
+    def append_session(self, field: str, item: Any):
+        """Append to a session list copy-on-write, so snapshots keep the list they saw"""
+        setattr(self.session, field, [*getattr(self.session, field), item])
+
     def add_to_history(self, entry: dict):
-        """Add entry to session history"""
-        self.session.history.append(entry)
+        """Add entry to the session's history window; the store still gets every entry"""
+        session = self.session
+        history = [*session.history, entry]
+        if len(history) > HISTORY_WINDOW:
+            digest = session.history_digest.model_copy(deep=True)
+            while len(history) > HISTORY_WINDOW:
+                digest.fold(history.pop(0))
+            session.history_digest = digest
+        session.history = history
+        session.latest_results = {**session.latest_results, entry.get("tool", "unknown"): entry.get("result")}
+        self._pending_history.append(entry)
+        if len(self._pending_history) >= self.HISTORY_BATCH:
+            # Written by the debounced save, off the event loop
+            self.request_save()
+
+    def record_solved(
+        self,
+        status: str,
+        final_answer: Optional[str],
+        expression: Optional[str] = None,
+        iterations: int = 0
+    ):
+        """
+        Persist the outcome of the session's problem (SQLite only) and add its
+        usage to the user's totals; blocking, so async callers use a thread
+        """
+        self.flush_history()
+        self.store.add_usage(self.user_id, self.session.token_usage.model_dump())
+        self.store.add_solved(self.user_id, self.session.session_id, {
+            "problem": self.session.current_problem or "",
+            "expression": expression,
+            "status": status,
+            "final_answer": final_answer,
+            "iterations": iterations,
+            "total_tokens": self.session.token_usage.total_tokens
+        })
+
+    def resolve_references(self, arguments: dict) -> dict:
+        """Expand "@parsed_terms"-style argument values into the session's lists"""
+        return {
+            key: getattr(self.session, value[1:])
+            if isinstance(value, str) and value.startswith("@") and value[1:] in REFERENCES else value
+            for key, value in arguments.items()
+        }
+
+    def record_usage(self, usage: TokenUsage):
+        """Store a finished solve's LLM usage in the session (record_solved() persists it)"""
+        self.session.token_usage = usage
+
+    def lifetime_usage(self) -> TokenUsage:
+        """The user's LLM usage over every recorded solve"""
+        return TokenUsage(**(self.store.usage(self.user_id) or {}))
+
+    def solved_problems(self, limit: int = 100) -> list[dict]:
+        """This user's past problems, newest first (empty on the JSON store)"""
+        return self.store.solved_problems(self.user_id, limit)
+
+    def restore_session(self, state: dict):
+        """Continue a session saved by a checkpoint (history the crash left unflushed is not re-stored)"""
+        self.flush_history()
+        self.session = SessionState.model_validate(state)
 
     def reset_session(self):
         """Reset session state (keeps preferences)"""
+        self.flush_history()
         self.session = SessionState()
 
     def collect_preferences_interactive(self):
@@ -412,3 +775,52 @@ class MemoryLayer:
         self.save_preferences()
         print(f"\n✓ Preferences saved! Welcome, {name}!\n")
 
+
+class MemoryPool:
+    """
+    MemoryLayers for concurrent solves over one store
+
+    A solve borrows a layer with a fresh session and hands it back when
+    done. All layers of a user share one preferences object, so a change
+    made during one solve is seen, and saved, by the others.
+    """
+
+    def __init__(self, memory_file: str = "user_memory.json", store: Optional[MemoryStore] = None):
+        self.memory_file = memory_file
+        self.store = store if store is not None else store_from_env(memory_file)
+        self._preferences: dict[str, UserPreferences] = {}
+        self._idle: dict[Optional[str], list[MemoryLayer]] = {}
+        self._layers: list[MemoryLayer] = []
+
+    def acquire(self, user_id: Optional[str] = None) -> MemoryLayer:
+        """A layer for user_id (default: ATOM_USER_ID) with a fresh session"""
+        idle = self._idle.get(user_id)
+        if idle:
+            memory = idle.pop()
+            memory.reset_session()
+            return memory
+        memory = MemoryLayer(memory_file=self.memory_file, user_id=user_id, store=self.store)
+        memory.preferences = self._preferences.setdefault(memory.user_id, memory.preferences)
+        self._layers.append(memory)
+        return memory
+
+    def release(self, memory: MemoryLayer, user_id: Optional[str] = None):
+        self._idle.setdefault(user_id, []).append(memory)
+
+    @asynccontextmanager
+    async def session(self, user_id: Optional[str] = None) -> AsyncIterator[MemoryLayer]:
+        memory = self.acquire(user_id)
+        try:
+            yield memory
+        finally:
+            try:
+                # History a cancelled solve left buffered; reset_session() would write it on the loop
+                if memory._pending_history:
+                    await asyncio.to_thread(memory.flush_history)
+            finally:
+                self.release(memory, user_id)
+
+    async def flush(self):
+        """Write everything any layer still has pending"""
+        for memory in self._layers:
+            await memory.flush()
@@ -0,0 +1,324 @@
+"""
+Memory Store: Persistence backends behind MemoryLayer
+Deterministic: JSON file (one user, preferences and usage totals) or SQLite in
+WAL mode (many users, with indexed session history and solved problems)
+"""
+
+from pathlib import Path
+from typing import Optional, Protocol, Union
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class MemoryStore(Protocol):
+    """What MemoryLayer needs from a backend"""
+
+    def load_preferences(self, user_id: str) -> Optional[dict]: ...
+
+    def version(self, user_id: str) -> Optional[object]:
+        """Changes whenever the stored preferences change (None: nothing stored)"""
+
+    def save_preferences(self, user_id: str, preferences: dict): ...
+
+    def add_history(self, user_id: str, session_id: str, entries: list[dict]): ...
+
+    def add_solved(self, user_id: str, session_id: str, solved: dict): ...
+
+    def add_usage(self, user_id: str, usage: dict):
+        """Add one solve's TokenUsage fields to the user's lifetime totals"""
+
+    def usage(self, user_id: str) -> Optional[dict]:
+        """The user's lifetime TokenUsage fields (None: nothing recorded)"""
+
+    def history(self, user_id: str, session_id: Optional[str] = None, limit: int = 100) -> list[dict]: ...
+
+    def solved_problems(self, user_id: str, limit: int = 100) -> list[dict]: ...
+
+    def close(self): ...
+
+
+class JSONStore:
+    """
+    The original single-user user_memory.json; history is not persisted
+
+    Lifetime usage goes to a separate <name>.usage.json, so recording a
+    solve never rewrites the preferences file.
+    """
+
+    def __init__(self, path: str = "user_memory.json"):
+        self.path = Path(path)
+        self.usage_path = self.path.with_name(f"{self.path.stem}.usage.json")
+        # Saves from worker threads share the temp file name
+        self._lock = threading.Lock()
+
+    def load_preferences(self, user_id: str) -> Optional[dict]:
+        if not self.path.exists():
+            return None
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except json.JSONDecodeError as e:
+            # Keep the damaged file for inspection instead of overwriting it on the next save
+            corrupt = self.path.with_name(f"{self.path.name}.corrupt")
+            os.replace(self.path, corrupt)
+            raise ValueError(f"{self.path} is not valid JSON ({e}); moved to {corrupt}") from e
+
+    def version(self, user_id: str) -> Optional[tuple[int, int]]:
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def save_preferences(self, user_id: str, preferences: dict):
+        with self._lock:
+            self._replace(self.path, preferences)
+
+    @staticmethod
+    def _replace(path: Path, data: dict):
+        """Write a temp file next to the target, fsync it, then rename over the target"""
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+    def add_history(self, user_id: str, session_id: str, entries: list[dict]):
+        pass
+
+    def add_solved(self, user_id: str, session_id: str, solved: dict):
+        pass
+
+    def add_usage(self, user_id: str, usage: dict):
+        with self._lock:
+            totals = self._load_usage()
+            totals[user_id] = {key: totals.get(user_id, {}).get(key, 0) + value for key, value in usage.items()}
+            self._replace(self.usage_path, totals)
+
+    def usage(self, user_id: str) -> Optional[dict]:
+        with self._lock:
+            return self._load_usage().get(user_id)
+
+    def _load_usage(self) -> dict:
+        try:
+            with open(self.usage_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def history(self, user_id: str, session_id: Optional[str] = None, limit: int = 100) -> list[dict]:
+        return []
+
+    def solved_problems(self, user_id: str, limit: int = 100) -> list[dict]:
+        return []
+
+    def close(self):
+        pass
+
+
+class SQLiteStore:
+    """
+    Many users in one SQLite database (WAL: readers never block the writer)
+
+    Statements are fixed strings, so sqlite3's statement cache prepares each
+    once per connection. History rows arrive in batches from MemoryLayer and
+    are written with executemany inside one transaction.
+    """
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS users ("
+        " user_id TEXT PRIMARY KEY,"
+        " preferences TEXT NOT NULL,"
+        " updated_at REAL NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS history ("
+        " id INTEGER PRIMARY KEY,"
+        " user_id TEXT NOT NULL,"
+        " session_id TEXT NOT NULL,"
+        " iteration INTEGER,"
+        " tool TEXT,"
+        " entry TEXT NOT NULL,"
+        " created_at REAL NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS history_by_session ON history (user_id, session_id, iteration)",
+        "CREATE TABLE IF NOT EXISTS solved ("
+        " id INTEGER PRIMARY KEY,"
+        " user_id TEXT NOT NULL,"
+        " session_id TEXT NOT NULL,"
+        " problem TEXT NOT NULL,"
+        " expression TEXT,"
+        " status TEXT NOT NULL,"
+        " final_answer TEXT,"
+        " iterations INTEGER,"
+        " total_tokens INTEGER,"
+        " created_at REAL NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS solved_by_user ON solved (user_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS solved_by_expression ON solved (expression)",
+        "CREATE TABLE IF NOT EXISTS usage ("
+        " user_id TEXT PRIMARY KEY,"
+        " calls INTEGER NOT NULL,"
+        " prompt_tokens INTEGER NOT NULL,"
+        " output_tokens INTEGER NOT NULL,"
+        " cached_tokens INTEGER NOT NULL,"
+        " cost_usd REAL NOT NULL,"
+        " updated_at REAL NOT NULL)",
+    )
+
+    LOAD_PREFERENCES = "SELECT preferences FROM users WHERE user_id = ?"
+    PREFERENCES_VERSION = "SELECT updated_at FROM users WHERE user_id = ?"
+    SAVE_PREFERENCES = (
+        "INSERT INTO users (user_id, preferences, updated_at) VALUES (?, ?, ?)"
+        " ON CONFLICT (user_id) DO UPDATE SET preferences = excluded.preferences, updated_at = excluded.updated_at"
+    )
+    ADD_HISTORY = (
+        "INSERT INTO history (user_id, session_id, iteration, tool, entry, created_at)"
+        " VALUES (?, ?, ?, ?, ?, ?)"
+    )
+    ADD_SOLVED = (
+        "INSERT INTO solved (user_id, session_id, problem, expression, status, final_answer,"
+        " iterations, total_tokens, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+    )
+    USAGE_COLUMNS = ("calls", "prompt_tokens", "output_tokens", "cached_tokens", "cost_usd")
+    # Summed in SQL, so concurrent solves (and processes) never lose an update
+    ADD_USAGE = (
+        "INSERT INTO usage (user_id, calls, prompt_tokens, output_tokens, cached_tokens, cost_usd, updated_at)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?)"
+        " ON CONFLICT (user_id) DO UPDATE SET calls = calls + excluded.calls,"
+        " prompt_tokens = prompt_tokens + excluded.prompt_tokens,"
+        " output_tokens = output_tokens + excluded.output_tokens,"
+        " cached_tokens = cached_tokens + excluded.cached_tokens,"
+        " cost_usd = cost_usd + excluded.cost_usd, updated_at = excluded.updated_at"
+    )
+    USAGE = "SELECT calls, prompt_tokens, output_tokens, cached_tokens, cost_usd FROM usage WHERE user_id = ?"
+    SESSION_HISTORY = "SELECT entry FROM history WHERE user_id = ? AND session_id = ? ORDER BY iteration, id LIMIT ?"
+    USER_HISTORY = "SELECT entry FROM history WHERE user_id = ? ORDER BY id DESC LIMIT ?"
+    SOLVED_PROBLEMS = (
+        "SELECT session_id, problem, expression, status, final_answer, iterations, total_tokens, created_at"
+        " FROM solved WHERE user_id = ? ORDER BY created_at DESC LIMIT ?"
+    )
+
+    def __init__(self, path: str = "memory.db"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, cached_statements=64)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        with self._db:
+            for statement in self.SCHEMA:
+                self._db.execute(statement)
+
+    def load_preferences(self, user_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute(self.LOAD_PREFERENCES, (user_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def version(self, user_id: str) -> Optional[float]:
+        with self._lock:
+            row = self._db.execute(self.PREFERENCES_VERSION, (user_id,)).fetchone()
+        return row[0] if row else None
+
+    def save_preferences(self, user_id: str, preferences: dict):
+        with self._lock, self._db:
+            self._db.execute(self.SAVE_PREFERENCES, (user_id, json.dumps(preferences), time.time()))
+
+    def add_history(self, user_id: str, session_id: str, entries: list[dict]):
+        now = time.time()
+        rows = [
+            (user_id, session_id, entry.get("iteration"), entry.get("tool"),
+             json.dumps(entry, default=str), now)
+            for entry in entries
+        ]
+        with self._lock, self._db:
+            self._db.executemany(self.ADD_HISTORY, rows)
+
+    def add_solved(self, user_id: str, session_id: str, solved: dict):
+        with self._lock, self._db:
+            self._db.execute(self.ADD_SOLVED, (
+                user_id, session_id, solved["problem"], solved.get("expression"), solved["status"],
+                solved.get("final_answer"), solved.get("iterations"), solved.get("total_tokens"), time.time()
+            ))
+
+    def add_usage(self, user_id: str, usage: dict):
+        with self._lock, self._db:
+            self._db.execute(self.ADD_USAGE, (
+                user_id, *(usage.get(column, 0) for column in self.USAGE_COLUMNS), time.time()
+            ))
+
+    def usage(self, user_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute(self.USAGE, (user_id,)).fetchone()
+        return dict(zip(self.USAGE_COLUMNS, row)) if row else None
+
+    def history(self, user_id: str, session_id: Optional[str] = None, limit: int = 100) -> list[dict]:
+        """One session's entries in order, or the user's latest entries (newest first)"""
+        with self._lock:
+            if session_id is not None:
+                rows = self._db.execute(self.SESSION_HISTORY, (user_id, session_id, limit)).fetchall()
+            else:
+                rows = self._db.execute(self.USER_HISTORY, (user_id, limit)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def solved_problems(self, user_id: str, limit: int = 100) -> list[dict]:
+        with self._lock:
+            cursor = self._db.execute(self.SOLVED_PROBLEMS, (user_id, limit))
+            columns = [c[0] for c in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    # ===== JSON import/export =====
+    def import_json(self, path: str, user_id: str) -> bool:
+        """Load a user_memory.json file as user_id's preferences"""
+        preferences = JSONStore(path).load_preferences(user_id)
+        if preferences is None:
+            return False
+        self.save_preferences(user_id, preferences)
+        return True
+
+    def export_json(self, user_id: str, path: str) -> bool:
+        """Write user_id's preferences in the user_memory.json format"""
+        preferences = self.load_preferences(user_id)
+        if preferences is None:
+            return False
+        JSONStore(path).save_preferences(user_id, preferences)
+        return True
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def store_from_env(memory_file: str = "user_memory.json") -> Union[JSONStore, SQLiteStore]:
+    """
+    ATOM_MEMORY_DB=memory.db     use SQLite (default: the JSON memory_file)
+    """
+    db_path = os.getenv("ATOM_MEMORY_DB")
+    return SQLiteStore(db_path) if db_path else JSONStore(memory_file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import/export user preferences between JSON and SQLite")
+    parser.add_argument("command", choices=["import", "export"])
+    parser.add_argument("json_file", help="user_memory.json-format file")
+    parser.add_argument("--db", default=os.getenv("ATOM_MEMORY_DB", "memory.db"))
+    parser.add_argument("--user", default=os.getenv("ATOM_USER_ID", "default"))
+    args = parser.parse_args()
+
+    store = SQLiteStore(args.db)
+    if args.command == "import":
+        ok = store.import_json(args.json_file, args.user)
+    else:
+        ok = store.export_json(args.user, args.json_file)
+    store.close()
+    if not ok:
+        raise SystemExit(f"Nothing to {args.command} for user '{args.user}'")
+    print(f"{args.command}ed preferences for user '{args.user}'")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+Metrics: Per-tool call counters, error counters, latency histograms and payload sizes
+Deterministic: In-process counters read through the get_metrics MCP tool and
+optionally dumped in Prometheus text format (ATOM_METRICS_FILE)
+"""
+
+from bisect import bisect_left
+from typing import Optional, Protocol
+import atexit
+import os
+import time
+
+
+# Upper bounds in seconds; the last bucket is +Inf
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+
+class ToolStats:
+    """
+    Counters for one tool
+
+    Updated only from the thread that runs tool bodies (FastMCP calls sync
+    tools on its event loop), so plain integer updates need no lock.
+    """
+
+    __slots__ = ("calls", "errors", "bucket_counts", "latency_sum", "latency_max",
+                 "request_bytes", "response_bytes")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.bucket_counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self.request_bytes = 0
+        self.response_bytes = 0
+
+    def observe(self, seconds: float, ok: bool, request_bytes: int, response_bytes: int):
+        self.calls += 1
+        if not ok:
+            self.errors += 1
+        self.bucket_counts[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.latency_sum += seconds
+        if seconds > self.latency_max:
+            self.latency_max = seconds
+        self.request_bytes += request_bytes
+        self.response_bytes += response_bytes
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th quantile (seconds)"""
+        if not self.calls:
+            return 0.0
+        rank = q * self.calls
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.bucket_counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.latency_max
+
+    def snapshot(self) -> dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "latency_ms": {
+                "mean": self.latency_sum / self.calls * 1000 if self.calls else 0.0,
+                "p50_le": self.quantile(0.5) * 1000,
+                "p95_le": self.quantile(0.95) * 1000,
+                "max": self.latency_max * 1000
+            },
+            "histogram": {
+                "le": [*LATENCY_BUCKETS, "+Inf"],
+                "counts": list(self.bucket_counts)
+            },
+            "request_bytes": self.request_bytes,
+            "response_bytes": self.response_bytes
+        }
+
+
+def histogram_lines(metric: str, labels: str, stats: ToolStats) -> list[str]:
+    """Cumulative Prometheus buckets, sum and count of one labelled series"""
+    lines = []
+    cumulative = 0
+    for bound, count in zip([*LATENCY_BUCKETS, "+Inf"], stats.bucket_counts):
+        cumulative += count
+        lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {cumulative}')
+    lines.append(f'{metric}_sum{{{labels}}} {stats.latency_sum}')
+    lines.append(f'{metric}_count{{{labels}}} {stats.calls}')
+    return lines
+
+
+class Collector(Protocol):
+    """Extra metrics a registry reports next to the tool counters"""
+
+    def snapshot(self) -> dict: ...
+
+    def prometheus_lines(self) -> list[str]: ...
+
+
+class MetricsRegistry:
+    """All tool counters of one process, plus registered collectors"""
+
+    def __init__(self, dump_path: Optional[str] = None, dump_interval: float = 5.0):
+        self.tools: dict[str, ToolStats] = {}
+        self.collectors: dict[str, Collector] = {}
+        self.started_at = time.time()
+        self.dump_path = dump_path
+        self.dump_interval = dump_interval
+        self._last_dump = 0.0
+        if dump_path:
+            atexit.register(self.dump)
+
+    @classmethod
+    def from_env(cls, process: Optional[str] = None) -> "MetricsRegistry":
+        """
+        ATOM_METRICS_FILE=metrics.prom     Prometheus text dump (off by default)
+        ATOM_METRICS_INTERVAL=5            seconds between dumps
+
+        Processes other than the action server pass a name, and dump to
+        e.g. metrics.orchestrator.prom next to the server's file.
+        """
+        path = os.getenv("ATOM_METRICS_FILE") or None
+        if path and process:
+            root, ext = os.path.splitext(path)
+            path = f"{root}.{process}{ext}"
+        return cls(
+            dump_path=path,
+            dump_interval=float(os.getenv("ATOM_METRICS_INTERVAL", "5"))
+        )
+
+    def register(self, name: str, collector: Collector):
+        self.collectors[name] = collector
+
+    def observe(self, tool: str, seconds: float, ok: bool, request_bytes: int = 0, response_bytes: int = 0):
+        stats = self.tools.get(tool)
+        if stats is None:
+            stats = self.tools[tool] = ToolStats()
+        stats.observe(seconds, ok, request_bytes, response_bytes)
+        self.maybe_dump()
+
+    def maybe_dump(self):
+        """Dump if dump_interval has passed since the last dump"""
+        if self.dump_path:
+            now = time.monotonic()
+            if now - self._last_dump >= self.dump_interval:
+                self._last_dump = now
+                self.dump()
+
+    def snapshot(self) -> dict:
+        return {
+            "uptime_seconds": time.time() - self.started_at,
+            "tools": {name: stats.snapshot() for name, stats in sorted(self.tools.items())},
+            **{name: collector.snapshot() for name, collector in self.collectors.items()}
+        }
+
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition format"""
+        lines = [
+            "# HELP atom_tool_calls_total Tool invocations",
+            "# TYPE atom_tool_calls_total counter"
+        ]
+        tools = sorted(self.tools.items())
+        lines += [f'atom_tool_calls_total{{tool="{name}"}} {s.calls}' for name, s in tools]
+
+        lines += ["# HELP atom_tool_errors_total Tool invocations that raised or returned an error",
+                  "# TYPE atom_tool_errors_total counter"]
+        lines += [f'atom_tool_errors_total{{tool="{name}"}} {s.errors}' for name, s in tools]
+
+        lines += ["# HELP atom_tool_duration_seconds Tool body latency",
+                  "# TYPE atom_tool_duration_seconds histogram"]
+        for name, s in tools:
+            lines += histogram_lines("atom_tool_duration_seconds", f'tool="{name}"', s)
+
+        for direction in ("request", "response"):
+            metric = f"atom_tool_{direction}_bytes_total"
+            lines += [f"# HELP {metric} JSON {direction} payload bytes", f"# TYPE {metric} counter"]
+            lines += [
+                f'{metric}{{tool="{name}"}} {getattr(s, direction + "_bytes")}'
+                for name, s in tools
+            ]
+        for collector in self.collectors.values():
+            lines += collector.prometheus_lines()
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: Optional[str] = None):
+        """Write the Prometheus text atomically (temp file + rename)"""
+        path = path or self.dump_path
+        # Processes that only import action.py (the orchestrator) never
+        # observe anything and must not clobber the server's file
+        if not path or not (self.tools or self.collectors):
+            return
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, path)
@@ -184,17 +184,10 @@ Non-Deterministic: Uses LLM to extract intent and classify problem type
 
 from pydantic import BaseModel, Field, EmailStr
 from typing import Literal, Optional, Dict, Any
-from google import genai
 import asyncio
-import os
-import json
-from dotenv import load_dotenv
 import re
-
-# Load environment
-load_dotenv()
-api_key = os.getenv("GEMINI_API_KEY")
-client = genai.Client(api_key=api_key)
+from llm import LLMGateway, extract_json, get_llm
+import tracing
 
 
 # ----------------------------------------------------------------------------
@@ -237,8 +230,8 @@ class PerceivedQuery(BaseModel):
 class PerceptionLayer:
     """Perception cognitive layer - interprets and structures user input"""
     
-    def __init__(self):
-        self.client = client
+    def __init__(self, llm: Optional[LLMGateway] = None):
+        self.llm = llm or get_llm()
         # self.system_prompt = """
         #                         You are a mathematical problem classifier and email intent recognizer.
 
@@ -341,6 +334,7 @@ class PerceptionLayer:
                                     }
                                     }"""
 
+    @tracing.traced("perception.perceive", cat="perception")
     async def perceive(self, user_query: str) -> PerceivedQuery:
         """
         Transform raw query into structured perception
@@ -365,27 +359,9 @@ USER QUERY: {user_query}
 Analyze and respond with JSON only:"""
         
         try:
-            # Call LLM asynchronously
-            loop = asyncio.get_event_loop()
-            response = await asyncio.wait_for(
-                loop.run_in_executor(
-                    None,
-                    lambda: self.client.models.generate_content(
-                        model="gemini-2.5-flash",
-                        contents=prompt
-                    )
-                ),
-                timeout=30
-            )
-            
-            # Clean LLM response
-            result_text = response.text.strip()
-            if "```json" in result_text:
-                result_text = result_text.split("```json")[1].split("```")[0].strip()
-            elif "```" in result_text:
-                result_text = result_text.split("```")[1].strip()
-
-            parsed = json.loads(result_text)
+            # Call LLM asynchronously (identical prompts are served from cache)
+            response = await self.llm.generate("perception", prompt, timeout=30)
+            parsed = extract_json(response.text)
 
             # Ensure email_instruction exists
             if not parsed.get("email_instruction") and email_inst:
@@ -400,7 +376,10 @@ Analyze and respond with JSON only:"""
                 key_features=parsed.get("key_features", {}),
                 email_instruction=parsed.get("email_instruction")
             )
-            
+            # Cached only once it validates, so a malformed response is retried next time
+            self.llm.remember("perception", prompt, response)
+            tracing.annotate(problem_type=perceived.problem_type, cache_hit=response.cached)
+
             return perceived
 
         except asyncio.TimeoutError:
@@ -0,0 +1,201 @@
+"""
+Deterministic Planner: Rule-based next-action planning for the integration workflows
+Deterministic: No LLM - decides the next tool call from the visible session state
+"""
+
+from pydantic import BaseModel, Field
+from typing import Any, Optional
+
+
+class PlanState(BaseModel):
+    """Session state the planner needs to pick the next action"""
+    problem_type: str = "unknown"
+    expression: str
+    variable: str = "x"
+    verification_required: bool = True
+    parsed_terms: Optional[list] = None
+    integrated_terms: list = Field(default_factory=list)
+    last_tool: Optional[str] = None
+    last_result: Any = None
+    antiderivative: Optional[dict] = Field(
+        default=None,
+        description="Latest integrate_symbolic result, if any"
+    )
+    # Term lists passed by reference (prompt too long for them): counts and the next term only
+    by_reference: bool = False
+    parsed_count: int = 0
+    integrated_count: int = 0
+    integrated_errors: int = 0
+    next_term: Optional[dict] = None
+
+
+def _tool_call(tool_name: str, arguments: dict, reasoning: str, steps: list[str]) -> dict:
+    return {
+        "action_type": "tool_call",
+        "tool_call": {
+            "tool_name": tool_name,
+            "arguments": arguments,
+            "reasoning": reasoning
+        },
+        "reasoning_steps": steps,
+        "should_continue": True
+    }
+
+
+def _final_answer(answer: str, steps: list[str]) -> dict:
+    return {
+        "action_type": "final_answer",
+        "final_answer": answer,
+        "reasoning_steps": steps,
+        "should_continue": False
+    }
+
+
+def _error(message: str) -> dict:
+    return {
+        "action_type": "error",
+        "message": message,
+        "reasoning_steps": [f"[logic] {message}"],
+        "should_continue": False
+    }
+
+
+class DeterministicPlanner:
+    """Plans polynomial (power rule) and symbolic (SymPy) workflows without an LLM"""
+
+    def next_action(self, state: PlanState) -> dict:
+        """
+        Decide the next action
+
+        Returns:
+            dict in the decision layer's JSON output format
+        """
+        if state.problem_type == "polynomial" and not self._needs_symbolic(state):
+            return self._polynomial(state)
+        return self._symbolic(state)
+
+    @staticmethod
+    def _needs_symbolic(state: PlanState) -> bool:
+        if state.by_reference:
+            return state.integrated_errors > 0
+        if state.parsed_terms is not None and not state.parsed_terms:
+            return True
+        return any(
+            isinstance(t, dict) and t.get("status") == "error"
+            for t in state.integrated_terms
+        )
+
+    def _polynomial(self, state: PlanState) -> dict:
+        if state.by_reference:
+            return self._polynomial_by_reference(state)
+        if state.parsed_terms is None:
+            return _tool_call(
+                "parse_polynomial",
+                {"expression": state.expression},
+                "Split the polynomial into terms",
+                ["[logic] Polynomial workflow: parse the expression first"]
+            )
+
+        done = len(state.integrated_terms)
+        if done < len(state.parsed_terms):
+            term = state.parsed_terms[done]
+            return _tool_call(
+                "integrate_term",
+                {"coeff": term["coeff"], "power": term["power"]},
+                f"Integrate term {done + 1} of {len(state.parsed_terms)}",
+                [f"[arithmetic] Power rule on {term['coeff']}x^{term['power']}"]
+            )
+
+        terms = [{"coeff": t["coeff"], "power": t["power"]} for t in state.integrated_terms]
+
+        if state.last_tool == "format_polynomial_latex" and state.last_result:
+            return _final_answer(str(state.last_result), ["[logic] All terms integrated and formatted"])
+
+        if state.last_tool == "compare_polynomials":
+            if not isinstance(state.last_result, dict) or state.last_result.get("status") != "pass":
+                return _error("Verification by differentiation failed")
+        elif state.verification_required:
+            derivative = [
+                {"coeff": t["coeff"] * t["power"], "power": t["power"] - 1}
+                for t in terms if t["power"] != 0
+            ]
+            return _tool_call(
+                "compare_polynomials",
+                {"original_terms": state.parsed_terms, "verified_terms": derivative},
+                "Verify by differentiating the antiderivative",
+                ["[verification] d/dx of the result must equal the integrand"]
+            )
+
+        return _tool_call(
+            "format_polynomial_latex",
+            {"terms": terms},
+            "Format the antiderivative as LaTeX",
+            ["[symbolic] Assemble the integrated terms"]
+        )
+
+    def _polynomial_by_reference(self, state: PlanState) -> dict:
+        """Same workflow, with "@parsed_terms"/"@integrated_terms" expanded by the orchestrator"""
+        if state.integrated_count < state.parsed_count:
+            if state.next_term is None:
+                return _error("Next term to integrate is missing from the session")
+            term = state.next_term
+            return _tool_call(
+                "integrate_term",
+                {"coeff": term["coeff"], "power": term["power"]},
+                f"Integrate term {state.integrated_count + 1} of {state.parsed_count}",
+                [f"[arithmetic] Power rule on {term['coeff']}x^{term['power']}"]
+            )
+
+        if state.last_tool == "format_polynomial_latex" and state.last_result:
+            return _final_answer(str(state.last_result), ["[logic] All terms integrated and formatted"])
+
+        if state.last_tool == "compare_polynomials":
+            if not isinstance(state.last_result, dict) or state.last_result.get("status") != "pass":
+                return _error("Verification by differentiation failed")
+        elif state.verification_required:
+            return _tool_call(
+                "compare_polynomials",
+                {
+                    "original_terms": "@parsed_terms",
+                    "verified_terms": "@integrated_terms",
+                    "differentiate_verified": True
+                },
+                "Verify by differentiating the antiderivative",
+                ["[verification] d/dx of the result must equal the integrand"]
+            )
+
+        return _tool_call(
+            "format_polynomial_latex",
+            {"terms": "@integrated_terms"},
+            "Format the antiderivative as LaTeX",
+            ["[symbolic] Assemble the integrated terms"]
+        )
+
+    def _symbolic(self, state: PlanState) -> dict:
+        anti = state.antiderivative
+        if anti is None:
+            return _tool_call(
+                "integrate_symbolic",
+                {"expression": state.expression, "variable": state.variable},
+                "Integrate symbolically with SymPy",
+                ["[symbolic] Use SymPy for the antiderivative"]
+            )
+        if anti.get("status") != "success":
+            return _error(f"Symbolic integration failed: {anti.get('message', 'unknown error')}")
+
+        if state.last_tool == "verify_symbolic_integration":
+            if not isinstance(state.last_result, dict) or state.last_result.get("status") != "pass":
+                return _error("Symbolic verification failed")
+        elif state.verification_required:
+            return _tool_call(
+                "verify_symbolic_integration",
+                {
+                    "original": state.expression,
+                    "antiderivative": anti["antiderivative"],
+                    "variable": state.variable
+                },
+                "Verify by differentiation",
+                ["[verification] Differentiate the antiderivative"]
+            )
+
+        return _final_answer(anti["latex"], ["[logic] Antiderivative computed and verified"])
@@ -0,0 +1,300 @@
+"""
+Profiling: Sampling CPU profiler and tracemalloc allocation reports per layer
+Deterministic: SIGPROF stack sampling written as flamegraph folded stacks, plus
+top-N allocation sites per layer; enabled by `main.py --profile`, which also
+profiles the action.py server through ATOM_PROFILE_DIR
+"""
+
+from collections import Counter
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Optional
+import atexit
+import importlib
+import json
+import os
+import signal
+import sys
+import time
+import tracemalloc
+
+
+# Frames are (filename, function name, line), outermost first. Allocation
+# tracebacks carry no function names, so classifiers should not need them.
+Frames = list[tuple[str, str, int]]
+
+LAYER_MODULES = {
+    "perception.py": "perception",
+    "decision.py": "decision",
+    "action.py": "action",
+    "memory.py": "memory",
+    "reasoning.py": "reasoning",
+    "llm.py": "llm",
+    "llm_cache.py": "llm",
+}
+
+
+@lru_cache(maxsize=None)
+def _module_layer(filename: str) -> Optional[str]:
+    base = os.path.basename(filename)
+    return "orchestrator" if base == "main.py" else LAYER_MODULES.get(base)
+
+
+def classify_by_module(frames: Frames) -> str:
+    """Outermost layer module on the stack; main.py alone counts as the orchestrator"""
+    in_main = False
+    for filename, _, _ in frames:
+        layer = _module_layer(filename)
+        if layer == "orchestrator":
+            in_main = True
+        elif layer is not None:
+            return layer
+    return "orchestrator" if in_main else "runtime"
+
+
+def classify_by_function(functions: list[Callable], default: str = "runtime") -> Callable[[Frames], str]:
+    """Outermost frame inside one of functions (e.g. MCP tool bodies), matched by line range"""
+    ranges = []
+    for fn in functions:
+        code = fn.__code__
+        lines = [line for _, _, line in code.co_lines() if line is not None]
+        ranges.append((code.co_filename, min(lines), max(lines), fn.__name__))
+
+    def classify(frames: Frames) -> str:
+        for filename, _, lineno in frames:
+            for range_file, first, last, name in ranges:
+                if first <= lineno <= last and filename == range_file:
+                    return name
+        return default
+    return classify
+
+
+class Profiler:
+    """
+    CPU and allocation profiler for one process
+
+    CPU: SIGPROF fires every `interval` seconds of process CPU time and the
+    handler records the main thread's stack, prefixed with its layer.
+    Memory: tracemalloc keeps `frames` frames per allocation; checkpoint()
+    only takes a snapshot, and stop() diffs consecutive snapshots per layer
+    and reports the top sites of each layer, so the loop is not slowed by
+    the analysis.
+    Only live allocations are visible to tracemalloc, so the reports show
+    retained memory rather than short-lived garbage.
+    """
+
+    def __init__(
+        self,
+        out_dir: str,
+        name: str,
+        classify: Callable[[Frames], str] = classify_by_module,
+        interval: float = 0.005,
+        frames: int = 16,
+        top_n: int = 10
+    ):
+        self.out_dir = Path(out_dir)
+        self.name = name
+        self.classify = classify
+        self.interval = interval
+        self.frames = frames
+        self.top_n = top_n
+        self.stacks: Counter[str] = Counter()
+        self.layer_samples: Counter[str] = Counter()
+        self.checkpoints: list[dict] = []
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._snapshots: list[tuple[str, tracemalloc.Snapshot, int, int]] = []
+        self._layer_cache: dict[tracemalloc.Traceback, Optional[str]] = {}
+        self._started_at = 0.0
+        self.running = False
+
+    # ===== CPU sampling =====
+    def _sample(self, signum, frame):
+        stack: Frames = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append((code.co_filename, code.co_name, frame.f_lineno or 0))
+            frame = frame.f_back
+        stack.reverse()
+        # Time spent taking snapshots is the profiler's, not the layer's
+        in_profiler = any(filename == __file__ for filename, _, _ in stack[-12:])
+        layer = "profiler" if in_profiler else self.classify(stack)
+        self.layer_samples[layer] += 1
+        self.stacks[";".join([layer] + [f"{os.path.basename(f)}:{n}" for f, n, _ in stack])] += 1
+
+    def start(self):
+        tracemalloc.start(self.frames)
+        self._baseline = self._snapshot()
+        signal.signal(signal.SIGPROF, self._sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        self._started_at = time.perf_counter()
+        self.running = True
+
+    # ===== Allocations =====
+    def _snapshot(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot()
+
+    def _layer_of(self, traceback: tracemalloc.Traceback) -> Optional[str]:
+        layer = self._layer_cache.get(traceback, "")
+        if layer == "":
+            if traceback[-1].filename == __file__:
+                layer = None  # the profiler's own sample counters
+            else:
+                layer = self.classify([(frame.filename, "", frame.lineno) for frame in traceback])
+            self._layer_cache[traceback] = layer
+        return layer
+
+    def _by_layer(self, stats: list) -> dict[str, list]:
+        layers: dict[str, list] = {}
+        for stat in stats:
+            layer = self._layer_of(stat.traceback)
+            if layer is not None:
+                layers.setdefault(layer, []).append(stat)
+        return layers
+
+    def checkpoint(self, label: str):
+        """Snapshot traced memory; growth per layer is computed at stop()"""
+        current, peak = tracemalloc.get_traced_memory()
+        self._snapshots.append((label, self._snapshot(), current, peak))
+
+    def _analyze_checkpoints(self):
+        previous = self._baseline
+        for label, snapshot, current, peak in self._snapshots:
+            growth = {
+                layer: sum(stat.size_diff for stat in stats)
+                for layer, stats in self._by_layer(snapshot.compare_to(previous, "traceback")).items()
+            }
+            self.checkpoints.append({
+                "label": label,
+                "traced_kib": round(current / 1024, 1),
+                "peak_kib": round(peak / 1024, 1),
+                "growth_kib": {layer: round(size / 1024, 1) for layer, size in sorted(growth.items()) if size}
+            })
+            previous = snapshot
+        self._snapshots.clear()
+
+    # ===== Reports =====
+    def stop(self) -> list[Path]:
+        """Stop sampling and write <name>.folded and <name>.alloc.txt"""
+        if not self.running:
+            return []
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, signal.SIG_DFL)
+        self.running = False
+        wall = time.perf_counter() - self._started_at
+
+        final = self._snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self._analyze_checkpoints()
+        retained = self._by_layer(final.compare_to(self._baseline, "traceback"))
+
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        folded_path = self.out_dir / f"{self.name}.folded"
+        with open(folded_path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+        report_path = self.out_dir / f"{self.name}.alloc.txt"
+        with open(report_path, "w", encoding="utf-8") as f:
+            f.write(self._report(retained, peak, wall))
+
+        (self.out_dir / f"{self.name}.checkpoints.json").write_text(
+            json.dumps(self.checkpoints, indent=2) + "\n", encoding="utf-8"
+        )
+        return [folded_path, report_path]
+
+    def _report(self, retained: dict[str, list], peak: int, wall: float) -> str:
+        total_samples = sum(self.layer_samples.values()) or 1
+        lines = [
+            f"Profile: {self.name} (pid {os.getpid()})",
+            f"Wall time: {wall:.2f}s  CPU samples: {sum(self.layer_samples.values())} "
+            f"@ {self.interval * 1000:.1f}ms  Peak traced memory: {peak / 1024:.1f} KiB",
+            "",
+            "CPU by layer:"
+        ]
+        for layer, count in self.layer_samples.most_common():
+            lines.append(f"  {layer:<28} {count:>6} samples  {count / total_samples:>6.1%}")
+
+        lines += ["", f"Retained allocations by layer (top {self.top_n} sites each):"]
+        ranked = sorted(retained.items(), key=lambda item: -sum(s.size_diff for s in item[1]))
+        for layer, stats in ranked:
+            size = sum(s.size_diff for s in stats)
+            if size <= 0:
+                continue
+            lines.append(f"\n  [{layer}] {size / 1024:.1f} KiB in {sum(s.count_diff for s in stats)} blocks")
+            sites: Counter[str] = Counter()
+            for stat in stats:
+                site = stat.traceback[-1]
+                sites[f"{site.filename}:{site.lineno}"] += stat.size_diff
+            for site, site_size in sites.most_common(self.top_n):
+                lines.append(f"    {site_size / 1024:>9.1f} KiB  {site}")
+
+        if self.checkpoints:
+            lines += ["", "Traced memory per checkpoint:"]
+            for point in self.checkpoints:
+                growth = ", ".join(f"{k} {v:+.1f}" for k, v in point["growth_kib"].items())
+                lines.append(f"  {point['label']:<20} {point['traced_kib']:>10.1f} KiB  {growth}")
+        return "\n".join(lines) + "\n"
+
+
+# ----------------------------------------------------------------------------
+# Module API
+# ----------------------------------------------------------------------------
+
+_profiler: Optional[Profiler] = None
+
+
+def start(out_dir: str, name: str, classify: Callable[[Frames], str] = classify_by_module) -> Profiler:
+    """Start profiling this process; reports go to out_dir when stop() runs"""
+    global _profiler
+    _profiler = Profiler(out_dir, name, classify)
+    _profiler.start()
+    return _profiler
+
+
+def start_from_env(
+    name: str,
+    classify: Callable[[Frames], str] = classify_by_module,
+    preload: tuple[str, ...] = ()
+) -> Optional[Profiler]:
+    """
+    Profile until exit if ATOM_PROFILE_DIR is set (used by the action.py server)
+
+    Modules in preload are imported first: their import-time allocations would
+    otherwise dominate the report and make the exit-time snapshot slow enough
+    to outlast the MCP client's shutdown grace period.
+    """
+    out_dir = os.getenv("ATOM_PROFILE_DIR")
+    if not out_dir or not hasattr(signal, "setitimer"):
+        return None
+    for module in preload:
+        importlib.import_module(module)
+    profiler = start(out_dir, name, classify)
+    atexit.register(stop)
+    return profiler
+
+
+def checkpoint(label: str):
+    """Allocation checkpoint (e.g. one per loop iteration); no-op when not profiling"""
+    if _profiler is not None and _profiler.running:
+        _profiler.checkpoint(label)
+
+
+@contextmanager
+def section(label: str):
+    """Checkpoint when the block exits, however it exits"""
+    try:
+        yield
+    finally:
+        checkpoint(label)
+
+
+def stop() -> list[Path]:
+    if _profiler is None:
+        return []
+    try:
+        return _profiler.stop()
+    except Exception as e:
+        print(f"Profiler report failed: {e}", file=sys.stderr)
+        return []
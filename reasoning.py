@@ -0,0 +1,97 @@
+"""
+Reasoning Sink: Renders decision reasoning steps locally
+Deterministic: A background thread drains a queue, so the agent loop never
+waits on rendering and no MCP round trip is spent on displaying reasoning
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+from rich.console import Console
+from rich.panel import Panel
+
+
+_STOP = object()
+
+
+class ReasoningSink:
+    """Non-blocking renderer/log sink for DecisionOutput.reasoning_steps"""
+
+    def __init__(
+        self,
+        console: Optional[Console] = None,
+        render: bool = True,
+        log_file: Optional[str] = None
+    ):
+        self.console = console or Console()
+        self.render = render
+        self.log_file = Path(log_file) if log_file else None
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        # Nothing to render or log: count the steps and drop them
+        self._thread: Optional[threading.Thread] = None
+        if self.render or self.log_file:
+            self._thread = threading.Thread(target=self._drain, name="reasoning-sink", daemon=True)
+            self._thread.start()
+
+        # Per-solve accounting
+        self.batches = 0
+        self.steps = 0
+        self.intercepted_calls = 0
+
+    @classmethod
+    def from_env(cls, console: Optional[Console] = None, render: bool = True) -> "ReasoningSink":
+        """
+        ATOM_REASONING_LOG=path          also append every solve's steps here as JSONL
+        """
+        return cls(console=console, render=render, log_file=os.getenv("ATOM_REASONING_LOG"))
+
+    def submit(self, iteration: int, steps: list, source: str = "decision"):
+        """Queue reasoning steps for rendering; never blocks the caller"""
+        if not steps:
+            return
+        self.batches += 1
+        self.steps += len(steps)
+        if self._thread:
+            self._queue.put((iteration, [str(step) for step in steps], source, time.time()))
+
+    def intercept_tool_call(self, iteration: int, arguments: dict):
+        """Handle a show_reasoning tool call locally instead of over MCP"""
+        self.intercepted_calls += 1
+        self.submit(iteration, arguments.get("steps") or [], source="show_reasoning")
+
+    def close(self, timeout: float = 2.0):
+        """Flush pending steps and stop the background thread"""
+        if self._thread:
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+    def _drain(self):
+        log = open(self.log_file, "a", encoding="utf-8") if self.log_file else None
+        try:
+            while True:
+                item = self._queue.get()
+                if item is _STOP:
+                    break
+                iteration, steps, source, ts = item
+                if self.render:
+                    for i, step in enumerate(steps, 1):
+                        self.console.print(Panel(
+                            step,
+                            title=f"Iteration {iteration} · Step {i}",
+                            border_style="cyan"
+                        ))
+                if log:
+                    log.write(json.dumps({
+                        "ts": ts,
+                        "iteration": iteration,
+                        "source": source,
+                        "steps": steps
+                    }) + "\n")
+                    log.flush()
+        finally:
+            if log:
+                log.close()
@@ -0,0 +1,508 @@
+"""
+Service: Long-running agent exposing solve over HTTP/JSON-RPC
+Deterministic: Layers, the LLM gateway and the MCP servers stay warm across
+requests; a bounded admission queue rejects excess load, every request has a
+deadline and shutdown drains in-flight solves before the servers exit
+
+Usage:
+    python service.py [--host 127.0.0.1] [--port 8765] [--concurrency 8] [--queue 64]
+
+POST / with a JSON-RPC 2.0 request (or an array of them):
+    {"jsonrpc": "2.0", "id": 1, "method": "solve",
+     "params": {"problem": "∫3x^2 dx", "user_id": "alice", "deadline_ms": 30000}}
+    {"jsonrpc": "2.0", "id": 2, "method": "solve_batch",
+     "params": {"problems": ["∫3x^2 dx", {"id": "p2", "problem": "∫sin(x) dx"}]}}
+    {"jsonrpc": "2.0", "id": 3, "method": "health"}
+
+GET /health returns the health result alone. Overload and shutdown errors
+are answered with HTTP 503 and Retry-After, so load balancers back off.
+"""
+
+from pydantic import BaseModel
+from typing import Any, Optional
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sys
+import time
+
+from rich.console import Console
+
+from metrics import MetricsRegistry
+from main import AgentRuntime
+from deadlines import Deadline
+import logs
+import looplag
+
+log = logs.get_logger("service")
+metrics = MetricsRegistry.from_env(process="service")
+
+# JSON-RPC 2.0 error codes (the -32000s are server-defined)
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+OVERLOADED = -32001
+DEADLINE_EXCEEDED = -32002
+SHUTTING_DOWN = -32003
+
+# Answered with 503 + Retry-After instead of 200
+UNAVAILABLE = {OVERLOADED, SHUTTING_DOWN}
+
+MAX_BODY_BYTES = 1 << 20
+
+# How long past its deadline a solve may take to wind down before it is cancelled
+DEADLINE_GRACE_SECONDS = 1.0
+
+
+class RPCError(Exception):
+    """A JSON-RPC error response"""
+
+    def __init__(self, code: int, message: str, data: Any = None):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.data = data
+
+    def to_dict(self) -> dict:
+        error = {"code": self.code, "message": self.message}
+        if self.data is not None:
+            error["data"] = self.data
+        return error
+
+
+class ServiceConfig(BaseModel):
+    """Admission, deadline and drain settings"""
+    host: str = "127.0.0.1"
+    port: int = 8765
+    concurrency: int = 8
+    queue_size: int = 64
+    deadline_seconds: float = 60.0
+    drain_seconds: float = 30.0
+    servers: int = 1
+    max_iterations: int = 25
+    allow_emails: bool = False
+
+    @classmethod
+    def from_env(cls) -> "ServiceConfig":
+        """
+        ATOM_SERVICE_HOST=127.0.0.1
+        ATOM_SERVICE_PORT=8765
+        ATOM_SERVICE_CONCURRENCY=8        solves running at once
+        ATOM_SERVICE_QUEUE=64             solves waiting for a slot before requests are rejected
+        ATOM_SERVICE_DEADLINE_MS=60000    default per-request deadline (queue wait included)
+        ATOM_SERVICE_DRAIN_S=30           how long shutdown waits for in-flight solves
+        ATOM_SERVICE_SERVERS=1            action MCP servers tool calls are spread over
+        ATOM_SERVICE_ALLOW_EMAILS=1       let requests ask for emails (default: rejected)
+        """
+        return cls(
+            host=os.getenv("ATOM_SERVICE_HOST", "127.0.0.1"),
+            port=int(os.getenv("ATOM_SERVICE_PORT", "8765")),
+            concurrency=int(os.getenv("ATOM_SERVICE_CONCURRENCY", "8")),
+            queue_size=int(os.getenv("ATOM_SERVICE_QUEUE", "64")),
+            deadline_seconds=int(os.getenv("ATOM_SERVICE_DEADLINE_MS", "60000")) / 1000,
+            drain_seconds=float(os.getenv("ATOM_SERVICE_DRAIN_S", "30")),
+            servers=int(os.getenv("ATOM_SERVICE_SERVERS", "1")),
+            allow_emails=os.getenv("ATOM_SERVICE_ALLOW_EMAILS", "0") == "1"
+        )
+
+
+class AgentService:
+    """
+    solve / solve_batch / health over one warm AgentRuntime
+
+    At most config.concurrency solves run at once and config.queue_size more
+    may wait for a slot; anything beyond that is rejected immediately with
+    OVERLOADED rather than queued without bound. A request's deadline covers
+    its queue wait and its solve: every layer of the solve sees it, and a
+    solve that runs out of time returns status deadline_exceeded with its
+    partial results (cancelled outright only if it overruns by
+    DEADLINE_GRACE_SECONDS).
+    """
+
+    def __init__(
+        self,
+        runtime: AgentRuntime,
+        config: ServiceConfig
+    ):
+        self.runtime = runtime
+        self.config = config
+        self.draining = False
+        self.running = 0
+        self.waiting = 0
+        self.counts = {"solved": 0, "failed": 0, "rejected": 0, "deadline_exceeded": 0}
+        self.started = time.time()
+        self._slots = asyncio.Semaphore(config.concurrency)
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    def _admit(self):
+        if self.draining:
+            raise RPCError(SHUTTING_DOWN, "service is shutting down")
+        if self.running + self.waiting >= self.config.concurrency + self.config.queue_size:
+            self.counts["rejected"] += 1
+            raise RPCError(OVERLOADED, "admission queue full", {
+                "running": self.running, "waiting": self.waiting, "queue_size": self.config.queue_size
+            })
+
+    def _deadline(self, deadline_ms: Optional[float]) -> float:
+        if deadline_ms is None:
+            return self.config.deadline_seconds
+        if not isinstance(deadline_ms, (int, float)) or deadline_ms <= 0:
+            raise RPCError(INVALID_PARAMS, "deadline_ms must be a positive number")
+        return deadline_ms / 1000
+
+    def _check_emails(self, send_emails: Any):
+        # Requests are unauthenticated: sending real mail is the operator's decision
+        if send_emails and not self.config.allow_emails:
+            raise RPCError(INVALID_PARAMS, "send_emails is disabled on this server")
+
+    async def _acquire_slot(self, timeout: float) -> bool:
+        """
+        Wait up to timeout for a solve slot; False if none came free
+
+        The acquire runs as its own task, so a slot it won just as the wait
+        timed out or was cancelled is seen and handed back (wait_for on the
+        acquire itself can lose it on Python 3.10).
+        """
+        acquire = asyncio.ensure_future(self._slots.acquire())
+        try:
+            await asyncio.wait({acquire}, timeout=timeout)
+        except asyncio.CancelledError:
+            if acquire.done() and not acquire.cancelled():
+                self._slots.release()
+            else:
+                acquire.cancel()
+            raise
+        if acquire.done():
+            return True
+        acquire.cancel()
+        return False
+
+    async def solve(
+        self,
+        problem: str,
+        user_id: Optional[str] = None,
+        deadline_ms: Optional[float] = None,
+        send_emails: bool = False
+    ) -> dict:
+        """Solve one problem; the result is SolveStats.to_record() plus the queue wait"""
+        if not isinstance(problem, str) or not problem.strip():
+            raise RPCError(INVALID_PARAMS, "problem must be a non-empty string")
+        self._check_emails(send_emails)
+        timeout = self._deadline(deadline_ms)
+        self._admit()
+        loop = asyncio.get_running_loop()
+        deadline = Deadline(timeout)
+
+        self.waiting += 1
+        self._idle.clear()
+        enqueued = loop.time()
+        try:
+            try:
+                acquired = await self._acquire_slot(timeout)
+            finally:
+                self.waiting -= 1
+            if not acquired:
+                self.counts["deadline_exceeded"] += 1
+                raise RPCError(DEADLINE_EXCEEDED, "deadline expired while queued", {"deadline_ms": timeout * 1000})
+            queued = loop.time() - enqueued
+
+            self.running += 1
+            try:
+                stats = await asyncio.wait_for(
+                    self.runtime.solve(problem.strip(), user=user_id, send_emails=send_emails, deadline=deadline),
+                    deadline.remaining() + DEADLINE_GRACE_SECONDS
+                )
+            except asyncio.TimeoutError:
+                self.counts["deadline_exceeded"] += 1
+                raise RPCError(DEADLINE_EXCEEDED, "deadline expired while solving", {
+                    "deadline_ms": timeout * 1000, "queued_ms": round(queued * 1000, 1)
+                })
+            except Exception as e:
+                self.counts["failed"] += 1
+                log.exception("solve failed: %s", problem)
+                raise RPCError(INTERNAL_ERROR, f"{type(e).__name__}: {e}")
+            finally:
+                self.running -= 1
+                self._slots.release()
+        finally:
+            if self.running == 0 and self.waiting == 0:
+                self._idle.set()
+
+        if stats.status in ("solved", "deadline_exceeded"):
+            self.counts[stats.status] += 1
+        else:
+            self.counts["failed"] += 1
+        return {**stats.to_record(), "queued_ms": round(queued * 1000, 1)}
+
+    async def solve_batch(
+        self,
+        problems: list,
+        user_id: Optional[str] = None,
+        deadline_ms: Optional[float] = None,
+        send_emails: bool = False
+    ) -> dict:
+        """
+        Solve problems (strings or {"id", "problem", "user_id"}) concurrently
+
+        Every item goes through admission on its own, so a batch larger than
+        the free capacity gets OVERLOADED entries rather than a single error.
+        Results come back in input order.
+        """
+        if not isinstance(problems, list):
+            raise RPCError(INVALID_PARAMS, "problems must be a list")
+        self._check_emails(send_emails)
+        if self.draining:
+            raise RPCError(SHUTTING_DOWN, "service is shutting down")
+
+        async def one(index: int, item: Any) -> dict:
+            item = {"problem": item} if isinstance(item, str) else item
+            if not isinstance(item, dict):
+                item = {}
+            head = {"index": index, "id": item.get("id", index)}
+            try:
+                result = await self.solve(
+                    item.get("problem"), item.get("user_id", user_id), deadline_ms, send_emails
+                )
+            except RPCError as e:
+                return {**head, "status": "error", "error": e.to_dict()}
+            return {**head, **result}
+
+        return {"results": await asyncio.gather(*(one(i, item) for i, item in enumerate(problems)))}
+
+    def health(self) -> dict:
+        return {
+            "status": "draining" if self.draining else "ok",
+            "running": self.running,
+            "waiting": self.waiting,
+            "concurrency": self.config.concurrency,
+            "queue_size": self.config.queue_size,
+            "servers": len(self.runtime.actions),
+            "uptime_s": round(time.time() - self.started, 1),
+            **self.counts,
+            "solutions": self.runtime.solutions.stats() if self.runtime.solutions else None
+        }
+
+    async def drain(self, timeout: float) -> bool:
+        """Stop admitting, then wait for running and queued solves; False if some were still going"""
+        self.draining = True
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+# ----------------------------------------------------------------------------
+# JSON-RPC dispatch
+# ----------------------------------------------------------------------------
+
+async def dispatch(service: AgentService, request: Any) -> Optional[dict]:
+    """One JSON-RPC request object -> response object (None for notifications)"""
+    request_id = request.get("id") if isinstance(request, dict) else None
+    notification = isinstance(request, dict) and "id" not in request
+    try:
+        if not isinstance(request, dict) or request.get("jsonrpc") != "2.0" or not isinstance(request.get("method"), str):
+            raise RPCError(INVALID_REQUEST, "expected a JSON-RPC 2.0 request object")
+        params = request.get("params", {})
+        if not isinstance(params, dict):
+            raise RPCError(INVALID_PARAMS, "params must be an object")
+        method = request["method"]
+        if method == "health":
+            result = service.health()
+        elif method in ("solve", "solve_batch"):
+            allowed = {"problem"} if method == "solve" else {"problems"}
+            allowed |= {"user_id", "deadline_ms", "send_emails"}
+            unknown = set(params) - allowed
+            if unknown:
+                raise RPCError(INVALID_PARAMS, f"unknown params: {sorted(unknown)}")
+            handler = service.solve if method == "solve" else service.solve_batch
+            result = await handler(**params)
+        else:
+            raise RPCError(METHOD_NOT_FOUND, f"unknown method {method!r}")
+    except TypeError as e:
+        # Missing required params
+        error = RPCError(INVALID_PARAMS, str(e))
+        return None if notification else {"jsonrpc": "2.0", "id": request_id, "error": error.to_dict()}
+    except RPCError as e:
+        return None if notification else {"jsonrpc": "2.0", "id": request_id, "error": e.to_dict()}
+    return None if notification else {"jsonrpc": "2.0", "id": request_id, "result": result}
+
+
+async def handle_body(service: AgentService, body: bytes) -> tuple[int, Any]:
+    """HTTP status and JSON payload for a POSTed JSON-RPC body"""
+    try:
+        payload = json.loads(body)
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        return 200, {"jsonrpc": "2.0", "id": None, "error": RPCError(PARSE_ERROR, str(e)).to_dict()}
+
+    if isinstance(payload, list):
+        if not payload:
+            return 200, {"jsonrpc": "2.0", "id": None, "error": RPCError(INVALID_REQUEST, "empty batch").to_dict()}
+        responses = [r for r in await asyncio.gather(*(dispatch(service, p) for p in payload)) if r is not None]
+        return 200, responses or None
+
+    response = await dispatch(service, payload)
+    if response is not None and response.get("error", {}).get("code") in UNAVAILABLE:
+        return 503, response
+    return 200, response
+
+
+# ----------------------------------------------------------------------------
+# HTTP/1.1 transport (asyncio streams, keep-alive)
+# ----------------------------------------------------------------------------
+
+REASONS = {200: "OK", 204: "No Content", 400: "Bad Request", 404: "Not Found",
+           405: "Method Not Allowed", 413: "Payload Too Large", 503: "Service Unavailable"}
+
+
+def _response(status: int, payload: Any, keep_alive: bool) -> bytes:
+    body = b"" if payload is None else json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    if payload is None and status == 200:
+        status = 204
+    headers = [
+        f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+        "Content-Type: application/json",
+        f"Content-Length: {len(body)}",
+        f"Connection: {'keep-alive' if keep_alive else 'close'}"
+    ]
+    if status == 503:
+        headers.append("Retry-After: 1")
+    return ("\r\n".join(headers) + "\r\n\r\n").encode("latin-1") + body
+
+
+async def handle_connection(service: AgentService, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            try:
+                method, path, version = request_line.decode("latin-1").split()
+            except ValueError:
+                writer.write(_response(400, {"error": "malformed request line"}, False))
+                break
+            headers = {}
+            while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+            try:
+                length = int(headers.get("content-length") or 0)
+            except ValueError:
+                length = -1
+            if length < 0:
+                # Without a usable length the body cannot be framed, so the connection ends here
+                writer.write(_response(400, {"error": "invalid Content-Length"}, False))
+                break
+            if length > MAX_BODY_BYTES:
+                writer.write(_response(413, {"error": f"body over {MAX_BODY_BYTES} bytes"}, False))
+                break
+            body = await reader.readexactly(length) if length else b""
+
+            if method == "GET" and path.rstrip("/") == "/health":
+                status, payload = (503 if service.draining else 200), service.health()
+            elif method == "POST" and path in ("/", "/rpc"):
+                status, payload = await handle_body(service, body)
+            elif path in ("/", "/rpc", "/health"):
+                status, payload = 405, {"error": f"{method} not allowed on {path}"}
+            else:
+                status, payload = 404, {"error": f"no route {path}"}
+
+            # While draining, finish this exchange and let the client reconnect elsewhere
+            keep_alive = keep_alive and not service.draining
+            writer.write(_response(status, payload, keep_alive))
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(config: ServiceConfig, server_log: Optional[str] = None):
+    """Start a runtime, serve until SIGINT/SIGTERM, then drain"""
+    console = Console(stderr=True)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    with open(server_log or os.devnull, "a", encoding="utf-8") as errlog:
+        async with AgentRuntime.start(
+            servers=config.servers, errlog=errlog, max_iterations=config.max_iterations
+        ) as runtime:
+            service = AgentService(runtime, config)
+            connections: set[asyncio.StreamWriter] = set()
+
+            async def on_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+                connections.add(writer)
+                try:
+                    await handle_connection(service, reader, writer)
+                finally:
+                    connections.discard(writer)
+
+            server = await asyncio.start_server(on_connection, config.host, config.port)
+            console.print(
+                f"[green]Serving JSON-RPC on http://{config.host}:{config.port} "
+                f"(concurrency {config.concurrency}, queue {config.queue_size}, "
+                f"{len(runtime.actions)} action server(s))[/green]"
+            )
+            async with looplag.monitored("service", metrics):
+                await stop.wait()
+                server.close()
+                console.print("[yellow]Draining: listener closed, no new requests admitted[/yellow]")
+                if not await service.drain(config.drain_seconds):
+                    console.print(
+                        f"[red]Drain timed out after {config.drain_seconds:.0f}s with "
+                        f"{service.running} running and {service.waiting} queued[/red]"
+                    )
+                # Idle keep-alive connections would otherwise hold wait_closed() open
+                for writer in list(connections):
+                    writer.close()
+                await server.wait_closed()
+    console.print("[green]✓ Service stopped[/green]")
+
+
+def main():
+    defaults = ServiceConfig.from_env()
+    parser = argparse.ArgumentParser(description="Serve solve/solve_batch/health over HTTP JSON-RPC")
+    parser.add_argument("--host", default=defaults.host)
+    parser.add_argument("--port", type=int, default=defaults.port)
+    parser.add_argument("--concurrency", type=int, default=defaults.concurrency, help="Solves running at once")
+    parser.add_argument("--queue", type=int, default=defaults.queue_size, help="Solves waiting before rejection")
+    parser.add_argument("--deadline-ms", type=int, default=int(defaults.deadline_seconds * 1000),
+                        help="Default per-request deadline")
+    parser.add_argument("--drain-s", type=float, default=defaults.drain_seconds,
+                        help="How long shutdown waits for in-flight solves")
+    parser.add_argument("--servers", type=int, default=defaults.servers, help="Action MCP servers")
+    parser.add_argument("--server-log", help="Append the action servers' stderr here (default: discarded)")
+    parser.add_argument("--allow-emails", action="store_true", default=defaults.allow_emails,
+                        help="Honor send_emails in requests (off by default: requests are unauthenticated)")
+    args = parser.parse_args()
+
+    config = defaults.model_copy(update={
+        "host": args.host,
+        "port": args.port,
+        "concurrency": max(1, args.concurrency),
+        "queue_size": max(0, args.queue),
+        "deadline_seconds": args.deadline_ms / 1000,
+        "drain_seconds": args.drain_s,
+        "servers": max(1, args.servers),
+        "allow_emails": args.allow_emails
+    })
+    logs.configure(level=os.getenv("ATOM_LOG_LEVEL", "WARNING"))
+    try:
+        asyncio.run(serve(config, args.server_log))
+    except OSError as e:
+        sys.exit(f"Could not start service: {e}")
+
+
+if __name__ == "__main__":
+    main()
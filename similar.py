@@ -0,0 +1,198 @@
+"""
+Similar Problems: Local retrieval of solved problems with a similar structure
+Deterministic: Structural tokens of the canonical expression are MinHashed and
+bucketed with LSH; the nearest solved plans become few-shot hints for decisions
+"""
+
+from array import array
+from functools import lru_cache
+from operator import eq
+from pydantic import BaseModel
+from typing import Iterable, Optional
+import hashlib
+import os
+import re
+import struct
+
+from solutions import SolutionStore, split_terms, canonical_expression
+
+
+NUM_PERM = 32
+BANDS = 8
+ROWS = NUM_PERM // BANDS
+
+_COEFFICIENT = re.compile(r"(?<![\d.^])(?<!\^-)\d+(?:\.\d+)?")
+_FUNCTION = re.compile(r"([a-z]{2,})\(([^()]*)\)")
+_MONOMIAL = re.compile(r"#(v(\^\d+(\.\d+)?)?)?")
+
+
+@lru_cache(maxsize=64)
+def _variable_pattern(variable: str) -> re.Pattern:
+    return re.compile(rf"(?<![a-z]){re.escape(variable)}(?![a-z])")
+
+
+def structure(expression: str, variable: str = "x") -> list[str]:
+    """
+    Sorted term shapes of the canonical expression: signs and coefficients
+    become #, the variable becomes v ("3x^2 - 7x" -> ["#v", "#v^2"])
+    """
+    text = _variable_pattern(variable).sub("v", canonical_expression(expression, variable))
+    # Exponents stay: x^2 and x^3 are different shapes, 2x^2 and 5x^2 are not
+    text = _COEFFICIENT.sub("#", text)
+    return sorted(
+        term if term.startswith("#") else "#" + term
+        for term in (t.lstrip("+-") for t in split_terms(text))
+    )
+
+
+def tokens(expression: str, variable: str = "x") -> set[str]:
+    """
+    Structural features of an expression
+
+    The whole shape, each term's shape, the term count, functions with their
+    argument shapes and character trigrams of the shape (so one extra term
+    or a changed power still shares most tokens).
+    """
+    terms = structure(expression, variable)
+    shape = "+".join(terms)
+    features = {f"shape:{shape}", f"terms:{len(terms)}"}
+    features.update(f"term:{term}" for term in terms)
+    if all(_MONOMIAL.fullmatch(term) for term in terms):
+        features.add("polynomial")
+    for name, argument in _FUNCTION.findall(shape):
+        features.add(f"fn:{name}")
+        features.add(f"arg:{name}({argument})")
+    features.update(shape[i:i + 3] for i in range(len(shape) - 2))
+    return features
+
+
+@lru_cache(maxsize=1 << 16)
+def _token_hashes(token: str) -> tuple[int, ...]:
+    """NUM_PERM independent 32-bit hashes of one token"""
+    digest = b"".join(
+        hashlib.blake2b(token.encode("utf-8"), digest_size=64, salt=bytes([i]) * 16).digest()
+        for i in range((NUM_PERM * 4 + 63) // 64)
+    )
+    return struct.unpack(f"<{NUM_PERM}I", digest[:NUM_PERM * 4])
+
+
+def minhash(features: Iterable[str]) -> tuple[int, ...]:
+    """Element-wise minimum of the token hashes (token hashes are cached)"""
+    return tuple(map(min, zip(*(_token_hashes(token) for token in features))))
+
+
+def compact_plan(tools: list[str]) -> str:
+    """["integrate_term", "integrate_term"] -> "integrate_term x2" (runs collapsed)"""
+    steps: list[list] = []
+    for tool in tools:
+        if steps and steps[-1][0] == tool:
+            steps[-1][1] += 1
+        else:
+            steps.append([tool, 1])
+    return " -> ".join(tool if count == 1 else f"{tool} x{count}" for tool, count in steps)
+
+
+class SimilarProblem(BaseModel):
+    """A retrieved solved problem"""
+    expression: str
+    plan: str
+    similarity: float
+
+
+class SimilarityIndex:
+    """
+    MinHash/LSH index over solved problems
+
+    Signatures are packed into one array('I') (NUM_PERM words per problem);
+    LSH buckets map a band of the signature to problem ids. A bucket keeps
+    at most bucket_size ids, overwriting the oldest, since problems sharing
+    every band of a shape are interchangeable as examples. Candidates from
+    all bands are ranked by the fraction of equal signature words (an
+    estimate of the Jaccard similarity of their token sets).
+    """
+
+    def __init__(self, bucket_size: int = 64):
+        self.bucket_size = bucket_size
+        self._signatures = array("I")
+        self._expressions: list[str] = []
+        self._plans: list[str] = []
+        self._plan_ids: dict[str, str] = {}
+        self._buckets: list[dict[tuple, list[int]]] = [{} for _ in range(BANDS)]
+
+    def __len__(self) -> int:
+        return len(self._expressions)
+
+    @classmethod
+    def from_solutions(cls, store: SolutionStore, limit: int = 100000, **kwargs) -> "SimilarityIndex":
+        index = cls(**kwargs)
+        for solution in store.solutions(limit):
+            if solution.plan:
+                index.add(solution.expression, solution.variable, solution.plan)
+        return index
+
+    def add(self, expression: str, variable: str, plan: list[str]) -> int:
+        """Index a solved problem and the tool sequence that solved it"""
+        signature = minhash(tokens(expression, variable))
+        problem_id = len(self._expressions)
+        self._signatures.extend(signature)
+        self._expressions.append(expression)
+        text = compact_plan(plan)
+        self._plans.append(self._plan_ids.setdefault(text, text))
+
+        for band, buckets in enumerate(self._buckets):
+            key = signature[band * ROWS:(band + 1) * ROWS]
+            bucket = buckets.get(key)
+            if bucket is None:
+                buckets[key] = [problem_id]
+            elif len(bucket) < self.bucket_size:
+                bucket.append(problem_id)
+            else:
+                bucket[problem_id % self.bucket_size] = problem_id
+        return problem_id
+
+    def query(
+        self,
+        expression: str,
+        variable: str = "x",
+        k: int = 3,
+        min_similarity: float = 0.5
+    ) -> list[SimilarProblem]:
+        """Up to k solved problems at least min_similarity alike, best first (one per plan)"""
+        if not expression or not self._expressions:
+            return []
+        signature = minhash(tokens(expression, variable))
+        candidates: set[int] = set()
+        for band, buckets in enumerate(self._buckets):
+            candidates.update(buckets.get(signature[band * ROWS:(band + 1) * ROWS], ()))
+
+        scored = []
+        signatures = self._signatures
+        for problem_id in candidates:
+            start = problem_id * NUM_PERM
+            similarity = sum(map(eq, signature, signatures[start:start + NUM_PERM])) / NUM_PERM
+            if similarity >= min_similarity:
+                scored.append((similarity, problem_id))
+        scored.sort(key=lambda item: (-item[0], -item[1]))
+
+        results, plans = [], set()
+        for similarity, problem_id in scored:
+            plan = self._plans[problem_id]
+            if plan in plans:
+                continue
+            plans.add(plan)
+            results.append(SimilarProblem(
+                expression=self._expressions[problem_id], plan=plan, similarity=similarity
+            ))
+            if len(results) == k:
+                break
+        return results
+
+
+def from_env(store: Optional[SolutionStore]) -> Optional[SimilarityIndex]:
+    """
+    ATOM_SIMILAR=0                   disable few-shot retrieval
+    ATOM_SIMILAR_LIMIT=100000        solved problems loaded from the store
+    """
+    if store is None or os.getenv("ATOM_SIMILAR", "1") == "0":
+        return None
+    return SimilarityIndex.from_solutions(store, limit=int(os.getenv("ATOM_SIMILAR_LIMIT", "100000")))
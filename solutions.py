@@ -0,0 +1,221 @@
+"""
+Solutions: Cross-session store of solved problems for instant repeat answers
+Deterministic: SQLite table keyed by (canonical expression, variable), tagged
+with the solver version; only answers whose verification passed are served
+"""
+
+from pydantic import BaseModel, Field
+from typing import Any, Literal, Optional
+import argparse
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+
+# Bump whenever a tool's output changes (integration, verification, LaTeX
+# formatting); entries written under any other version are purged on open.
+SOLVER_VERSION = "1"
+
+Verification = Literal["pass", "skipped", "unverified"]
+
+
+def _unary_sign(expression: str, i: int) -> bool:
+    return expression[i - 1] in "^*/(" or (
+        expression[i - 1] in "eE" and i > 1 and expression[i - 2].isdigit()
+    )
+
+
+def split_terms(expression: str) -> list[str]:
+    """
+    Top-level signed terms ("+3x^2", "-x^-1")
+
+    Signs after ^ * / ( and in exponents of numbers (1e-5) belong to the
+    operand, so reordering the terms never changes the sum.
+    """
+    terms, current, depth = [], "", 0
+    for i, ch in enumerate(expression):
+        depth += ch == "("
+        depth -= ch == ")"
+        if ch in "+-" and depth == 0 and i > 0 and not _unary_sign(expression, i):
+            terms.append(current)
+            current = ""
+        current += ch
+    terms.append(current)
+    return [t if t[0] in "+-" else "+" + t for t in terms if t]
+
+
+def canonical_expression(expression: str, variable: str = "x") -> str:
+    """
+    Spelling-independent form of an expression
+
+    Drops whitespace, a leading integral sign and trailing d<variable>,
+    writes powers as ^, drops * after a leading coefficient, and sorts
+    the top-level terms, so "2x + 3*x**2" and "3x^2+2x" share a key.
+    """
+    text = re.sub(r"\s+", "", expression).lstrip("∫")
+    text = re.sub(rf"d{re.escape(variable)}$", "", text)
+    text = text.replace("**", "^")
+    text = re.sub(r"(?<![\w.^])(\d+(?:\.\d+)?)\*(?=[A-Za-z(])", r"\1", text)
+    return "".join(sorted(split_terms(text))).lstrip("+")
+
+
+class Solution(BaseModel):
+    """A stored answer and where it came from"""
+    expression: str = Field(description="Expression as first solved (before canonicalization)")
+    variable: str = "x"
+    final_answer: str
+    latex: Optional[str] = None
+    verification: Verification
+    plan: list[str] = Field(default_factory=list, description="Tools called, in order")
+    provenance: dict[str, Any] = Field(
+        default_factory=dict,
+        description="problem, user, session, backend and tool calls that produced the answer"
+    )
+    solver_version: str = SOLVER_VERSION
+    hits: int = 0
+    created_at: float = Field(default_factory=time.time)
+    last_hit_at: Optional[float] = None
+
+
+class SolutionStore:
+    """Persistent (SQLite, WAL) map of canonical expression -> Solution"""
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS solutions ("
+        " key TEXT NOT NULL,"
+        " variable TEXT NOT NULL,"
+        " solver_version TEXT NOT NULL,"
+        " solution TEXT NOT NULL,"
+        " verification TEXT NOT NULL,"
+        " hits INTEGER NOT NULL DEFAULT 0,"
+        " created_at REAL NOT NULL,"
+        " last_hit_at REAL,"
+        " PRIMARY KEY (key, variable))"
+    )
+
+    LOOKUP = "SELECT solution, hits, last_hit_at FROM solutions WHERE key = ? AND variable = ? AND solver_version = ?"
+    RECORD_HIT = "UPDATE solutions SET hits = hits + 1, last_hit_at = ? WHERE key = ? AND variable = ?"
+    # A passed verification is never replaced by a weaker one
+    PUT = (
+        "INSERT INTO solutions (key, variable, solver_version, solution, verification, created_at)"
+        " VALUES (?, ?, ?, ?, ?, ?)"
+        " ON CONFLICT (key, variable) DO UPDATE SET solver_version = excluded.solver_version,"
+        " solution = excluded.solution, verification = excluded.verification,"
+        " hits = 0, created_at = excluded.created_at, last_hit_at = NULL"
+        " WHERE solutions.verification != 'pass' OR excluded.verification = 'pass'"
+        " OR solutions.solver_version != excluded.solver_version"
+    )
+    LIST = (
+        "SELECT solution, hits, last_hit_at FROM solutions WHERE solver_version = ?"
+        " ORDER BY hits DESC, created_at DESC LIMIT ?"
+    )
+
+    def __init__(self, path: str = "solutions.db", solver_version: str = SOLVER_VERSION):
+        self.path = path
+        self.solver_version = solver_version
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        with self._db:
+            self._db.execute(self.SCHEMA)
+            self._db.execute("DELETE FROM solutions WHERE solver_version != ?", (solver_version,))
+
+    @classmethod
+    def from_env(cls) -> Optional["SolutionStore"]:
+        """
+        ATOM_SOLUTIONS_DB=solutions.db   keep solutions here (default: off)
+        ATOM_SOLVER_VERSION=tag          override the solver-version tag
+        """
+        path = os.getenv("ATOM_SOLUTIONS_DB")
+        if not path:
+            return None
+        return cls(
+            path=path,
+            solver_version=os.getenv("ATOM_SOLVER_VERSION", SOLVER_VERSION)
+        )
+
+    def lookup(self, expression: str, variable: str = "x") -> Optional[Solution]:
+        """The stored solution if its verification passed (counts a hit), else None"""
+        if not expression:
+            return None
+        key = canonical_expression(expression, variable)
+        with self._lock:
+            row = self._db.execute(self.LOOKUP, (key, variable, self.solver_version)).fetchone()
+            solution = Solution(**json.loads(row[0]), hits=row[1], last_hit_at=row[2]) if row else None
+            if solution is None or solution.verification != "pass":
+                self.misses += 1
+                return None
+            now = time.time()
+            with self._db:
+                self._db.execute(self.RECORD_HIT, (now, key, variable))
+            self.hits += 1
+        return solution.model_copy(update={"hits": solution.hits + 1, "last_hit_at": now})
+
+    def put(self, solution: Solution):
+        """Store a solved problem; an existing verified answer is only replaced by another verified one"""
+        key = canonical_expression(solution.expression, solution.variable)
+        payload = solution.model_copy(update={"solver_version": self.solver_version}).model_dump_json(
+            exclude={"hits", "last_hit_at"}
+        )
+        with self._lock, self._db:
+            self._db.execute(self.PUT, (
+                key, solution.variable, self.solver_version, payload, solution.verification, solution.created_at
+            ))
+
+    def invalidate(self, expression: Optional[str] = None, variable: str = "x") -> int:
+        """Drop one expression's solution, or every solution; returns the number removed"""
+        with self._lock, self._db:
+            if expression is None:
+                cursor = self._db.execute("DELETE FROM solutions")
+            else:
+                cursor = self._db.execute(
+                    "DELETE FROM solutions WHERE key = ? AND variable = ?",
+                    (canonical_expression(expression, variable), variable)
+                )
+        return cursor.rowcount
+
+    def solutions(self, limit: int = 100) -> list[Solution]:
+        """Current-version solutions, most used first"""
+        with self._lock:
+            rows = self._db.execute(self.LIST, (self.solver_version, limit)).fetchall()
+        return [Solution(**json.loads(row[0]), hits=row[1], last_hit_at=row[2]) for row in rows]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "solver_version": self.solver_version
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or invalidate stored solutions")
+    parser.add_argument("command", choices=["list", "invalidate"])
+    parser.add_argument("expression", nargs="?", help="invalidate only this expression (default: all)")
+    parser.add_argument("--variable", default="x")
+    parser.add_argument("--db", default=os.getenv("ATOM_SOLUTIONS_DB", "solutions.db"))
+    args = parser.parse_args()
+
+    store = SolutionStore(args.db, os.getenv("ATOM_SOLVER_VERSION", SOLVER_VERSION))
+    if args.command == "list":
+        for solution in store.solutions():
+            print(f"{solution.hits:>5}  {solution.verification:<10}  {solution.expression}  ->  {solution.final_answer}")
+    else:
+        removed = store.invalidate(args.expression, args.variable)
+        print(f"Removed {removed} solution(s)")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import json
+
+from checkpoints import CheckpointLog, read_records
+
+
+def _iteration(checkpoint, n, candidate=None, verified=False):
+    checkpoint.append(
+        "iteration",
+        iteration=n,
+        session={"iteration_count": n},
+        decision={"action_type": "tool_call"},
+        tool_result_text=f"result {n}",
+        candidate=candidate,
+        verified=verified,
+        stats={"plan": ["integrate_term"] * n},
+        usage={"calls": n}
+    )
+
+
+def _crash(checkpoint):
+    # The process died: the file is closed but finish() never ran
+    checkpoint._file.close()
+    checkpoint._file = None
+
+
+def test_resume_point_folds_the_last_complete_iteration(tmp_path):
+    log = CheckpointLog(str(tmp_path))
+    checkpoint = log.open("∫3x^2 dx", "alice")
+    checkpoint.append("perception", perceived={"expression": "3x^2"})
+    _iteration(checkpoint, 1)
+    _iteration(checkpoint, 2, candidate="x^{3} + C", verified=True)
+    _iteration(checkpoint, 3)
+    checkpoint.close()
+
+    point = log.open("∫3x^2 dx", "alice").resume_point()
+    assert point.iteration == 3
+    assert point.tool_result_text == "result 3"
+    assert point.candidate == "x^{3} + C"  # kept from an earlier record
+    assert point.verified is False
+    assert len(point.decisions) == 3
+    assert point.perceived == {"expression": "3x^2"}
+
+
+def test_torn_last_line_is_skipped_and_repaired(tmp_path):
+    log = CheckpointLog(str(tmp_path))
+    checkpoint = log.open("∫x dx")
+    checkpoint.append("perception", perceived={"expression": "x"})
+    _iteration(checkpoint, 1)
+    _crash(checkpoint)
+    # A crash mid-write leaves half a record without its newline
+    with open(checkpoint.path, "a", encoding="utf-8") as f:
+        f.write('{"kind": "iteration", "iteration": 2, "sess')
+    checkpoint._release()
+
+    resumed = log.open("∫x dx")
+    assert resumed.resume_point().iteration == 1
+
+    # Appending after the torn line terminates it first, so the new record parses
+    _iteration(resumed, 2)
+    resumed.close()
+    records = read_records(resumed.path)
+    assert [r.get("iteration") for r in records if r["kind"] == "iteration"] == [1, 2]
+    assert log.open("∫x dx").resume_point().iteration == 2
+
+
+def test_finish_removes_the_log(tmp_path):
+    log = CheckpointLog(str(tmp_path))
+    checkpoint = log.open("∫x dx")
+    checkpoint.append("perception", perceived={})
+    checkpoint.finish()
+    assert not checkpoint.path.exists()
+    assert log.pending() == []
+
+
+def test_one_writer_per_solve_in_a_process(tmp_path):
+    log = CheckpointLog(str(tmp_path))
+    first = log.open("∫x dx", "alice")
+    assert log.open("∫x dx", "alice") is None
+    assert log.open("∫x dx", "bob") is not None
+    first.close()
+    assert log.open("∫x dx", "alice") is not None
+
+
+def test_pending_lists_interrupted_solves(tmp_path):
+    log = CheckpointLog(str(tmp_path))
+    for problem in ("∫x dx", "∫2x dx"):
+        checkpoint = log.open(problem)
+        checkpoint.append("perception", perceived={})
+        _iteration(checkpoint, 1)
+        checkpoint.close()
+    # Only a header: nothing past perception to resume
+    empty = log.open("∫3x dx")
+    empty.path.write_text(json.dumps({"kind": "solve", "problem": "∫3x dx"}) + "\n", encoding="utf-8")
+    empty.close()
+
+    assert sorted(point.problem for point in log.pending()) == ["∫2x dx", "∫x dx"]
@@ -0,0 +1,117 @@
+import asyncio
+import json
+import signal
+import time
+
+import pytest
+
+import action
+import deadlines
+from deadlines import Deadline, DeadlineExceeded
+
+
+def test_bounded_raises_and_cancels_at_the_deadline():
+    cancelled = asyncio.Event()
+
+    async def slow():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    async def run():
+        with deadlines.scope(Deadline(0.05)):
+            await deadlines.bounded(slow(), layer="llm.decision")
+
+    with pytest.raises(DeadlineExceeded) as raised:
+        asyncio.run(run())
+    assert raised.value.layer == "llm.decision"
+    assert cancelled.is_set()
+
+
+def test_bounded_keeps_the_call_timeout_when_it_is_shorter():
+    async def run():
+        with deadlines.scope(Deadline(10)):
+            await deadlines.bounded(asyncio.sleep(10), layer="action.x", own_timeout=0.05)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(run())
+
+
+def test_bounded_does_not_start_after_expiry():
+    started = []
+
+    async def work():
+        started.append(True)
+
+    async def run():
+        deadline = Deadline(0)
+        with deadlines.scope(deadline):
+            await deadlines.bounded(work(), layer="email")
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(run())
+    assert started == []
+
+
+def test_enforced_prefers_the_keyword_deadline(monkeypatch):
+    monkeypatch.setenv("ATOM_SOLVE_DEADLINE_MS", "60000")
+
+    @deadlines.enforced
+    async def solve(deadline=None):
+        return deadlines.current()
+
+    given = Deadline(5)
+    assert asyncio.run(solve(deadline=given)) is given
+    assert asyncio.run(solve()).seconds == 60
+    assert deadlines.current() is None
+
+
+def _busy(seconds: float) -> str:
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        pass
+    return json.dumps({"status": "success"})
+
+
+def _fast() -> str:
+    return json.dumps({"status": "success"})
+
+
+def test_tool_deadline_interrupts_the_body(monkeypatch):
+    monkeypatch.setattr(action, "_remote_meta", lambda: {"deadline_ms": 50})
+    started = time.perf_counter()
+    result = json.loads(action._run_within_deadline(_busy, (2.0,), {}))
+    assert result["status"] == "error"
+    assert time.perf_counter() - started < 1.0
+
+
+def test_tool_deadline_restores_the_previous_handler(monkeypatch):
+    monkeypatch.setattr(action, "_remote_meta", lambda: {"deadline_ms": 1000})
+
+    def previous(signum, frame):
+        pass
+
+    original = signal.signal(signal.SIGALRM, previous)
+    try:
+        assert json.loads(action._run_within_deadline(_fast, (), {}))["status"] == "success"
+        assert signal.getsignal(signal.SIGALRM) is previous
+        assert signal.getitimer(signal.ITIMER_REAL) == (0.0, 0.0)
+    finally:
+        signal.signal(signal.SIGALRM, original)
+
+
+def test_an_alarm_racing_the_disarm_never_escapes(monkeypatch):
+    monkeypatch.setattr(action, "_remote_meta", lambda: {"deadline_ms": 1000})
+    setitimer = signal.setitimer
+
+    def late_alarm(which, seconds, *interval):
+        # The alarm fires just as the timer is being disarmed
+        if seconds == 0:
+            signal.raise_signal(signal.SIGALRM)
+        return setitimer(which, seconds, *interval)
+
+    monkeypatch.setattr(signal, "setitimer", late_alarm)
+    result = json.loads(action._run_within_deadline(_fast, (), {}))
+    assert result["status"] in ("success", "error")
@@ -0,0 +1,69 @@
+from llm_cache import ResponseCache
+
+
+def test_memory_tier_evicts_the_least_recently_used():
+    cache = ResponseCache(max_entries=2)
+    cache.put("decision", "m", "a", "A")
+    cache.put("decision", "m", "b", "B")
+    assert cache.get("decision", "m", "a") == "A"  # a is now the most recent
+    cache.put("decision", "m", "c", "C")
+
+    assert cache.get("decision", "m", "b") is None
+    assert cache.get("decision", "m", "a") == "A"
+    assert cache.get("decision", "m", "c") == "C"
+    assert cache.stats()["entries"] == 2
+
+
+def test_key_covers_model_and_config():
+    cache = ResponseCache()
+    cache.put("decision", "m", "p", "cold", {"temperature": 0})
+    assert cache.get("decision", "m", "p", {"temperature": 0}) == "cold"
+    assert cache.get("decision", "m", "p", {"temperature": 1}) is None
+    assert cache.get("decision", "other", "p", {"temperature": 0}) is None
+
+
+def test_disk_tier_survives_a_new_instance(tmp_path):
+    db = str(tmp_path / "cache.db")
+    ResponseCache(db_path=db).put("perception", "m", "p", "P")
+
+    cache = ResponseCache(db_path=db)
+    assert cache.get("perception", "m", "p") == "P"
+    assert cache.get("perception", "m", "p") == "P"  # promoted to memory
+    stats = cache.stats()
+    assert (stats["hits"], stats["disk_hits"], stats["misses"]) == (2, 1, 0)
+
+
+def test_other_prompt_versions_are_purged(tmp_path):
+    db = str(tmp_path / "cache.db")
+    ResponseCache(db_path=db, prompt_version="1").put("decision", "m", "p", "old")
+
+    assert ResponseCache(db_path=db, prompt_version="2").get("decision", "m", "p") is None
+    assert ResponseCache(db_path=db, prompt_version="1").get("decision", "m", "p") is None
+
+
+def test_invalidate_drops_only_that_call_site_in_both_tiers(tmp_path):
+    db = str(tmp_path / "cache.db")
+    cache = ResponseCache(db_path=db)
+    cache.put("decision", "m", "p", "D")
+    cache.put("perception", "m", "q", "P")
+    cache.invalidate("decision")
+
+    assert cache.get("decision", "m", "p") is None
+    assert cache.get("perception", "m", "q") == "P"
+    fresh = ResponseCache(db_path=db)
+    assert fresh.get("decision", "m", "p") is None
+    assert fresh.get("perception", "m", "q") == "P"
+
+    cache.invalidate()
+    assert ResponseCache(db_path=db).get("perception", "m", "q") is None
+
+
+def test_disabled_call_sites_bypass_the_cache(monkeypatch):
+    monkeypatch.setenv("ATOM_LLM_CACHE_SITES", "perception")
+    cache = ResponseCache.from_env()
+    cache.put("email", "m", "p", "E")
+    assert cache.get("email", "m", "p") is None
+    assert cache.stats()["misses"] == 0
+
+    monkeypatch.setenv("ATOM_LLM_CACHE", "0")
+    assert not ResponseCache.from_env().is_enabled("perception")
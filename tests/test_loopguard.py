@@ -0,0 +1,117 @@
+import asyncio
+import json
+import os
+
+import llm
+import llm_cache
+from action import ActionResult
+from loopguard import LoopGuard, fingerprint
+from main import AgentRuntime
+
+PURE = {"integrate_term", "parse_polynomial"}
+
+
+def _ok(tool_name, result=None):
+    return ActionResult(success=True, result=result or {"status": "success"}, tool_name=tool_name)
+
+
+def _failed(tool_name):
+    return ActionResult(success=False, result=None, error_message="boom", tool_name=tool_name)
+
+
+def test_fingerprint_ignores_argument_order():
+    assert fingerprint("integrate_term", {"coeff": 3, "power": 2}) == \
+        fingerprint("integrate_term", {"power": 2, "coeff": 3})
+    assert fingerprint("integrate_term", {"coeff": 3, "power": 2}) != \
+        fingerprint("integrate_term", {"coeff": 3, "power": 1})
+
+
+def test_successful_pure_call_is_replayed():
+    guard = LoopGuard(PURE)
+    call = fingerprint("integrate_term", {"coeff": 3, "power": 2})
+    result = _ok("integrate_term", {"coeff": 1, "power": 3})
+    assert guard.check(call) is None
+    guard.record("integrate_term", call, result)
+    assert guard.check(call) == ("repeat", 0)
+    assert guard.replay(call) is result
+
+
+def test_failed_or_impure_calls_are_not_replayed():
+    guard = LoopGuard(PURE)
+    failed = fingerprint("integrate_term", {"coeff": "x", "power": 2})
+    guard.record("integrate_term", failed, _failed("integrate_term"))
+    error = fingerprint("integrate_term", {"coeff": 1, "power": -1})
+    guard.record("integrate_term", error, _ok("integrate_term", {"status": "error", "message": "x^-1"}))
+    email = fingerprint("send_gmail_text_personalized", {"to": "a@b.c"})
+    guard.record("send_gmail_text_personalized", email, _ok("send_gmail_text_personalized"))
+    assert guard.replay(failed) is None
+    assert guard.replay(error) is None
+    assert guard.replay(email) is None
+
+
+def test_cycle_of_failing_calls_is_detected():
+    guard = LoopGuard(PURE, stall_limit=100)
+    a = fingerprint("integrate_term", {"coeff": "a"})
+    b = fingerprint("parse_polynomial", {"expression": "?"})
+    for call in (a, b):
+        assert guard.check(call) is None
+        guard.record("x", call, _failed("x"))
+    assert guard.check(a) is None  # A B A: not yet a repetition
+    guard.record("x", a, _failed("x"))
+    assert guard.check(b) == ("cycle", 2)
+
+
+def test_stall_after_iterations_without_progress():
+    guard = LoopGuard(PURE, stall_limit=3)
+    for n in range(3):
+        call = fingerprint("show_reasoning", {"steps": [n]})
+        assert guard.check(call) is None
+        guard.record("show_reasoning", call, _ok("show_reasoning"))
+    assert guard.check(fingerprint("show_reasoning", {"steps": [3]})) == ("stall", 0)
+
+    # A first successful pure call is progress and resets the streak
+    progress = fingerprint("integrate_term", {"coeff": 1, "power": 0})
+    guard.record("integrate_term", progress, _ok("integrate_term"))
+    assert guard.check(fingerprint("show_reasoning", {"steps": [4]})) is None
+
+
+def test_settle_credits_only_the_first_takeover_and_only_when_solved():
+    guard = LoopGuard(PURE)
+    guard.intervene(2, "replay", "integrate_term", "r", "replayed the earlier result")
+    guard.intervene(4, "cycle", "integrate_term", "c", "planned deterministically", period=2)
+    guard.intervene(6, "stall", "integrate_term", "s", "planned deterministically")
+    guard.settle(solved=False, iterations=8, max_iterations=25)
+    assert [i.iterations_saved_upper_bound for i in guard.interventions] == [0, 0, 0]
+
+    guard.settle(solved=True, iterations=8, max_iterations=25)
+    assert [i.iterations_saved_upper_bound for i in guard.interventions] == [0, 17, 0]
+
+
+def test_solve_breaks_out_of_a_repeating_llm(tmp_path, monkeypatch):
+    # The LLM asks for the same parse on every decision
+    rules = [{"match": ".", "call_site": "decision", "response": {
+        "action_type": "tool_call",
+        "tool_call": {"tool_name": "parse_polynomial", "arguments": {"expression": "3x^2 + 2x"}, "reasoning": "parse"},
+        "reasoning_steps": ["parse again"],
+        "should_continue": True
+    }}]
+    script = tmp_path / "rules.json"
+    script.write_text(json.dumps(rules), encoding="utf-8")
+    monkeypatch.setenv("ATOM_LLM_BACKEND", "stub")
+    monkeypatch.setenv("ATOM_STUB_SCRIPT", str(script))
+    monkeypatch.setenv("ATOM_STUB_LATENCY", "fixed:0")
+    monkeypatch.setenv("ATOM_LLM_CACHE", "0")
+    monkeypatch.setattr(llm, "_default_gateway", None)
+    monkeypatch.setattr(llm_cache, "_default_cache", None)
+
+    async def run():
+        with open(os.devnull, "w") as errlog:
+            async with AgentRuntime.start(memory_file=str(tmp_path / "memory.json"), errlog=errlog) as runtime:
+                return await runtime.solve("Integrate 3x^2 + 2x dx")
+
+    stats = asyncio.run(run())
+    assert stats.status == "solved"
+    assert stats.iterations < 25
+    kinds = [i.kind for i in stats.loop_interventions]
+    assert "replay" in kinds or "repeat" in kinds
+    assert stats.to_record()["loop_interventions"] == len(stats.loop_interventions)
@@ -0,0 +1,159 @@
+import asyncio
+import json
+import random
+
+import pytest
+
+from service import (
+    DEADLINE_EXCEEDED, INVALID_PARAMS, OVERLOADED, SHUTTING_DOWN,
+    AgentService, RPCError, ServiceConfig, handle_body, handle_connection
+)
+
+
+class Stats:
+    status = "solved"
+
+    def __init__(self, problem):
+        self.problem = problem
+
+    def to_record(self):
+        return {"problem": self.problem, "status": self.status}
+
+
+class Runtime:
+    """Stands in for AgentRuntime: every solve waits until the gate opens"""
+    actions = []
+    solutions = None
+
+    def __init__(self):
+        self.gate = asyncio.Event()
+        self.started = 0
+
+    async def solve(self, problem, user=None, send_emails=False, deadline=None):
+        self.started += 1
+        await self.gate.wait()
+        return Stats(problem)
+
+
+def _service(**config):
+    return AgentService(Runtime(), ServiceConfig(**config))
+
+
+async def _until(condition):
+    while not condition():
+        await asyncio.sleep(0)
+
+
+def test_requests_beyond_running_and_queued_are_overloaded():
+    async def run():
+        service = _service(concurrency=1, queue_size=1)
+        first = asyncio.ensure_future(service.solve("∫x dx"))
+        second = asyncio.ensure_future(service.solve("∫2x dx"))
+        await _until(lambda: service.runtime.started == 1)
+        assert (service.running, service.waiting) == (1, 1)
+
+        with pytest.raises(RPCError) as raised:
+            await service.solve("∫3x dx")
+        assert raised.value.code == OVERLOADED
+
+        service.runtime.gate.set()
+        results = await asyncio.gather(first, second)
+        assert [r["status"] for r in results] == ["solved", "solved"]
+        assert service.counts["rejected"] == 1
+        assert service.counts["solved"] == 2
+
+    asyncio.run(run())
+
+
+def test_deadline_can_expire_in_the_queue():
+    async def run():
+        service = _service(concurrency=1, queue_size=4)
+        running = asyncio.ensure_future(service.solve("∫x dx", deadline_ms=5000))
+        await _until(lambda: service.runtime.started == 1)
+
+        with pytest.raises(RPCError) as raised:
+            await service.solve("∫2x dx", deadline_ms=20)
+        assert raised.value.code == DEADLINE_EXCEEDED
+        assert service.runtime.started == 1
+
+        service.runtime.gate.set()
+        await running
+        assert service.counts["deadline_exceeded"] == 1
+
+    asyncio.run(run())
+
+
+def test_cancelled_and_expired_waits_never_leak_slots():
+    async def run():
+        service = _service(concurrency=2, queue_size=1000)
+        service.runtime.gate.set()
+        rng = random.Random(7)
+        tasks = [asyncio.ensure_future(service.solve("∫x dx", deadline_ms=rng.choice([1, 5, 50])))
+                 for _ in range(300)]
+        for task in tasks:
+            if rng.random() < 0.3:
+                task.cancel()
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        assert (service.running, service.waiting) == (0, 0)
+        assert service._slots._value == 2
+
+    asyncio.run(run())
+
+
+def test_send_emails_is_rejected_unless_allowed():
+    async def run():
+        with pytest.raises(RPCError) as raised:
+            await _service().solve("∫x dx", send_emails=True)
+        assert raised.value.code == INVALID_PARAMS
+
+        service = _service(allow_emails=True)
+        service.runtime.gate.set()
+        assert (await service.solve("∫x dx", send_emails=True))["status"] == "solved"
+
+    asyncio.run(run())
+
+
+def test_drain_rejects_new_work_and_waits_for_running_solves():
+    async def run():
+        service = _service(concurrency=1, queue_size=1)
+        running = asyncio.ensure_future(service.solve("∫x dx"))
+        queued = asyncio.ensure_future(service.solve("∫2x dx"))
+        await _until(lambda: service.runtime.started == 1)
+
+        assert await service.drain(0.05) is False
+        status, response = await handle_body(service, json.dumps(
+            {"jsonrpc": "2.0", "id": 1, "method": "solve", "params": {"problem": "∫3x dx"}}
+        ).encode())
+        assert status == 503
+        assert response["error"]["code"] == SHUTTING_DOWN
+
+        service.runtime.gate.set()
+        assert await service.drain(1.0) is True
+        assert [r["status"] for r in await asyncio.gather(running, queued)] == ["solved", "solved"]
+
+    asyncio.run(run())
+
+
+def test_invalid_content_length_is_a_bad_request():
+    async def run():
+        service = _service()
+        server = await asyncio.start_server(
+            lambda r, w: handle_connection(service, r, w), "127.0.0.1", 0
+        )
+        port = server.sockets[0].getsockname()[1]
+        try:
+            for length in ("abc", "-5"):
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                writer.write(f"POST /rpc HTTP/1.1\r\nContent-Length: {length}\r\n\r\n".encode())
+                await writer.drain()
+                response = await reader.read()
+                writer.close()
+                assert response.startswith(b"HTTP/1.1 400 ")
+                assert b"invalid Content-Length" in response
+        finally:
+            server.close()
+            await server.wait_closed()
+
+    asyncio.run(run())
@@ -0,0 +1,51 @@
+from types import SimpleNamespace
+
+from main import same_answer, verification_status
+from solutions import Solution, SolutionStore
+
+
+def _solution(expression, answer, verification):
+    return Solution(expression=expression, final_answer=answer, verification=verification)
+
+
+def test_lookup_matches_any_spelling_of_the_expression(tmp_path):
+    store = SolutionStore(str(tmp_path / "solutions.db"))
+    store.put(_solution("3x^2 + 2x", "x^3 + x^2 + C", "pass"))
+
+    assert store.lookup("2x+3*x**2").final_answer == "x^3 + x^2 + C"
+    assert store.lookup("3x^2 + 2x", variable="t") is None
+    assert store.stats()["hits"] == 1
+
+
+def test_only_verified_solutions_are_served_or_kept(tmp_path):
+    store = SolutionStore(str(tmp_path / "solutions.db"))
+    store.put(_solution("sin(x)", "-cos(x) + C", "unverified"))
+    assert store.lookup("sin(x)") is None
+
+    store.put(_solution("sin(x)", "-cos(x) + C", "pass"))
+    store.put(_solution("sin(x)", "cos(x) + C", "skipped"))
+    assert store.lookup("sin(x)").final_answer == "-cos(x) + C"
+
+
+def test_other_solver_versions_are_dropped(tmp_path):
+    path = str(tmp_path / "solutions.db")
+    SolutionStore(path, solver_version="1").put(_solution("x", "x^2/2 + C", "pass"))
+    assert SolutionStore(path, solver_version="2").lookup("x") is None
+
+
+def test_store_is_opt_in(tmp_path, monkeypatch):
+    monkeypatch.delenv("ATOM_SOLUTIONS_DB", raising=False)
+    assert SolutionStore.from_env() is None
+    monkeypatch.setenv("ATOM_SOLUTIONS_DB", str(tmp_path / "solutions.db"))
+    assert SolutionStore.from_env().path == str(tmp_path / "solutions.db")
+
+
+def test_pass_only_when_the_final_answer_is_the_verified_candidate():
+    memory = SimpleNamespace(preferences=SimpleNamespace(verification_required=True))
+    assert same_answer("x^2 + x^3 + C", "x^3+x^2")
+    assert verification_status(memory, "x^3 + x^2 + C", "x^3 + x^2 + C") == "pass"
+    assert verification_status(memory, "x^3 + C", "x^3 + x^2 + C") == "unverified"
+    assert verification_status(memory, "x^3 + C", None) == "unverified"
+
+    memory.preferences.verification_required = False
+    assert verification_status(memory, "x^3 + C", None) == "skipped"
@@ -0,0 +1,297 @@
+"""
+Tracing: Lightweight spans across the cognitive layers and the MCP server
+Deterministic: Each process writes Chrome trace events (one per line) to its
+own file, loadable in Perfetto or chrome://tracing and merged with
+`python tracing.py merge`; every call is a no-op unless ATOM_TRACE_FILE is set
+"""
+
+from contextvars import ContextVar
+from typing import Any, Callable, Optional
+import argparse
+import atexit
+import functools
+import inspect
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("atom_current_span", default=None)
+
+
+class Span:
+    """A timed operation; use as a context manager"""
+
+    __slots__ = ("tracer", "name", "cat", "trace_id", "span_id", "parent_id",
+                 "attributes", "_start_us", "_token")
+
+    def __init__(
+        self,
+        tracer: "Tracer",
+        name: str,
+        cat: str,
+        parent: Optional[dict] = None,
+        attributes: Optional[dict[str, Any]] = None
+    ):
+        local_parent = _current_span.get()
+        if parent is None and local_parent is not None:
+            parent = local_parent.context()
+
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.trace_id = parent["trace_id"] if parent else uuid.uuid4().hex[:16]
+        self.parent_id = parent["span_id"] if parent else None
+        self.span_id = tracer.next_span_id()
+        self.attributes = attributes or {}
+        self._start_us = 0
+        self._token = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def context(self) -> dict:
+        """Identifiers a remote process needs to attach child spans"""
+        return {"trace_id": self.trace_id, "span_id": self.span_id}
+
+    def __enter__(self) -> "Span":
+        self._token = _current_span.set(self)
+        self._start_us = time.time_ns() // 1000
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end_us = time.time_ns() // 1000
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.attributes["error"] = f"{exc_type.__name__}: {exc}"
+        self.tracer.emit({
+            "name": self.name,
+            "cat": self.cat,
+            "ph": "X",
+            "ts": self._start_us,
+            "dur": end_us - self._start_us,
+            "pid": self.tracer.pid,
+            "tid": threading.get_native_id(),
+            "args": {
+                **self.attributes,
+                "trace_id": self.trace_id,
+                "span_id": self.span_id,
+                "parent_id": self.parent_id
+            }
+        })
+        return False
+
+
+class _NoopSpan:
+    """Returned when tracing is disabled"""
+
+    __slots__ = ()
+
+    def set(self, **attributes):
+        pass
+
+    def context(self) -> None:
+        return None
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def process_path(path: str, pid: int) -> str:
+    """Where one process traces to: trace.json -> trace.<pid>.json"""
+    root, ext = os.path.splitext(path)
+    return f"{root}.{pid}{ext or '.json'}"
+
+
+class Tracer:
+    """
+    Writes one process's trace events to a file of its own
+
+    The orchestrator and every MCP server write <path stem>.<pid><suffix>, so
+    no two processes share a file. Each file is a JSON array with one event
+    per line, closed by close() (also at exit); read_events() also reads the
+    file of a process that died before closing it. Timestamps are wall-clock
+    microseconds so the processes line up once merged.
+    """
+
+    def __init__(self, path: str, process_name: Optional[str] = None):
+        self.pid = os.getpid()
+        self.path = process_path(path, self.pid)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._empty = True
+        self._file = open(self.path, "w", encoding="utf-8")
+        self._file.write("[\n")
+        self.emit({
+            "name": "process_name", "ph": "M", "pid": self.pid, "tid": 0,
+            "args": {"name": process_name or os.path.basename(sys.argv[0]) or "python"}
+        })
+        atexit.register(self.close)
+
+    def next_span_id(self) -> str:
+        return f"{self.pid:x}.{next(self._ids)}"
+
+    def emit(self, event: dict):
+        line = json.dumps(event, ensure_ascii=False, default=str)
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(line if self._empty else ",\n" + line)
+                self._empty = False
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.write("\n]\n")
+                self._file.close()
+
+
+def read_events(path: str) -> list[dict]:
+    """A trace file's events; an unclosed array or a torn last line is tolerated"""
+    events = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip().rstrip(",")
+            if line in ("", "[", "]"):
+                continue
+            try:
+                events.append(json.loads(line))
+            except json.JSONDecodeError:
+                pass  # cut short by a crash
+    return events
+
+
+def merge(paths: list[str], output: str) -> int:
+    """Join per-process trace files into one array; returns the number of events"""
+    events = [event for path in paths for event in read_events(path)]
+    # Process names first, then everything in time order
+    events.sort(key=lambda event: (event.get("ph") != "M", event.get("ts", 0)))
+    with open(output, "w", encoding="utf-8") as f:
+        f.write("[\n" + ",\n".join(json.dumps(event, ensure_ascii=False) for event in events) + "\n]\n")
+    return len(events)
+
+
+# ----------------------------------------------------------------------------
+# Module API
+# ----------------------------------------------------------------------------
+
+_tracer: Optional[Tracer] = None
+_configured = False
+
+
+def configure(path: Optional[str] = None, process_name: Optional[str] = None) -> Optional[Tracer]:
+    """Trace to path (default: ATOM_TRACE_FILE); with neither, tracing stays off"""
+    global _tracer, _configured
+    path = path or os.getenv("ATOM_TRACE_FILE")
+    if _tracer is not None:
+        _tracer.close()
+    _tracer = Tracer(path, process_name) if path else None
+    _configured = True
+    return _tracer
+
+
+def get_tracer() -> Optional[Tracer]:
+    if not _configured:
+        configure()
+    return _tracer
+
+
+def enabled() -> bool:
+    return get_tracer() is not None
+
+
+def span(name: str, cat: str = "agent", parent: Optional[dict] = None, **attributes):
+    """
+    Start a span as a child of the current one (or of a remote parent)
+
+    Args:
+        name: Span name shown in the viewer
+        cat: Category, usually the layer
+        parent: Remote trace context from another process
+        attributes: Key/value pairs recorded with the span
+    """
+    tracer = get_tracer()
+    if tracer is None:
+        return NOOP_SPAN
+    return Span(tracer, name, cat, parent, attributes)
+
+
+def annotate(**attributes):
+    """Add attributes to the current span, if any"""
+    current = _current_span.get()
+    if current is not None:
+        current.set(**attributes)
+
+
+def complete(name: str, cat: str, start: float, duration: float, **attributes):
+    """Record an already finished span (start is time.time() seconds)"""
+    tracer = get_tracer()
+    if tracer is None:
+        return
+    current = _current_span.get()
+    tracer.emit({
+        "name": name, "cat": cat, "ph": "X",
+        "ts": int(start * 1_000_000), "dur": int(duration * 1_000_000),
+        "pid": tracer.pid, "tid": threading.get_native_id(),
+        "args": {**attributes, "trace_id": current.trace_id if current else None}
+    })
+
+
+def counter(name: str, **values: float):
+    """Counter event: the viewer plots each value as a track over time"""
+    tracer = get_tracer()
+    if tracer is None:
+        return
+    tracer.emit({
+        "name": name, "ph": "C", "ts": time.time_ns() // 1000,
+        "pid": tracer.pid, "tid": 0, "args": values
+    })
+
+
+def current_context() -> Optional[dict]:
+    """Trace context of the current span, for propagation to another process"""
+    current = _current_span.get()
+    return current.context() if current is not None else None
+
+
+def traced(name: str, cat: str = "agent") -> Callable:
+    """Decorator wrapping a sync or async function in a span"""
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(name, cat):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name, cat):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge the per-process trace files of a run")
+    parser.add_argument("command", choices=["merge"])
+    parser.add_argument("files", nargs="+", help="e.g. trace.*.json")
+    parser.add_argument("--output", "-o", default="trace.json")
+    args = parser.parse_args()
+    paths = [path for path in args.files if os.path.abspath(path) != os.path.abspath(args.output)]
+    count = merge(paths, args.output)
+    print(f"Wrote {count} events from {len(paths)} file(s) to {args.output}")
+
+
+if __name__ == "__main__":
+    main()